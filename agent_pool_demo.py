@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import json
+import sys
+from loguru import logger
+
+from utils.llm import PERCEPTION_STRATEGIES
+from utils.pool import AgentJob, AgentPool
+
+def load_jobs(args):
+    """从 --jobs 指定的 JSONL 文件（每行 {"url", "instruction", "perception"?}）或命令行参数构造任务列表"""
+    if args.jobs:
+        with open(args.jobs, "r", encoding="utf-8") as f:
+            jobs = [AgentJob(**json.loads(line)) for line in f if line.strip()]
+    else:
+        jobs = [AgentJob(args.url, instruction, args.perception) for instruction in args.instruction]
+    return jobs * args.repeat
+
+async def run(args):
+    jobs = load_jobs(args)
+    logger.info(f"共 {len(jobs)} 个任务，{args.size} 个并发会话")
+    async with AgentPool(size=args.size, headless=not args.headed, max_steps=args.max_steps) as pool:
+        report = await pool.run(jobs)
+    for result in report.results:
+        logger.info(f"[{result.session}] 成功: {result.success}，{result.steps} 步，用时 {result.latency:.1f}s，"
+                    f"内存: {result.memory}，录制目录: {result.record_dir or '未开启'}"
+                    + (f"，错误: {result.error}" if result.error else ""))
+    logger.success(f"汇总：{report.summary()}")
+    return report
+
+def main():
+    args = argparse.ArgumentParser(description="在共享浏览器上并发运行多个代理任务")
+    args.add_argument("--jobs", type=str, default="", help="任务文件（JSONL，每行包含 url、instruction，可选 perception）")
+    args.add_argument("--url", type=str, default="https://www.bilibili.com", help="未指定任务文件时的初始网址")
+    args.add_argument("--instruction", type=str, nargs="+", default=["帮我搜索洛天依演唱会的回放视频"],
+                      help="未指定任务文件时的任务指令，可给出多个")
+    args.add_argument("--perception", type=str, default="two-stage", choices=PERCEPTION_STRATEGIES, help="页面感知策略")
+    args.add_argument("--repeat", type=int, default=1, help="任务列表重复次数（用于压测吞吐量）")
+    args.add_argument("--size", type=int, default=4, help="并发会话数（每个会话一个隔离的浏览器上下文）")
+    args.add_argument("--max-steps", type=int, default=30, help="每个任务最多执行的步数")
+    args.add_argument("--headed", action="store_true", help="显示浏览器窗口（默认无头）")
+    asyncio.run(run(args.parse_args()))
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stdout, level="INFO", colorize=True, format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+    main()
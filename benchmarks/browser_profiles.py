@@ -0,0 +1,121 @@
+"""浏览器配置基准：对比各浏览器配置（utils.browserProfile）的冷启动耗时、页面加载耗时与内存占用。
+
+每种配置重复 --repeat 次“启动（或连接）→ 打开 --url 到 load 事件 → 读取内存 → 关闭”：
+- headless：无头、不拦截、临时用户目录（每次都是空缓存）
+- blocking：无头，并按 --block-types / --block-domains 拦截请求（被拦截的请求数一并输出）
+- persistent：无头，使用同一个持久化用户目录，第 1 次为空缓存，之后的加载可用上次留下的 HTTP 缓存
+- warm：先用 browser_server.py 启动常驻浏览器（不计入耗时），之后每次只连接并新建上下文；内存含常驻浏览器
+- headed（--headed）：原先的有头模式，需要显示器
+
+内存为 Playwright 驱动与 Chromium 各进程之和（RSS 会重复计入共享的页，PSS 按共享分摊），仅 Linux。
+需要 Playwright 的 Chromium 与能访问 --url 的网络，不需要模型服务。
+用法：python -m benchmarks.browser_profiles [--url https://www.bilibili.com] [--repeat 3] [--headed]
+"""
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from loguru import logger
+
+from benchmarks.common import ROOT, print_table, save_results
+from utils.browserProfile import BrowserProfile, block_stats
+from utils.webBrowser import AsyncBrowserAgent
+
+DEFAULT_BLOCK_TYPES = "media,font"
+DEFAULT_BLOCK_DOMAINS = "data.bilibili.com,cm.bilibili.com,hm.baidu.com,google-analytics.com,googletagmanager.com,doubleclick.net"
+
+
+def start_warm_browser(port: int, timeout: float = 30.0) -> subprocess.Popen:
+    """在子进程中启动 browser_server.py，等到 CDP 端口可用"""
+    server = subprocess.Popen([sys.executable, str(ROOT / "browser_server.py"), "--port", str(port)], cwd=ROOT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("预热浏览器启动失败")
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("等待预热浏览器的 CDP 端口超时")
+
+
+async def run_once(url: str, profile: BrowserProfile) -> dict:
+    block_stats.reset()
+    agent = await AsyncBrowserAgent.launch(record_dir="", profile=profile)
+    try:
+        await agent.goto(url)
+        # 预热浏览器是本进程的子进程，也计入进程树的内存
+        metrics = agent.profile_metrics()
+    finally:
+        await agent.close()
+    return {"startup_s": metrics["startup_s"], "load_s": metrics["load_s"], **(metrics["memory"] or {}),
+            "blocked": block_stats.summary()["blocked"]}
+
+
+def summarize(name: str, runs: list) -> dict:
+    later = runs[1:] or runs
+    return {
+        "profile": name,
+        "runs": len(runs),
+        "startup_first_s": runs[0]["startup_s"],
+        "startup_median_s": round(statistics.median(r["startup_s"] for r in runs), 3),
+        "load_first_s": runs[0]["load_s"],
+        "load_later_median_s": round(statistics.median(r["load_s"] for r in later), 3),
+        "rss_mb": round(statistics.mean(r.get("rss_mb", 0) for r in runs), 1),
+        "pss_mb": round(statistics.mean(r.get("pss_mb", 0) for r in runs), 1),
+        "blocked": round(statistics.mean(r["blocked"] for r in runs), 1),
+    }
+
+
+async def run(args) -> tuple:
+    block = {"block_types": tuple(t for t in args.block_types.split(",") if t),
+             "block_domains": tuple(d for d in args.block_domains.split(",") if d)}
+    rows, raw = [], {}
+    with tempfile.TemporaryDirectory(prefix="browser-profile-") as user_data_dir:
+        profiles = {
+            "headless": BrowserProfile(headless=True),
+            "blocking": BrowserProfile(headless=True, **block),
+            "persistent": BrowserProfile(headless=True, user_data_dir=user_data_dir),
+        }
+        if args.headed:
+            profiles["headed"] = BrowserProfile(headless=False)
+        for name, profile in profiles.items():
+            raw[name] = [await run_once(args.url, profile) for _ in range(args.repeat)]
+            rows.append(summarize(name, raw[name]))
+            logger.info(f"{name}: {rows[-1]}")
+    server = await asyncio.to_thread(start_warm_browser, args.port)
+    try:
+        profile = BrowserProfile(headless=True, cdp_endpoint=f"http://127.0.0.1:{args.port}")
+        raw["warm"] = [await run_once(args.url, profile) for _ in range(args.repeat)]
+        rows.append(summarize("warm", raw["warm"]))
+        logger.info(f"warm: {rows[-1]}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return rows, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="浏览器配置基准")
+    parser.add_argument("--url", type=str, default="https://www.bilibili.com", help="测量加载耗时的页面")
+    parser.add_argument("--repeat", type=int, default=3, help="每种配置的启动次数")
+    parser.add_argument("--block-types", type=str, default=DEFAULT_BLOCK_TYPES, help="blocking 配置拦截的资源类型，逗号分隔")
+    parser.add_argument("--block-domains", type=str, default=DEFAULT_BLOCK_DOMAINS, help="blocking 配置拦截的域名，逗号分隔")
+    parser.add_argument("--port", type=int, default=9333, help="预热浏览器的 CDP 端口")
+    parser.add_argument("--headed", action="store_true", help="同时测量有头模式（需要显示器）")
+    args = parser.parse_args()
+
+    rows, raw = asyncio.run(run(args))
+    print_table(rows, list(rows[0].keys()))
+    save_results("browser_profiles", {"settings": vars(args), "profiles": rows, "runs": raw})
+
+
+if __name__ == "__main__":
+    main()
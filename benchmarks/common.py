@@ -0,0 +1,149 @@
+"""基准脚本共用的小工具：样例图像、token 计量、结果输出。"""
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from loguru import logger
+
+from utils import runtime
+
+ROOT = Path(__file__).resolve().parent.parent
+IMAGES_DIR = ROOT / "images"
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+def list_images(pattern: str = "*.png"):
+    """images/ 下的样例截图（按文件名排序）"""
+    return sorted(IMAGES_DIR.glob(pattern))
+
+
+class UsageMeter:
+    """包裹 runtime.chat_completion，统计模型调用次数、耗时与 token 用量"""
+
+    def __init__(self, create):
+        self._create = create
+        self._lock = threading.Lock()
+        self.reset()
+
+    async def __call__(self, **kwargs):
+        start = time.perf_counter()
+        response = await self._create(**kwargs)
+        if kwargs.get("stream") and not hasattr(response, "choices"):
+            return _MeteredStream(response, self, start)
+        self._record(response, time.perf_counter() - start)
+        return response
+
+    def _record(self, response, elapsed):
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self.calls += 1
+            self.seconds += elapsed
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def reset(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "model_seconds": round(self.seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class _MeteredStream:
+    """流式响应的计量代理：流读完或被提前关闭时记录耗时与 token 用量。
+    提前关闭的流收不到服务端最后的 usage 块，token 记为 0。"""
+
+    def __init__(self, stream, meter: UsageMeter, start: float):
+        self._stream = stream
+        self._meter = meter
+        self._start = start
+        self._usage = None
+        self._recorded = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if getattr(chunk, "usage", None):
+                self._usage = chunk.usage
+            yield chunk
+        self._finish()
+
+    async def close(self):
+        self._finish()
+        await self._stream.close()
+
+    def _finish(self):
+        if not self._recorded:
+            self._recorded = True
+            self._meter._record(SimpleNamespace(usage=self._usage), time.perf_counter() - self._start)
+
+
+def install_usage_meter() -> UsageMeter:
+    """用计量代理包裹所有模型调用的统一入口 runtime.chat_completion"""
+    meter = runtime.__dict__.get("chat_completion")
+    if isinstance(meter, UsageMeter):
+        return meter
+    meter = UsageMeter(runtime.chat_completion)
+    runtime.chat_completion = meter
+    return meter
+
+
+def print_table(rows, columns):
+    """按列名打印对齐的结果表"""
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    logger.info(" | ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        logger.info(" | ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+def save_results(name: str, payload) -> Path:
+    """把结果写到 benchmarks/results/<name>-<时间戳>.json，便于多次运行之间对比"""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    logger.success(f"结果已保存到 {path}")
+    return path
+
+
+def latest_result(name: str):
+    """最近一次 save_results(name, ...) 保存的结果，没有则返回 None"""
+    paths = sorted(RESULTS_DIR.glob(f"{name}-*.json"))
+    if not paths:
+        return None
+    with open(paths[-1], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_grounding_truth(path=ROOT / "benchmarks" / "grounding_truth.json"):
+    """人工标注的定位样本：[{image, target, prompt, box}]，image 相对仓库根目录"""
+    with open(path, "r", encoding="utf-8") as f:
+        samples = json.load(f)
+    for sample in samples:
+        sample["path"] = ROOT / sample["image"]
+    return samples
+
+
+def prompt_pos(prompt: str):
+    """定位指令中“位于……”给出的位置描述，没有则返回 None"""
+    import re
+    match = re.search(r"位于([^，,。]+)", prompt)
+    return match.group(1) if match else None
+
+
+def score_box(predicted, truth) -> dict:
+    """点击命中（预测框中心落在标注框内）与 IoU"""
+    from utils.imageProcessing import box_center, box_iou
+    if not predicted or len(predicted) != 4:
+        return {"hit": False, "iou": 0.0}
+    cx, cy = box_center(predicted)
+    hit = truth[0] <= cx <= truth[2] and truth[1] <= cy <= truth[3]
+    return {"hit": hit, "iou": box_iou(predicted, truth)}
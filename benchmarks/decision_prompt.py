@@ -0,0 +1,79 @@
+"""决策提示词大小：逐步模拟一个长任务，对比发送完整历史（改造前）与 HistoryManager 按预算压缩后的每步输入 token 数。
+
+页面状态取自 benchmarks/json_corpus.jsonl，操作序列在几类真实操作间循环（含重复操作，触发循环检测）。
+不需要模型服务。用法：python -m benchmarks.decision_prompt [--steps 60] [--budget 6000] [--window 4]
+"""
+import argparse
+import json
+
+from loguru import logger
+
+from benchmarks.common import ROOT, print_table, save_results
+from utils.history import HistoryManager, build_decision_input, estimate_tokens
+from utils.llm import OPERATION_INFERENCE_PROMPT
+
+OPERATIONS = [
+    {"reasoning": "当前位于首页，需要先在搜索框中输入关键词。", "action": "TYPE",
+     "params": {"target": "搜索框", "pos": "页面顶部中间", "text": "洛天依演唱会回放"}, "result": "输入内容到 搜索框：洛天依演唱会回放"},
+    {"reasoning": "关键词已输入，点击搜索按钮提交搜索。", "action": "CLICK",
+     "params": {"target": "搜索按钮", "pos": "搜索框右侧"}, "result": "点击 搜索按钮 按钮或区域"},
+    {"reasoning": "搜索结果中没有找到目标视频，继续向下滚动查看更多结果。", "action": "SCROLL",
+     "params": {"direction": "向下"}, "result": "向向下滚动页面"},
+    {"reasoning": "搜索结果中没有找到目标视频，继续向下滚动查看更多结果。", "action": "SCROLL",
+     "params": {"direction": "向下"}, "result": "向向下滚动页面"},
+    {"reasoning": "进入下一页搜索结果。", "action": "CLICK",
+     "params": {"target": "下一页", "pos": "页面底部"}, "result": "点击 下一页 按钮或区域"},
+]
+
+
+def load_page_state():
+    with open(ROOT / "benchmarks" / "json_corpus.jsonl", "r", encoding="utf-8") as f:
+        for line in f:
+            sample = json.loads(line)
+            if sample["kind"] == "page_state" and sample["wrapper"] == "bare":
+                return json.loads(sample["text"])
+    raise ValueError("语料中没有页面状态样本")
+
+
+def run(steps: int, budget: int, window: int):
+    page_state = load_page_state()
+    target = "帮我搜索洛天依演唱会的回放视频"
+    system = estimate_tokens(OPERATION_INFERENCE_PROMPT)
+    legacy, history = [], HistoryManager(window=window)
+    rows = []
+    for step in range(1, steps + 1):
+        legacy_text = json.dumps({"page_state": page_state, "user_target": target, "user_history": legacy}, ensure_ascii=False)
+        _, report = build_decision_input(page_state, target, history, OPERATION_INFERENCE_PROMPT, budget)
+        rows.append({
+            "step": step,
+            "legacy_tokens": system + estimate_tokens(legacy_text),
+            "compact_tokens": report["prompt_tokens_est"],
+            "verbatim_steps": report["verbatim_steps"],
+            "warnings": len(history.render().get("warnings", [])),
+        })
+        operation = dict(OPERATIONS[(step - 1) % len(OPERATIONS)])
+        legacy.append(operation)
+        history.append(operation)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="决策提示词大小基准")
+    parser.add_argument("--steps", type=int, default=60, help="模拟的步数")
+    parser.add_argument("--budget", type=int, default=6000, help="决策提示词的 token 预算，0 表示不限制")
+    parser.add_argument("--window", type=int, default=4, help="原样保留的最近步数")
+    args = parser.parse_args()
+
+    rows = run(args.steps, args.budget, args.window)
+    shown = [row for row in rows if row["step"] in (1, 2, 5, 10, 20, 40) or row["step"] == len(rows)]
+    print_table(shown, list(rows[0].keys()))
+    legacy_total = sum(r["legacy_tokens"] for r in rows)
+    compact_total = sum(r["compact_tokens"] for r in rows)
+    logger.success(f"{len(rows)} 步累计输入 token（估算）：完整历史 {legacy_total}，压缩后 {compact_total}"
+                   f"（{compact_total / legacy_total:.1%}）")
+    save_results("decision_prompt", {"settings": vars(args), "legacy_total": legacy_total,
+                                     "compact_total": compact_total, "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""DOM 定位基准：在本地页面 benchmarks/pages/search.html 上，统计 DOM 后端对一组 CLICK / TYPE 目标的命中率、
+精度（命中的元素中心落在标注元素内）与耗时；未命中的目标在智能体中会退回 VL 定位（其耗时见 benchmarks.replay 的 ground 阶段）。
+
+--cards 控制页面上的结果卡片数，用于观察元素很多时 evaluate 与打分的耗时。需要 Playwright 的 Chromium，不需要模型服务。
+用法：python -m benchmarks.dom_grounding [--cards 12,200,2000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import ROOT, print_table, save_results, score_box
+from utils.domGrounding import collect_elements, pick_element, rank_elements
+from utils.webBrowser import AsyncBrowserAgent
+
+PAGE = ROOT / "benchmarks" / "pages" / "search.html"
+# (动作, 决策给出的参数, 标注元素的选择器)
+TARGETS = [
+    ("TYPE", {"target": "搜索框", "pos": "顶部居中", "text": "洛天依演唱会"}, '[data-bench="搜索框"]'),
+    ("CLICK", {"target": "搜索按钮", "pos": "搜索框右侧"}, '[data-bench="搜索按钮"]'),
+    ("CLICK", {"target": "首页", "pos": "顶部左侧"}, '[data-bench="首页"]'),
+    ("CLICK", {"target": "直播", "pos": "顶部左侧"}, '[data-bench="直播"]'),
+    ("CLICK", {"target": "登录按钮", "pos": "右上角"}, '[data-bench="登录"]'),
+    ("CLICK", {"target": "投稿", "pos": "顶部右侧"}, '[data-bench="投稿"]'),
+    ("CLICK", {"target": "综合", "pos": "顶部左侧"}, '[data-bench="综合"]'),
+    ("CLICK", {"target": "用户选项卡", "pos": "顶部左侧"}, '[data-bench="用户"]'),
+    ("CLICK", {"target": "洛天依 2024 演唱会全场回放 第1期", "pos": "页面左侧"}, "#results .card:nth-child(1) a"),
+    ("CLICK", {"target": "下一页", "pos": "页面底部"}, '[data-bench="下一页"]'),
+    ("TYPE", {"target": "邮箱输入框", "pos": "右下角", "text": "a@b.c"}, '[data-bench="邮箱"]'),
+    ("CLICK", {"target": "订阅更新按钮", "pos": "右下角"}, '[data-bench="订阅"]'),
+    ("CLICK", {"target": "关闭", "pos": "右下角"}, '[data-bench="关闭"]'),
+]
+
+
+async def run_page(agent: AsyncBrowserAgent, cards: int, repeat: int) -> dict:
+    await agent.goto(f"{PAGE.as_uri()}?cards={cards}")
+    page = agent.page
+    viewport = (page.viewport_size["width"], page.viewport_size["height"])
+    hits = correct = 0
+    collect_times, rank_times, elements = [], [], 0
+    for action, params, selector in TARGETS:
+        truth = await page.locator(selector).first.bounding_box()
+        # 视口坐标即截图坐标（deviceScaleFactor 为 1）
+        truth_box = [truth["x"], truth["y"], truth["x"] + truth["width"], truth["y"] + truth["height"]] if truth else None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            collected = await collect_elements(page, viewport)
+            collect_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            element = pick_element(rank_elements(collected, params, action, viewport))
+            rank_times.append(time.perf_counter() - start)
+        elements = len(collected)
+        if element is not None:
+            hits += 1
+            correct += truth_box is not None and score_box(element["box"], truth_box)["hit"]
+        else:
+            logger.info(f"[{cards} 张卡片] 置信度不足，将退回 VL 定位：{params['target']}")
+    return {
+        "cards": cards,
+        "elements": elements,
+        "targets": len(TARGETS),
+        "hit_rate": round(hits / len(TARGETS), 3),
+        "precision": round(correct / hits, 3) if hits else None,
+        "collect_ms_p50": round(statistics.median(collect_times) * 1000, 2),
+        "rank_ms_p50": round(statistics.median(rank_times) * 1000, 2),
+        "total_ms_p50": round((statistics.median(collect_times) + statistics.median(rank_times)) * 1000, 2),
+    }
+
+
+async def run(cards_list, repeat):
+    agent = await AsyncBrowserAgent.launch(headless=True, record_dir="")
+    try:
+        return [await run_page(agent, cards, repeat) for cards in cards_list]
+    finally:
+        await agent.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DOM 定位基准")
+    parser.add_argument("--cards", type=str, default="12,200,2000", help="页面上的结果卡片数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=20, help="每个目标重复定位的次数")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run([int(n) for n in args.cards.split(",")], args.repeat))
+    print_table(rows, list(rows[0].keys()))
+    save_results("dom_grounding", {"settings": vars(args), "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""截图编码设置对比：缩放 / 格式 / 质量 / 灰度 / detail 对定位时延、请求体积与定位精度的影响。
+
+样本来自 benchmarks/grounding_truth.json（人工标注的目标框，坐标为原始截图像素）。
+需要可用的模型服务（与 grounding_demo.py 相同的环境变量）。
+用法：python -m benchmarks.encoding [--repeat 1]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import install_usage_meter, load_grounding_truth, print_table, save_results, score_box
+from utils.grounding import grounding_async
+from utils.imageProcessing import EncodeOptions, Frame
+
+SETTINGS = {
+    "png-full": EncodeOptions(),
+    "jpeg85-full": EncodeOptions(format="jpeg", quality=85),
+    "jpeg70-1024": EncodeOptions(max_side=1024, format="jpeg", quality=70),
+    "webp80-1024": EncodeOptions(max_side=1024, format="webp", quality=80),
+    "jpeg70-768-gray": EncodeOptions(max_side=768, format="jpeg", quality=70, grayscale=True),
+    "png-detail-low": EncodeOptions(detail="low"),
+}
+
+
+async def run_setting(name: str, options: EncodeOptions, samples, frames, repeat: int, meter) -> dict:
+    latencies, hits, ious, failures = [], 0, [], 0
+    meter.reset()
+    for _ in range(repeat):
+        for sample in samples:
+            frame = frames[sample["image"]]
+            start = time.perf_counter()
+            try:
+                box_data = await grounding_async(sample["prompt"], frame, use_cache=False, encode=options)
+            except Exception as e:
+                logger.error(f"[{name}] {sample['target']} 定位失败: {e}")
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            score = score_box(box_data.get("box"), sample["box"])
+            hits += score["hit"]
+            ious.append(score["iou"])
+    done = len(latencies)
+    payload_bytes = [len(frames[s["image"]].encode(options).data) for s in samples]
+    return {
+        "setting": name,
+        "resolution": "x".join(map(str, frames[samples[0]["image"]].encode(options).resolution)),
+        "kb_mean": round(statistics.mean(payload_bytes) / 1024, 1),
+        "failures": failures,
+        "latency_median_s": round(statistics.median(latencies), 2) if done else None,
+        "prompt_tokens_mean": round(meter.prompt_tokens / max(1, meter.calls)),
+        "hit_rate": round(hits / done, 3) if done else None,
+        "iou_mean": round(statistics.mean(ious), 3) if done else None,
+    }
+
+
+async def run(settings, repeat: int):
+    samples = load_grounding_truth()
+    frames = {s["image"]: Frame.from_path(s["path"]) for s in samples}
+    logger.info(f"共 {len(samples)} 个定位样本，{len(frames)} 张截图")
+    meter = install_usage_meter()
+    return [await run_setting(name, SETTINGS[name], samples, frames, repeat, meter) for name in settings]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图编码设置基准")
+    parser.add_argument("--settings", type=str, nargs="+", default=list(SETTINGS), choices=list(SETTINGS),
+                        help="参与对比的编码设置")
+    parser.add_argument("--repeat", type=int, default=1, help="每个样本重复次数")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args.settings, args.repeat))
+    print_table(rows, list(rows[0].keys()))
+    save_results("encoding", {"rows": rows, "settings": {name: repr(SETTINGS[name]) for name in args.settings}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""整页感知基准：目标在首屏以下时，逐屏滚动（视口截图）与整页截图分屏并发感知（utils.tiledPerception）所需的步数与耗时。
+
+页面：把 images/1.png … images/N.png 纵向拼成一个 N 屏高的长页面，每屏放 6 个互不同名的入口元素；
+用模拟浏览器按滚动位置裁出视口截图或整页截图，执行与等待稳定用固定耗时模拟。
+模型：benchmarks.mock_server 的替身服务，回答不按录制顺序回放，而是由“看得见整页的模型”按请求中的截图
+（按像素行在长页面中找到它的位置）与文本生成：描述与页面状态只列出截图内完整可见的元素，定位返回元素在截图中的框，
+决策在页面状态中出现目标时点击它，否则向下滚动，点击后结束。编号选择（Set-of-Marks）一律回答没有符合的候选，
+pos 使用无法识别的方位，视口流程的定位因此直接发送整帧。
+
+对每一屏上的目标分别运行两种流程，统计步数、总耗时、模型调用次数与点击是否落在目标上。
+不需要浏览器与模型服务。
+用法：python -m benchmarks.full_page [--screens 5] [--ttft-ms 300] [--settle-ms 300]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import statistics
+import time
+from io import BytesIO
+
+from loguru import logger
+from PIL import Image, ImageDraw
+
+from benchmarks.common import ROOT, print_table, save_results
+from benchmarks.mock_server import MockLatency, MockOpenAIServer, ScriptedResponder
+from benchmarks.replay import clear_caches
+from utils import FULL_PAGE_MAX_TILES, Config, runtime
+from utils.agent import TASK_DONE, agent_start_async
+from utils.imageProcessing import Frame, box_center
+
+LABELS = [
+    "演唱会回放", "官方账号", "热门评论", "相关推荐", "下载客户端", "直播预告", "专栏文章", "粉丝勋章", "周边商城", "创作中心",
+    "历史记录", "稍后再看", "音乐区", "舞蹈区", "游戏区", "知识区", "科技区", "生活区", "美食区", "动画区",
+    "番剧索引", "国创", "纪录片", "电影", "电视剧", "综艺", "赛事", "漫画", "会员购", "课堂",
+]
+INSTRUCTION = "在页面中找到指定的入口并点击"
+POS = "页面主体区域"  # pos_region 无法识别，不按区域裁剪
+
+
+def build_page(screens: int):
+    """拼接长页面，返回 (图像, 视口大小, 元素列表)；元素 box 为页面坐标"""
+    images = [Image.open(ROOT / "images" / f"{i}.png").convert("RGB") for i in range(1, screens + 1)]
+    width, height = images[0].size
+    page = Image.new("RGB", (width, height * screens))
+    elements = []
+    draw = ImageDraw.Draw(page)
+    for k, image in enumerate(images):
+        page.paste(image.resize((width, height)), (0, k * height))
+        for j in range(6):
+            x = round(width * (0.1 if j % 2 == 0 else 0.55))
+            y = k * height + round(height * (0.12 + 0.28 * (j // 2)))
+            box = [x, y, x + round(width * 0.3), y + 60]
+            draw.rectangle(box, outline="#e6194b", width=3)
+            elements.append({"label": LABELS[k * 6 + j], "box": box, "screen": k + 1})
+    # 左边缘两列像素写入行号，长页面中每一行都不相同，替身模型据此找到截图的位置
+    for y in range(page.height):
+        page.putpixel((0, y), (y // 256, 0, 0))
+        page.putpixel((1, y), (y % 256, 0, 0))
+    return page, (width, height), elements
+
+
+class PageOracle:
+    """看得见整页的模型替身：按截图在长页面中的位置回答各类请求"""
+
+    def __init__(self, page: Image.Image, elements: list, rows: int = 4):
+        import numpy as np
+        self.gray = np.asarray(page.getchannel("R"))
+        self.elements = elements
+        self.target = None
+        self.rows = rows
+        self.index = {}
+        for y in range(self.gray.shape[0] - rows + 1):
+            self.index.setdefault(self.gray[y:y + rows].tobytes(), []).append(y)
+
+    def locate(self, image: Image.Image) -> int:
+        """截图上边缘的页面坐标 y：找截图中第一段在页面中唯一出现的像素行（左边缘的行号保证唯一）"""
+        import numpy as np
+        gray = np.asarray(image.convert("RGB").getchannel("R"))
+        for r in range(gray.shape[0] - self.rows + 1):
+            ys = self.index.get(gray[r:r + self.rows].tobytes())
+            if ys is not None and len(ys) == 1:
+                return ys[0] - r
+        raise ValueError("无法在页面中找到截图的位置")
+
+    def visible(self, top: int, height: int) -> list:
+        return [e for e in self.elements if e["box"][1] >= top and e["box"][3] <= top + height]
+
+    @staticmethod
+    def _image(request) -> Image.Image:
+        for message in request["messages"]:
+            for part in message["content"] if isinstance(message["content"], list) else []:
+                if part.get("type") == "image_url":
+                    return Image.open(BytesIO(base64.b64decode(part["image_url"]["url"].split(",", 1)[1])))
+        raise ValueError("请求中没有截图")
+
+    @staticmethod
+    def _text(request) -> str:
+        return "\n".join(part.get("text", "") if isinstance(part, dict) else str(part)
+                         for message in request["messages"][1:]
+                         for part in (message["content"] if isinstance(message["content"], list) else [message["content"]]))
+
+    def _state(self, top: int, height: int) -> str:
+        elements = [{"label": e["label"], "type": "按钮", "position": POS, "role": "interactive"}
+                    for e in self.visible(top, height)]
+        return "```json\n" + json.dumps({"page_type": "长页面", "step": None, "elements": elements}, ensure_ascii=False) + "\n```"
+
+    def respond(self, kind: str, request: dict) -> str:
+        if kind == "describe":
+            image = self._image(request)
+            top = self.locate(image)
+            labels = "、".join(e["label"] for e in self.visible(top, image.height))
+            return f"[视口顶部 {top} 高 {image.height}] 这是长页面的一屏，可见入口：{labels or '无'}。"
+        if kind == "page_state":
+            top, height = map(int, re.search(r"\[视口顶部 (\d+) 高 (\d+)\]", self._text(request)).groups())
+            return self._state(top, height)
+        if kind == "image_state":
+            image = self._image(request)
+            return self._state(self.locate(image), image.height)
+        if kind == "decide":
+            text = self._text(request)
+            if f"点击 {self.target['label']}" in text:
+                operation = {"reasoning": "已点击目标入口。", "action": "SUCCESS", "params": {}}
+            elif self.target["label"] in text:
+                operation = {"reasoning": "页面中出现目标入口，点击它。", "action": "CLICK",
+                             "params": {"target": self.target["label"], "pos": POS}}
+            else:
+                operation = {"reasoning": "当前页面没有目标入口，向下滚动。", "action": "SCROLL", "params": {"direction": "向下"}}
+            return "```json\n" + json.dumps(operation, ensure_ascii=False) + "\n```"
+        if kind == "grounding":
+            image = self._image(request)
+            top = self.locate(image)
+            label = re.search(r"标注为“(.+?)”", self._text(request)).group(1)
+            element = next(e for e in self.elements if e["label"] == label)
+            box = [element["box"][0], element["box"][1] - top, element["box"][2], element["box"][3] - top]
+            return json.dumps({"box": box, "label": label, "type": "按钮", "screen": list(image.size)}, ensure_ascii=False)
+        if kind == "grounding_batch":
+            image = self._image(request)
+            top = self.locate(image)
+            visible = {e["label"]: e for e in self.visible(top, image.height)}
+            found = {}
+            for i, label in re.findall(r"^(\d+)\. .*?标注为“(.+?)”", self._text(request), re.M):
+                if label in visible:
+                    box = visible[label]["box"]
+                    found[i] = {"box": [box[0], box[1] - top, box[2], box[3] - top], "label": label, "type": "按钮"}
+            return json.dumps({"screen": list(image.size), "elements": found}, ensure_ascii=False)
+        if kind == "grounding_marks":
+            return json.dumps({"mark": None, "label": "", "type": ""})
+        return ""
+
+
+class OracleServer(MockOpenAIServer):
+    """回答由 PageOracle 生成的替身服务（延迟与故障注入同 MockOpenAIServer）"""
+
+    def __init__(self, oracle: PageOracle, latency: MockLatency = None):
+        super().__init__(ScriptedResponder({}), latency)
+        self.oracle = oracle
+
+    def _acquire(self, kind: str, body: bytes):
+        return None, self.oracle.respond(kind, json.loads(body))
+
+
+class SimulatedAgent:
+    record_dir = ""  # 不录制
+
+
+class TallPageBrowser:
+    """长页面上的模拟浏览器：接口与 AsyncWebBrowserOperator 相同（含整页截图与按页面坐标执行）"""
+
+    def __init__(self, page: Image.Image, viewport, execute_ms: float = 50, settle_ms: float = 300, scroll_step: int = 300):
+        self.agent = SimulatedAgent()
+        self.page = page
+        self.viewport = viewport
+        self.execute_ms = execute_ms
+        self.settle_ms = settle_ms
+        self.scroll_step = scroll_step
+        self.scroll_y = 0
+        self.clicks = []
+
+    def _clamp(self, y) -> int:
+        return max(0, min(round(y), self.page.height - self.viewport[1]))
+
+    async def start(self, url):
+        self.scroll_y = 0
+        self.clicks = []
+
+    async def screen_shot(self) -> Frame:
+        box = (0, self.scroll_y, self.viewport[0], self.scroll_y + self.viewport[1])
+        return await asyncio.to_thread(lambda: Frame.from_image(self.page.crop(box)))
+
+    async def full_page_shot(self, max_height: int = None):
+        bottom = self.page.height if not max_height else min(self.page.height, self.scroll_y + max_height)
+        box = (0, self.scroll_y, self.viewport[0], bottom)
+        return await asyncio.to_thread(lambda: Frame.from_image(self.page.crop(box))), self.scroll_y
+
+    async def execute(self, operation, box=None, text=""):
+        await asyncio.sleep(self.execute_ms / 1000)
+        if operation["type"] in ("CLICK", "TYPE"):
+            x, y = box_center(box)
+            self.clicks.append((x, y + self.scroll_y))
+        elif operation["type"] == "SCROLL":
+            self.scroll_y = self._clamp(self.scroll_y + (self.scroll_step if operation["direction"] == "向下" else -self.scroll_step))
+
+    async def execute_at_page(self, operation, page_box, text=""):
+        self.scroll_y = self._clamp((page_box[1] + page_box[3]) / 2 - self.viewport[1] / 2)
+        await self.execute(operation, [page_box[0], page_box[1] - self.scroll_y, page_box[2], page_box[3] - self.scroll_y], text)
+
+    async def wait(self, sleep_sec=0, timeout=None):
+        await asyncio.sleep(self.settle_ms / 1000)
+
+    async def back(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def run_flow(server, oracle, browser, target, full_page: bool, max_steps: int) -> dict:
+    clear_caches()
+    oracle.target = target
+    requests = server.stats["requests"]
+    start = time.perf_counter()
+    error = ""
+    history = []
+    try:
+        history = await agent_start_async("about:blank", INSTRUCTION, "two-stage", browser, interactive=False,
+                                          max_steps=max_steps, full_page=full_page)
+    except Exception as e:
+        error = str(e)
+        logger.error(f"运行失败: {e}")
+    x1, y1, x2, y2 = target["box"]
+    return {
+        "flow": "full_page" if full_page else "viewport",
+        "target_screen": target["screen"],
+        "steps": len(history),
+        "wall_s": round(time.perf_counter() - start, 2),
+        "model_calls": server.stats["requests"] - requests,
+        "success": bool(history) and history[-1].get("result") == TASK_DONE,
+        "hit": any(x1 <= x <= x2 and y1 <= y <= y2 for x, y in browser.clicks),
+        "error": error,
+    }
+
+
+async def run(args):
+    page, viewport, elements = build_page(min(args.screens, 5))
+    oracle = PageOracle(page, elements)
+    latency = MockLatency(ttft_ms=args.ttft_ms, chunk_ms=args.chunk_ms, jitter=0.0)
+    # 每屏取中间一行左侧的元素为目标
+    targets = [next(e for e in elements if e["screen"] == k and e["box"][0] < viewport[0] / 2
+                    and e["box"][1] - (k - 1) * viewport[1] > viewport[1] * 0.3) for k in range(1, args.screens + 1)]
+    rows = []
+    with OracleServer(oracle, latency) as server:
+        runtime.config = Config(api_key="replay", api_url=server.url)
+        for full_page in (False, True):
+            for target in targets:
+                browser = TallPageBrowser(page, viewport, args.execute_ms, args.settle_ms)
+                rows.append(await run_flow(server, oracle, browser, target, full_page, args.max_steps))
+                logger.info(f"{rows[-1]['flow']} 第 {target['screen']} 屏：{rows[-1]['steps']} 步，{rows[-1]['wall_s']}s")
+    return rows, page.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整页感知基准")
+    parser.add_argument("--screens", type=int, default=5, help="长页面的屏数（使用 images/1.png 起的截图，最多 5）")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="模型首 token 延迟（毫秒）")
+    parser.add_argument("--chunk-ms", type=float, default=20.0, help="流式输出每块的间隔（毫秒）")
+    parser.add_argument("--execute-ms", type=float, default=50.0, help="模拟的浏览器操作耗时（毫秒）")
+    parser.add_argument("--settle-ms", type=float, default=300.0, help="模拟的等待页面稳定耗时（毫秒）")
+    parser.add_argument("--max-steps", type=int, default=30, help="每次任务最多执行的步数")
+    args = parser.parse_args()
+
+    rows, page_size = asyncio.run(run(args))
+    print_table(rows, [k for k in rows[0] if k != "error"])
+    summary = []
+    for flow in ("viewport", "full_page"):
+        runs = [r for r in rows if r["flow"] == flow]
+        summary.append({
+            "flow": flow,
+            "steps_mean": round(statistics.mean(r["steps"] for r in runs), 2),
+            "wall_mean_s": round(statistics.mean(r["wall_s"] for r in runs), 2),
+            "model_calls_mean": round(statistics.mean(r["model_calls"] for r in runs), 1),
+            "succeeded": sum(r["success"] for r in runs),
+            "hits": sum(r["hit"] for r in runs),
+        })
+    print_table(summary, list(summary[0].keys()))
+    logger.success(f"页面 {page_size[0]}x{page_size[1]}，整页感知最多 {FULL_PAGE_MAX_TILES} 屏：平均步数 "
+                   f"{summary[0]['steps_mean']} → {summary[1]['steps_mean']}，平均耗时 "
+                   f"{summary[0]['wall_mean_s']}s → {summary[1]['wall_mean_s']}s")
+    save_results("full_page", {"settings": vars(args), "runs": rows, "summary": summary})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""批量定位对比：同一截图上的 N 个目标，逐个调用 grounding（串行 / 并发）与一次 grounding_batch 的总耗时、token 与精度。
+
+样本来自 benchmarks/grounding_truth.json，按截图分组，每组取前 --targets 个目标。
+需要可用的模型服务（与 grounding_demo.py 相同的环境变量）。
+用法：python -m benchmarks.grounding_batch [--targets 5] [--repeat 1]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from itertools import groupby
+
+from loguru import logger
+
+from benchmarks.common import install_usage_meter, load_grounding_truth, print_table, save_results, score_box
+from utils.grounding import grounding_async, grounding_batch_async
+from utils.imageProcessing import Frame
+
+
+async def locate_single_serial(frame, prompts):
+    return [await grounding_async(prompt, frame, use_cache=False, record_dir="") for prompt in prompts]
+
+
+async def locate_single_concurrent(frame, prompts):
+    return await asyncio.gather(*(grounding_async(prompt, frame, use_cache=False, record_dir="") for prompt in prompts))
+
+
+async def locate_batch(frame, prompts):
+    results = await grounding_batch_async(frame, dict(enumerate(prompts)), use_cache=False, record_dir="")
+    return [results[i] for i in range(len(prompts))]
+
+
+MODES = {
+    "single-serial": locate_single_serial,
+    "single-concurrent": locate_single_concurrent,
+    "batch": locate_batch,
+}
+
+
+async def run_mode(name, groups, repeat, meter) -> dict:
+    latencies, hits, ious, targets, failures = [], 0, [], 0, 0
+    meter.reset()
+    for _ in range(repeat):
+        for frame, samples in groups:
+            prompts = [s["prompt"] for s in samples]
+            start = time.perf_counter()
+            try:
+                results = await MODES[name](frame, prompts)
+            except Exception as e:
+                logger.error(f"[{name}] 定位失败: {e}")
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            for sample, box_data in zip(samples, results):
+                score = score_box(box_data.get("box"), sample["box"])
+                hits += score["hit"]
+                ious.append(score["iou"])
+                targets += 1
+    done = len(latencies)
+    return {
+        "mode": name,
+        "groups": len(groups) * repeat,
+        "failures": failures,
+        "latency_median_s": round(statistics.median(latencies), 2) if done else None,
+        "model_calls": meter.calls,
+        "prompt_tokens": meter.prompt_tokens,
+        "completion_tokens": meter.completion_tokens,
+        "hit_rate": round(hits / targets, 3) if targets else None,
+        "iou_mean": round(statistics.mean(ious), 3) if ious else None,
+    }
+
+
+async def run(modes, max_targets, repeat):
+    samples = sorted(load_grounding_truth(), key=lambda s: s["image"])
+    groups = []
+    for image, group in groupby(samples, key=lambda s: s["image"]):
+        group = list(group)[:max_targets]
+        groups.append((Frame.from_path(group[0]["path"]), group))
+    logger.info(f"共 {len(groups)} 张截图，每张最多 {max_targets} 个目标")
+    meter = install_usage_meter()
+    return [await run_mode(name, groups, repeat, meter) for name in modes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量定位基准")
+    parser.add_argument("--targets", type=int, default=5, help="每张截图参与对比的目标数")
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数")
+    parser.add_argument("--modes", type=str, nargs="+", default=list(MODES), choices=list(MODES), help="参与对比的方式")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args.modes, args.targets, args.repeat))
+    print_table(rows, list(rows[0].keys()))
+    save_results("grounding_batch", {"targets": args.targets, "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
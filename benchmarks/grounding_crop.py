@@ -0,0 +1,95 @@
+"""按 pos 裁剪定位的对比：整帧定位与先在 pos 区域内定位（找不到再逐步扩大）的像素量、精度与耗时。
+
+- 像素量：images/ 下的每张截图在几种常见 pos 下，各级裁剪区域（放大后）与整帧送入模型的像素数，不需要模型服务
+- 精度与耗时（--model）：benchmarks/grounding_truth.json 的标注目标，pos 取自定位指令中的“位于……”，
+  需要可用的模型服务（与 grounding_demo.py 相同的环境变量）
+
+用法：python -m benchmarks.grounding_crop [--model] [--repeat 1]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import install_usage_meter, list_images, load_grounding_truth, print_table, prompt_pos, save_results, score_box
+from utils.grounding import _crop_frame, crop_regions, grounding_async, grounding_stats
+from utils.imageProcessing import Frame
+
+POSITIONS = ["顶部左侧", "顶部居中", "右上角", "页面正中", "页面左侧", "底部右侧"]
+
+
+def pixel_rows():
+    rows = []
+    for path in list_images():
+        frame = Frame.from_path(path)
+        full = frame.encode().resolution
+        for pos in POSITIONS:
+            sent = [crop.encode().resolution for crop in (_crop_frame(frame, region) for region in crop_regions(pos, frame.resolution))]
+            rows.append({
+                "image": path.name,
+                "pos": pos,
+                "full_px": full[0] * full[1],
+                **{f"crop{level}_px": w * h for level, (w, h) in enumerate(sent)},
+                "crop0_ratio": round(sent[0][0] * sent[0][1] / (full[0] * full[1]), 3) if sent else None,
+            })
+    return rows
+
+
+async def run_model(repeat: int):
+    samples = load_grounding_truth()
+    meter = install_usage_meter()
+    rows = []
+    for mode in ("full", "crop"):
+        meter.reset()
+        grounding_stats.reset()
+        latencies, hits, ious = [], 0, []
+        for _ in range(repeat):
+            for sample in samples:
+                frame = Frame.from_path(sample["path"])
+                pos = prompt_pos(sample["prompt"]) if mode == "crop" else None
+                start = time.perf_counter()
+                try:
+                    box_data = await grounding_async(sample["prompt"], frame, use_cache=False, record_dir="", pos=pos)
+                except Exception as e:
+                    logger.error(f"[{mode}] 定位失败: {e}")
+                    continue
+                latencies.append(time.perf_counter() - start)
+                score = score_box(box_data.get("box"), sample["box"])
+                hits += score["hit"]
+                ious.append(score["iou"])
+        rows.append({
+            "mode": mode,
+            "targets": len(samples) * repeat,
+            "hit_rate": round(hits / len(ious), 3) if ious else None,
+            "iou_mean": round(statistics.mean(ious), 3) if ious else None,
+            "latency_median_s": round(statistics.median(latencies), 2) if latencies else None,
+            "model_calls": meter.calls,
+            "prompt_tokens": meter.prompt_tokens,
+            "completion_tokens": meter.completion_tokens,
+            "crop_levels": {name: stats["hits"] for name, stats in grounding_stats.summary().items()},
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按 pos 裁剪定位的对比")
+    parser.add_argument("--model", action="store_true", help="调用模型服务测量精度与耗时")
+    parser.add_argument("--repeat", type=int, default=1, help="每个目标重复定位的次数")
+    args = parser.parse_args()
+
+    rows = pixel_rows()
+    print_table(rows, ["image", "pos", "full_px", "crop0_px", "crop1_px", "crop0_ratio"])
+    ratios = [r["crop0_ratio"] for r in rows if r["crop0_ratio"] is not None]
+    logger.success(f"第一级裁剪送入模型的像素数为整帧的 {statistics.median(ratios):.1%}（中位数，含放大）")
+    result = {"settings": vars(args), "pixels": rows}
+    if args.model:
+        result["model"] = asyncio.run(run_model(args.repeat))
+        print_table(result["model"], ["mode", "targets", "hit_rate", "iou_mean", "latency_median_s", "model_calls",
+                                      "prompt_tokens", "completion_tokens"])
+    save_results("grounding_crop", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""导入耗时基准：在全新解释器中导入 utils 子模块，统计耗时并确认没有启动任何子进程。
+
+用法：python -m benchmarks.import_time [--module utils.grounding] [--repeat 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 子解释器中执行：拦截所有创建子进程的入口后再导入目标模块
+PROBE = r'''
+import json, os, subprocess, sys, time
+spawned = []
+def _record(name, original):
+    def wrapper(*args, **kwargs):
+        spawned.append(name)
+        return original(*args, **kwargs)
+    return wrapper
+subprocess.Popen.__init__ = _record("subprocess.Popen", subprocess.Popen.__init__)
+for name in ("system", "fork", "posix_spawn", "posix_spawnp", "execv", "execve"):
+    if hasattr(os, name):
+        setattr(os, name, _record(f"os.{name}", getattr(os, name)))
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed_ms": elapsed * 1000,
+    "spawned": spawned,
+    "heavy_modules": [m for m in ("openai", "playwright", "httpx") if m in sys.modules],
+}))
+'''
+
+
+def measure_once(module: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "DASHSCOPE_API_KEY"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, module],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="utils 包导入耗时基准")
+    parser.add_argument("--module", type=str, default="utils.grounding", help="要导入的模块")
+    parser.add_argument("--repeat", type=int, default=10, help="重复次数（每次都是全新解释器）")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.repeat)]
+    times = [r["elapsed_ms"] for r in runs]
+    spawned = sorted({name for r in runs for name in r["spawned"]})
+    heavy = sorted({name for r in runs for name in r["heavy_modules"]})
+
+    logger.info(f"import {args.module}: 中位数 {statistics.median(times):.1f} ms, "
+                f"最小 {min(times):.1f} ms, 最大 {max(times):.1f} ms（{args.repeat} 次）")
+    logger.info(f"导入期间启动的子进程: {spawned or '无'}")
+    logger.info(f"导入期间加载的重量级依赖: {heavy or '无'}")
+    if spawned or heavy:
+        logger.error("导入存在副作用")
+        sys.exit(1)
+    logger.success("导入无副作用")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""JSON 提取器微基准与模糊测试：旧版 load_json_from_llm（贪婪正则兜底）与增量提取器 JsonExtractor 对比。
+
+语料 benchmarks/json_corpus.jsonl 的 JSON 主体取自 README 中记录的真实模型输出（定位框、PageState、operation），
+外面包上模型实际出现过的几类形态：代码块、行内反引号、<think> 推理块、前后说明文字、草稿 + 最终结果等。
+每条语料按调用方的校验规则判定是否可用；不可用即意味着一次完整的模型重试。
+
+不需要模型服务。用法：python -m benchmarks.json_extract [--fuzz 2000] [--chunk 4]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from loguru import logger
+
+from benchmarks.common import ROOT, print_table, save_results
+from utils.grounding import _validate_box_data
+from utils.llm import _validate_page_state, validate_action
+from utils.tool import JsonExtractor
+
+CORPUS_PATH = ROOT / "benchmarks" / "json_corpus.jsonl"
+VALIDATORS = {
+    "grounding": _validate_box_data,
+    "page_state": _validate_page_state,
+    "action": validate_action,
+}
+# 插入到输出前后的噪声片段：括号、引号、推理块、代码块标记
+NOISE = ["{", "}", "[", "]", '"', "\\", "`", "```json\n", "<think>{\"x\": 1}</think>", "说明", " ", "\n", "{草稿}", "[1]"]
+
+
+def legacy_load_json(output: str):
+    """改造前的 load_json_from_llm：去掉代码块后直接解析，失败再用贪婪正则截取最外层括号"""
+    text = output.strip()
+    if text.startswith("```"):
+        text = "\n".join(text.splitlines()[1:-1]).strip()
+    if text.startswith("`") and text.endswith("`") and text.count("`") == 2:
+        text = text[1:-1].strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*\}|\[.*\]", text, re.S)
+        if match:
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                pass
+        raise ValueError("无法解析")
+
+
+def legacy_parse(text: str, validate):
+    try:
+        return validate(legacy_load_json(text))
+    except Exception:
+        return None
+
+
+def incremental_parse(text: str, validate):
+    extractor = JsonExtractor(validate)
+    return extractor.feed(text) or extractor.finish()
+
+
+def load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def time_call(func, *args, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def run_whole(corpus):
+    """整段解析：可用率（失败即一次模型重试）与单次解析耗时"""
+    rows = []
+    for name, parse in (("legacy", legacy_parse), ("incremental", incremental_parse)):
+        ok, seconds, failed = 0, 0.0, []
+        for sample in corpus:
+            value, elapsed = time_call(parse, sample["text"], VALIDATORS[sample["kind"]])
+            seconds += elapsed
+            if value is not None:
+                ok += 1
+            else:
+                failed.append(f"{sample['kind']}/{sample['wrapper']}")
+        rows.append({
+            "parser": name,
+            "samples": len(corpus),
+            "usable": ok,
+            "retries_triggered": len(corpus) - ok,
+            "parse_us_mean": round(seconds / len(corpus) * 1e6, 1),
+            "failed": failed,
+        })
+    return rows
+
+
+def run_streaming(corpus, chunk: int):
+    """模拟流式接收：旧做法每来一块就重新解析累积文本（O(n²)），新做法逐块 feed"""
+    rows = []
+    for name in ("legacy", "incremental"):
+        seconds, usable_at, ok = 0.0, [], 0
+        for sample in corpus:
+            text, validate = sample["text"], VALIDATORS[sample["kind"]]
+            start = time.perf_counter()
+            extractor = JsonExtractor(validate)
+            received = 0
+            value = None
+            for i in range(0, len(text), chunk):
+                piece = text[i:i + chunk]
+                received += len(piece)
+                if name == "legacy":
+                    value = legacy_parse(text[:received], validate) if any(c in piece for c in "}]`") else None
+                else:
+                    value = extractor.feed(piece)
+                if value is not None:
+                    break
+            if value is None and name == "incremental":
+                value = extractor.finish()
+            seconds += time.perf_counter() - start
+            if value is not None:
+                ok += 1
+                usable_at.append(received / len(text))
+        rows.append({
+            "parser": name,
+            "chunk_chars": chunk,
+            "usable": ok,
+            "parse_ms_total": round(seconds * 1000, 2),
+            "received_at_usable_mean": round(sum(usable_at) / len(usable_at), 3) if usable_at else None,
+        })
+    return rows
+
+
+def run_fuzz(corpus, trials: int, seed: int = 0):
+    """模糊测试：随机噪声包裹 + 随机分块，检查逐块结果与整段结果一致，并统计两种解析器的可用率"""
+    rng = random.Random(seed)
+    mismatches, legacy_ok, incremental_ok = [], 0, 0
+    for i in range(trials):
+        sample = rng.choice(corpus)
+        validate = VALIDATORS[sample["kind"]]
+        text = "".join(rng.choices(NOISE, k=rng.randint(0, 4))) + sample["text"] + "".join(rng.choices(NOISE, k=rng.randint(0, 4)))
+        whole = incremental_parse(text, validate)
+        extractor, pos = JsonExtractor(validate), 0
+        while pos < len(text):
+            step = rng.randint(1, 16)
+            extractor.feed(text[pos:pos + step])
+            pos += step
+        extractor.finish()
+        chunked = extractor.values[0] if extractor.values else None
+        if chunked != whole:
+            mismatches.append(text)
+        legacy_ok += legacy_parse(text, validate) is not None
+        incremental_ok += whole is not None
+    return {
+        "trials": trials,
+        "chunked_mismatches": len(mismatches),
+        "legacy_usable_rate": round(legacy_ok / trials, 3),
+        "incremental_usable_rate": round(incremental_ok / trials, 3),
+        "mismatch_examples": mismatches[:5],
+    }
+
+
+def run_scaling():
+    """线性检查：输出长度翻倍时单次解析耗时应大致翻倍"""
+    rows = []
+    item = '{"label": "元素 {x}", "type": "按钮", "position": "顶部", "role": "interactive"}'
+    for n in (50, 100, 200, 400, 800):
+        text = "<think>" + "先想 {草稿} " * n + "</think>```json\n{\"elements\": [" + ", ".join([item] * n) + "]}\n```" + "\n说明 {x}" * n
+        _, seconds = time_call(incremental_parse, text, _validate_page_state, repeat=5)
+        rows.append({"elements": n, "chars": len(text), "parse_ms": round(seconds * 1000, 2)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 提取器基准与模糊测试")
+    parser.add_argument("--fuzz", type=int, default=2000, help="模糊测试次数")
+    parser.add_argument("--chunk", type=int, default=4, help="模拟流式接收时每块的字符数")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    logger.info(f"语料共 {len(corpus)} 条")
+    whole = run_whole(corpus)
+    print_table(whole, ["parser", "samples", "usable", "retries_triggered", "parse_us_mean"])
+    for row in whole:
+        if row["failed"]:
+            logger.warning(f"[{row['parser']}] 不可用的语料：{row['failed']}")
+    streaming = run_streaming(corpus, args.chunk)
+    print_table(streaming, list(streaming[0].keys()))
+    fuzz = run_fuzz(corpus, args.fuzz)
+    logger.info(f"模糊测试：{ {k: v for k, v in fuzz.items() if k != 'mismatch_examples'} }")
+    scaling = run_scaling()
+    print_table(scaling, list(scaling[0].keys()))
+    save_results("json_extract", {"whole": whole, "streaming": streaming, "fuzz": fuzz, "scaling": scaling})
+
+
+if __name__ == "__main__":
+    main()
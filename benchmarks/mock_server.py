@@ -0,0 +1,272 @@
+"""本地的 OpenAI 兼容模型替身：实现 POST /v1/chat/completions（含流式 SSE），按录制的回答依次回放。
+
+请求按 system prompt 归类（describe / page_state / image_state / decide / grounding / grounding_batch / grounding_marks / vqa，
+与 utils.streaming 记录回答时使用的调用名一致），每类回答按录制顺序循环取用；
+与进行中的请求完全相同的请求（并行采样、对冲请求）拿到同一条回答。
+可配置首 token 延迟、逐块输出间隔与抖动，并按比例注入 HTTP 500 与格式错误的回答。
+
+单独运行：python -m benchmarks.mock_server --session benchmarks/sessions/bilibili_search --port 8765
+然后设置 DASHSCOPE_API_URL=http://127.0.0.1:8765/v1 DASHSCOPE_API_KEY=replay 运行任意 demo。
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from loguru import logger
+
+from utils.grounding import SYSTEM_PROMPT_UI, SYSTEM_PROMPT_UI_BATCH, SYSTEM_PROMPT_UI_CROP, SYSTEM_PROMPT_UI_MARKS
+from utils.llm import DESC_TO_STATE_PROMPT, DESCRIBE_PROMPT, OPERATION_INFERENCE_PROMPT, PIC_TO_JSON_PROMPT
+
+PROMPT_KINDS = {
+    DESCRIBE_PROMPT: "describe",
+    DESC_TO_STATE_PROMPT: "page_state",
+    PIC_TO_JSON_PROMPT: "image_state",
+    OPERATION_INFERENCE_PROMPT: "decide",
+    SYSTEM_PROMPT_UI: "grounding",
+    SYSTEM_PROMPT_UI_CROP: "grounding",
+    SYSTEM_PROMPT_UI_BATCH: "grounding_batch",
+    SYSTEM_PROMPT_UI_MARKS: "grounding_marks",
+}
+# 录制中没有的调用类别使用的默认回答：早先的录制没有编号选择，固定选第 1 个候选（回放不检查框的位置）
+DEFAULT_RESPONSES = {
+    "grounding_marks": ['```json\n{"mark": 1, "label": "", "type": ""}\n```'],
+}
+MALFORMED_RESPONSE = "抱歉，我暂时无法给出结构化结果。"
+
+
+@dataclass
+class MockLatency:
+    ttft_ms: float = 300.0  # 首 token（非流式时为整个回答）前的等待
+    chunk_ms: float = 20.0  # 流式输出中每块之间的间隔
+    chunk_chars: int = 8  # 每块的字符数
+    jitter: float = 0.2  # 延迟的相对随机抖动
+    fail_rate: float = 0.0  # 返回 HTTP 500 的比例
+    malformed_rate: float = 0.0  # 返回无法解析的回答的比例（触发应用层重试）
+
+
+def classify(messages) -> str:
+    """按 system prompt 判断请求属于哪类调用"""
+    system = messages[0] if messages and messages[0].get("role") == "system" else {}
+    content = system.get("content", "")
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return PROMPT_KINDS.get(content, "vqa")
+
+
+class ScriptedResponder:
+    """按调用类别循环回放录制的回答"""
+
+    def __init__(self, responses: dict):
+        self.responses = {kind: list(items) for kind, items in responses.items() if items}
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_jsonl(cls, path):
+        responses = defaultdict(list)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    responses[record["name"]].append(record["content"])
+        return cls(responses)
+
+    def reset(self):
+        """回到每类回答的第一条（每轮回放开始时调用）"""
+        with self._lock:
+            self._cursor.clear()
+
+    def next(self, kind: str) -> str:
+        with self._lock:
+            items = self.responses.get(kind) or DEFAULT_RESPONSES.get(kind) or self.responses.get("vqa") or [""]
+            content = items[self._cursor[kind] % len(items)]
+            self._cursor[kind] += 1
+        return content
+
+
+class MockOpenAIServer:
+    """在后台线程中运行的替身服务；url 可直接作为 OpenAI 客户端的 base_url"""
+
+    def __init__(self, responder: ScriptedResponder, latency: MockLatency = None, host="127.0.0.1", port=0, seed=0):
+        self.responder = responder
+        self.latency = latency or MockLatency()
+        self.random = random.Random(seed)
+        self.stats = defaultdict(int)
+        self._lock = threading.Lock()
+        self._in_flight = {}  # 请求体哈希 -> [回答, 进行中的请求数]
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        logger.info(f"模型替身服务已启动：{self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _sleep(self, ms: float):
+        if ms > 0:
+            with self._lock:
+                factor = 1 + self.random.uniform(-self.latency.jitter, self.latency.jitter)
+            time.sleep(ms * factor / 1000)
+
+    def _acquire(self, kind: str, body: bytes):
+        """取本次请求的回答。与进行中的请求完全相同的请求（并行采样、对冲）拿到同一条回答，不推进录制顺序"""
+        key = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            entry = self._in_flight.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.stats["duplicate_requests"] += 1
+                return key, entry[0]
+        content = self.responder.next(kind)
+        with self._lock:
+            self._in_flight.setdefault(key, [content, 0])[1] += 1
+        return key, content
+
+    def _release(self, key: str):
+        with self._lock:
+            entry = self._in_flight.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._in_flight[key]
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = json.loads(body)
+                kind = classify(request.get("messages", []))
+                server._count("requests")
+                server._count(f"requests.{kind}")
+                server._count("request_bytes", len(body))
+                if server._roll(server.latency.fail_rate):
+                    server._count("injected_failures")
+                    self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                    return
+                key = None
+                if kind not in ("describe", "vqa") and server._roll(server.latency.malformed_rate):
+                    # 不消耗录制的回答，应用层重试时仍拿到同一条
+                    server._count("injected_malformed")
+                    content = MALFORMED_RESPONSE
+                else:
+                    key, content = server._acquire(kind, body)
+                usage = {"prompt_tokens": len(body) // 4, "completion_tokens": len(content),
+                         "total_tokens": len(body) // 4 + len(content)}
+                server._sleep(server.latency.ttft_ms)
+                try:
+                    if request.get("stream"):
+                        self._stream(request, content, usage)
+                    else:
+                        self._send_json(200, {
+                            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": request.get("model", "mock"),
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": content}}],
+                            "usage": usage,
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    server._count("client_disconnects")  # 客户端拿到完整 JSON 后提前断开，或取消了多余的请求
+                finally:
+                    if key is not None:
+                        server._release(key)
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, request, content, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": request.get("model", "mock")}
+                step = max(1, server.latency.chunk_chars)
+                for i in range(0, len(content), step):
+                    if i:
+                        server._sleep(server.latency.chunk_ms)
+                    delta = {"role": "assistant", "content": content[i:i + step]} if i == 0 else {"content": content[i:i + step]}
+                    self._event({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if request.get("stream_options", {}).get("include_usage"):
+                    self._event({**base, "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, payload):
+                self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模型替身服务")
+    parser.add_argument("--session", type=str, required=True, help="包含 responses.jsonl 的录制目录")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--chunk-ms", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    responder = ScriptedResponder.from_jsonl(Path(args.session) / "responses.jsonl")
+    latency = MockLatency(ttft_ms=args.ttft_ms, chunk_ms=args.chunk_ms,
+                          fail_rate=args.fail_rate, malformed_rate=args.malformed_rate)
+    server = MockOpenAIServer(responder, latency, port=args.port).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
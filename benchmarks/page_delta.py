@@ -0,0 +1,108 @@
+"""页面状态增量编码：逐步模拟一个搜索任务，对比每步发送完整页面状态与“基准 + 增量”时的决策输入 token 数。
+
+页面由语料中的首页状态加若干搜索结果卡片构成；操作序列为输入、滚动（顶部卡片移出、底部卡片移入）、
+翻页（页面类型变化，更新基准）。除总 token 数外，还按“与上一次请求相同的消息前缀可命中服务端前缀缓存”
+估算每步需要实际处理的 token 数（两种方式按同一规则计算）。不需要模型服务。
+真实服务上的延迟对比可用 PAGE_STATE_DELTA=0 / 1 分别运行 python -m benchmarks.replay。
+
+用法：python -m benchmarks.page_delta [--steps 30] [--cards 24] [--interval 5]
+"""
+import argparse
+import copy
+import json
+
+from loguru import logger
+
+from benchmarks.common import print_table, save_results
+from benchmarks.decision_prompt import OPERATIONS, load_page_state
+from utils.history import HistoryManager, build_decision_input, estimate_tokens
+from utils.llm import OPERATION_INFERENCE_PROMPT
+from utils.pageDelta import PageStateEncoder
+
+TARGET = "帮我搜索洛天依演唱会的回放视频"
+
+
+def make_card(page: int, index: int) -> dict:
+    return {"label": f"【第{page}页-{index}】洛天依 2024 演唱会 全场回放 超清 {index * 7 % 60}:{index * 13 % 60:02d}",
+            "type": "视频卡片", "position": f"结果列表第 {index} 项", "role": "interactive"}
+
+
+def page_states(steps: int, cards: int):
+    """按 OPERATIONS 的循环生成每一步的页面状态"""
+    state = load_page_state()
+    page, first = 1, 1
+    for step in range(steps):
+        state = copy.deepcopy(state)
+        action = OPERATIONS[(step - 1) % len(OPERATIONS)] if step else None
+        if action is None or action["params"].get("target") == "下一页":
+            page, first = (page + 1 if action else 1), 1
+            state["page_type"] = f"哔哩哔哩搜索结果页（第 {page} 页）"
+        elif action["action"] == "TYPE":
+            state["elements"][1] = {**state["elements"][1], "label": action["params"]["text"]}
+        elif action["action"] == "SCROLL":
+            first += 3
+        base = [e for e in state["elements"] if e["type"] != "视频卡片"]
+        state["elements"] = base + [make_card(page, i) for i in range(first, first + cards)]
+        yield state
+
+
+def request_messages(state, history, encoder=None):
+    """与 decide_next_action_async 相同的消息组装，返回各条消息的文本"""
+    texts, fixed = [OPERATION_INFERENCE_PROMPT], OPERATION_INFERENCE_PROMPT
+    if encoder is not None:
+        reference, state = encoder.encode(state)
+        if reference is not None:
+            texts.append(json.dumps({"reference_page_state": reference}, ensure_ascii=False))
+            fixed += texts[-1]
+    user_input, _ = build_decision_input(state, TARGET, history, fixed, budget=0)
+    return texts + [user_input]
+
+
+def uncached_tokens(messages, previous) -> int:
+    """与上一次请求相同的前缀消息视为命中缓存，只计其后的消息"""
+    shared = 0
+    while shared < min(len(messages), len(previous)) and messages[shared] == previous[shared]:
+        shared += 1
+    return sum(estimate_tokens(text) for text in messages[shared:])
+
+
+def run(steps: int, cards: int, interval: int):
+    history = HistoryManager()
+    encoder = PageStateEncoder(full_interval=interval, enabled=True)
+    rows, prev_full, prev_delta = [], [], []
+    for step, state in enumerate(page_states(steps, cards), 1):
+        full = request_messages(state, history)
+        delta = request_messages(state, history, encoder)
+        rows.append({
+            "step": step,
+            "mode": "full" if json.loads(delta[1])["reference_page_state"]["step"] == step else "delta",
+            "full_tokens": sum(estimate_tokens(t) for t in full),
+            "delta_tokens": sum(estimate_tokens(t) for t in delta),
+            "full_uncached": uncached_tokens(full, prev_full),
+            "delta_uncached": uncached_tokens(delta, prev_delta),
+        })
+        prev_full, prev_delta = full, delta
+        history.append(OPERATIONS[(step - 1) % len(OPERATIONS)])
+    return rows, encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面状态增量编码基准")
+    parser.add_argument("--steps", type=int, default=30, help="模拟的步数")
+    parser.add_argument("--cards", type=int, default=24, help="每页的搜索结果卡片数")
+    parser.add_argument("--interval", type=int, default=5, help="重新发送完整状态的间隔步数")
+    args = parser.parse_args()
+
+    rows, encoder = run(args.steps, args.cards, args.interval)
+    print_table(rows[:12], list(rows[0].keys()))
+    totals = {key: sum(r[key] for r in rows) for key in ("full_tokens", "delta_tokens", "full_uncached", "delta_uncached")}
+    logger.success(f"{len(rows)} 步（完整 {encoder.full_count} 次，增量 {encoder.delta_count} 次）累计输入 token（估算）："
+                   f"完整 {totals['full_tokens']}，增量 {totals['delta_tokens']}；"
+                   f"按前缀缓存计的未缓存部分：完整 {totals['full_uncached']}，增量 {totals['delta_uncached']}"
+                   f"（{totals['delta_uncached'] / totals['full_uncached']:.1%}）")
+    save_results("page_delta", {"settings": vars(args), "totals": totals,
+                                "full_count": encoder.full_count, "delta_count": encoder.delta_count, "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""图块匹配基准：用 benchmarks/grounding_truth.json 的标注框建立图块库，在模拟滚动、重排、缩放与元素消失后的截图上
+找回各目标，统计召回率（得分过阈值的比例）、精度（采用的框中心落在真实位置内的比例）与耗时（先搜 pos 区域 / 只搜整帧）。
+
+“元素消失”把目标区域涂白：此时任何被采用的匹配都是误报，用于检查阈值是否过松。不需要模型服务。
+用法：python -m benchmarks.patch_match [--threshold 0.85] [--repeat 3]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from loguru import logger
+from PIL import Image
+
+from benchmarks.common import load_grounding_truth, print_table, prompt_pos, save_results, score_box
+from utils.cache import PatchStore
+from utils.imageProcessing import Frame, pos_region
+
+
+def shifted(image: Image.Image, dx: int, dy: int) -> Image.Image:
+    """内容向左上移动 (dx, dy)，空出的部分填白，模拟滚动与重排"""
+    canvas = Image.new("RGB", image.size, "white")
+    canvas.paste(image, (-dx, -dy))
+    return canvas
+
+
+def perturbations(image: Image.Image):
+    """(名称, 变换后的图像, 真实框的变换)；变换返回 None 表示目标已不在画面内或已被移除"""
+    w, h = image.size
+    yield "identity", image, lambda box: box
+    for dy in (40, 120):
+        yield f"scroll_{dy}", shifted(image, 0, dy), lambda box, dy=dy: [box[0], box[1] - dy, box[2], box[3] - dy] if box[1] - dy >= 0 else None
+    yield "relayout", shifted(image, -30, 25), lambda box: [box[0] + 30, box[1] - 25, box[2] + 30, box[3] - 25] if box[1] >= 25 else None
+    zoom = image.resize((round(w * 1.1), round(h * 1.1)), Image.Resampling.BILINEAR).crop((0, 0, w, h))
+    yield "zoom_1.1", zoom, lambda box: [round(v * 1.1) for v in box] if box[3] * 1.1 <= h else None
+    yield "removed", image, None
+
+
+def run(threshold: float, repeat: int):
+    samples = load_grounding_truth()
+    stores, frames = {}, {}
+    for sample in samples:
+        frame = frames.setdefault(sample["path"], Frame.from_path(sample["path"]))
+        store = stores.setdefault(sample["path"], PatchStore(threshold=threshold))
+        store.add(sample["target"], frame, {"box": sample["box"], "screen": list(frame.resolution)})
+
+    rows = []
+    for path, frame in frames.items():
+        for name, image, transform in perturbations(frame.image):
+            cases = accepted = correct = 0
+            region_times, full_times = [], []
+            for sample in (s for s in samples if s["path"] == path):
+                if transform is None:
+                    # 把目标区域涂白：元素已从页面上消失
+                    pixels = np.array(image)
+                    x1, y1, x2, y2 = sample["box"]
+                    pixels[y1:y2, x1:x2] = 255
+                    target_frame, truth = Frame.from_image(Image.fromarray(pixels)), None
+                else:
+                    truth = transform(sample["box"])
+                    if truth is None:
+                        continue
+                    target_frame = Frame.from_image(image)
+                target_frame.gray  # 解码不计入匹配耗时
+                cases += 1
+                store = stores[path]
+                region = pos_region(prompt_pos(sample["prompt"]), target_frame.resolution, pad=0.15)
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    result = store.match(sample["target"], target_frame, region)
+                    region_times.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    store.match(sample["target"], target_frame)
+                    full_times.append(time.perf_counter() - start)
+                if result is not None:
+                    accepted += 1
+                    correct += truth is not None and score_box(result["box"], truth)["hit"]
+            if not cases:
+                continue
+            rows.append({
+                "case": name,
+                "targets": cases,
+                "accepted": accepted,
+                "precision": round(correct / accepted, 3) if accepted else None,
+                "recall": round(correct / cases, 3) if transform is not None else None,
+                "region_ms_p50": round(statistics.median(region_times) * 1000, 1),
+                "full_ms_p50": round(statistics.median(full_times) * 1000, 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图块匹配基准")
+    parser.add_argument("--threshold", type=float, default=0.85, help="接受匹配的最低 NCC 得分")
+    parser.add_argument("--repeat", type=int, default=3, help="每个目标重复匹配的次数")
+    args = parser.parse_args()
+
+    rows = run(args.threshold, args.repeat)
+    print_table(rows, list(rows[0].keys()))
+    accepted = sum(r["accepted"] for r in rows)
+    false_positive = sum(r["accepted"] for r in rows if r["case"] == "removed")
+    logger.success(f"共采用 {accepted} 个匹配，其中元素已移除时的误报 {false_positive} 个")
+    save_results("patch_match", {"settings": vars(args), "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""感知策略对比：two-stage / direct / hybrid 在 images/ 样例截图上的单步耗时、输出 token 与下游决策有效性。
+
+需要可用的模型服务（与 agent_demo.py 相同的环境变量）。
+用法：python -m benchmarks.perception_strategies [--images "*.png"] [--inst "帮我搜索洛天依演唱会的回放视频"]
+"""
+import argparse
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import install_usage_meter, list_images, print_table, save_results
+from utils.imageProcessing import Frame
+from utils.llm import PERCEPTION_STRATEGIES, decide_next_action, perceive_page_state
+from utils.streaming import stream_stats
+
+
+def action_is_grounded(action: dict, page_state: dict) -> bool:
+    """决策有效：动作合法，且 CLICK/TYPE 的目标能在页面状态的元素里找到（文字互相包含即可）"""
+    if action.get("action") not in ("CLICK", "TYPE"):
+        return True
+    target = str(action.get("params", {}).get("target", "")).strip()
+    if not target:
+        return False
+    for element in page_state.get("elements", []):
+        label = str(element.get("label") or element.get("content") or "").strip()
+        if label and (target in label or label in target):
+            return True
+    return False
+
+
+def run_strategy(strategy: str, frames, instruction: str, meter) -> dict:
+    latencies, tokens, elements, valid, failures = [], [], [], 0, 0
+    stream_stats.reset()
+    for path, frame in frames:
+        meter.reset()
+        start = time.perf_counter()
+        try:
+            page_state = perceive_page_state(frame, strategy, use_cache=False)
+        except Exception as e:
+            logger.error(f"[{strategy}] {path.name} 感知失败: {e}")
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        tokens.append(meter.completion_tokens)
+        elements.append(len(page_state.get("elements", [])))
+        try:
+            action = decide_next_action(page_state, instruction, [])
+            valid += action_is_grounded(action, page_state)
+        except Exception as e:
+            logger.error(f"[{strategy}] {path.name} 决策失败: {e}")
+    done = len(latencies)
+    return {
+        "strategy": strategy,
+        "frames": len(frames),
+        "failures": failures,
+        "latency_median_s": round(statistics.median(latencies), 2) if done else None,
+        "latency_mean_s": round(statistics.mean(latencies), 2) if done else None,
+        "completion_tokens_mean": round(statistics.mean(tokens)) if done else None,
+        "elements_mean": round(statistics.mean(elements), 1) if done else None,
+        "action_validity": round(valid / done, 3) if done else None,
+        "model_calls": stream_stats.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="感知策略基准")
+    parser.add_argument("--images", type=str, default="[0-9]*.png", help="images/ 下的文件匹配模式")
+    parser.add_argument("--inst", type=str, default="帮我搜索洛天依演唱会的回放视频", help="用于下游决策的用户指令")
+    parser.add_argument("--strategies", type=str, nargs="+", default=list(PERCEPTION_STRATEGIES),
+                        choices=PERCEPTION_STRATEGIES, help="参与对比的策略")
+    args = parser.parse_args()
+
+    frames = [(path, Frame.from_path(path)) for path in list_images(args.images)]
+    logger.info(f"共 {len(frames)} 张样例截图")
+    meter = install_usage_meter()
+    rows = [run_strategy(strategy, frames, args.inst, meter) for strategy in args.strategies]
+    print_table(rows, [c for c in rows[0] if c != "model_calls"])
+    for row in rows:
+        logger.info(f"[{row['strategy']}] 各类调用的 TTFT / 可用结果时间：{row['model_calls']}")
+    save_results("perception_strategies", {"instruction": args.inst, "rows": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""录制基准：对比三种录制方式每步在关键路径上的耗时与写盘量。
+
+每步录制一帧截图与一个定位框（cp 与 thread 同时保存标注图，与旧做法一致），截图取自 images/，每张重复 --same 次以模拟页面没有变化的步骤：
+- cp：旧做法，截图与标注图先写到固定文件，再 os.system("cp -f ...") 复制成带时间戳的备份，全部在关键路径上
+- thread：在线程池中按时间戳文件名写出截图与标注图（不去重）
+- recorder：utils.recorder，后台线程 + 有界队列，按内容去重，写清单
+
+步与步之间用 --step-ms 的等待模拟模型调用与页面加载。hot_ms 为每步调用方等待录制的时间（队列满时的背压也计入），
+drain_s 为最后一步之后等待写盘完成的时间。--annotated 0 时 recorder 只在清单中记录框坐标（默认配置）。
+不需要浏览器与模型服务。
+用法：python -m benchmarks.recording [--steps 40] [--same 3] [--step-ms 300] [--annotated 1]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from loguru import logger
+
+from benchmarks.common import list_images, print_table, save_results
+from utils.imageProcessing import Frame, draw_box_on_image
+from utils.recorder import Recorder, writer
+
+LABEL = "搜索按钮"
+
+
+def step_frames(steps: int, same: int):
+    frames = [Frame.from_path(path) for path in list_images()]
+    for frame in frames:
+        frame.resolution  # 解码不计入录制耗时
+    # 页面不变时截图字节相同，但每次截图都是新的 Frame 对象
+    return [Frame(frames[i // same % len(frames)].data) for i in range(steps)]
+
+
+def target_box(frame: Frame) -> list:
+    w, h = frame.resolution
+    return [w // 3, h // 3, w // 2, h // 2]
+
+
+def run_cp(frames, out_dir, step_s, annotated):
+    hot = []
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        frame.save(os.path.join(out_dir, "output_screenshot.png"))
+        os.system(f"cp -f {out_dir}/output_screenshot.png {out_dir}/{i:05d}_output_screenshot.png")
+        draw_box_on_image(frame, target_box(frame), frame.resolution, LABEL, os.path.join(out_dir, "output_screenshot_with_box.png"))
+        os.system(f"cp -f {out_dir}/output_screenshot_with_box.png {out_dir}/{i:05d}_output_screenshot_with_box.png")
+        hot.append(time.perf_counter() - start)
+        time.sleep(step_s)
+    return hot, 0.0
+
+
+def run_thread(frames, out_dir, step_s, annotated):
+    hot, futures = [], []
+    with ThreadPoolExecutor() as pool:
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            futures.append(pool.submit(frame.save, os.path.join(out_dir, f"{i:05d}_output_screenshot.png")))
+            futures.append(pool.submit(draw_box_on_image, frame, target_box(frame), frame.resolution, LABEL,
+                                       os.path.join(out_dir, f"{i:05d}_output_screenshot_with_box.png")))
+            hot.append(time.perf_counter() - start)
+            time.sleep(step_s)
+        start = time.perf_counter()
+        wait(futures)
+        return hot, time.perf_counter() - start
+
+
+def run_recorder(frames, out_dir, step_s, annotated):
+    recorder = Recorder(os.path.join(out_dir, "session"), objects_dir=os.path.join(out_dir, "objects"), annotated=annotated)
+    recorder.session(instruction="录制基准")
+    hot = []
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        recorder.frame(frame)
+        recorder.box(frame, {"box": target_box(frame), "screen": list(frame.resolution), "label": LABEL})
+        recorder.action(i + 1, {"action": "CLICK", "params": {"target": LABEL}})
+        hot.append(time.perf_counter() - start)
+        time.sleep(step_s)
+    start = time.perf_counter()
+    writer.flush()
+    return hot, time.perf_counter() - start
+
+
+def disk_usage(out_dir):
+    files = size = 0
+    for dirpath, _, filenames in os.walk(out_dir):
+        for name in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return files, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制基准")
+    parser.add_argument("--steps", type=int, default=40, help="模拟的步数")
+    parser.add_argument("--same", type=int, default=3, help="每张截图连续重复的步数（页面未变化）")
+    parser.add_argument("--step-ms", type=float, default=300, help="每步录制之后模拟的其他耗时（毫秒）")
+    parser.add_argument("--annotated", type=int, default=0, help="recorder 是否保存标注图")
+    args = parser.parse_args()
+
+    frames = step_frames(args.steps, args.same)
+    rows = []
+    for name, run in (("cp", run_cp), ("thread", run_thread), ("recorder", run_recorder)):
+        out_dir = tempfile.mkdtemp(prefix=f"recording-{name}-")
+        try:
+            hot, drain = run(frames, out_dir, args.step_ms / 1000, bool(args.annotated))
+            files, size = disk_usage(out_dir)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        rows.append({
+            "mode": name,
+            "steps": len(frames),
+            "hot_ms_p50": round(statistics.median(hot) * 1000, 3),
+            "hot_ms_p95": round(sorted(hot)[int(len(hot) * 0.95) - 1] * 1000, 3),
+            "hot_ms_total": round(sum(hot) * 1000, 1),
+            "drain_s": round(drain, 3),
+            "files": files,
+            "disk_mb": round(size / 2**20, 2),
+        })
+    print_table(rows, list(rows[0].keys()))
+    logger.success(f"录制线程统计：{writer.stats}")
+    save_results("recording", {"settings": vars(args), "rows": rows, "writer": writer.stats})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""离线回放基准：用录制的截图与模型回答重放智能体主循环，不需要真实网站与模型服务。
+
+录制：开启录制（RECORD_IMAGE_PATH，默认 log_image）运行 agent_demo.py，截图清单（manifest.jsonl，见 utils.recorder）
+与模型回答（responses.jsonl）会写到同一目录；智能体池的每个会话各有一个子目录。回放清单中最后一次任务的截图；
+旧版录制（*_output_screenshot.png）仍按文件名顺序读取。
+仓库自带一份示例录制 benchmarks/sessions/bilibili_search（session.json 列出截图与任务）。
+
+回放时启动 benchmarks.mock_server 作为模型服务（可配置延迟与故障注入），用回放浏览器按顺序提供截图，
+统计每个阶段的耗时（截图、编码、描述、解析、决策、定位、执行、等待稳定）与每秒步数，
+结果保存到 benchmarks/results/replay-*.json，并与上一次结果对比。
+
+用法：python -m benchmarks.replay [--session log_image] [--repeat 3] [--ttft-ms 300] [--fail-rate 0.05]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks.common import ROOT, latest_result, print_table, save_results
+from benchmarks.mock_server import MockLatency, MockOpenAIServer, ScriptedResponder
+from utils import Config, runtime
+from utils.agent import TASK_DONE, agent_start_async
+from utils.grounding import grounding_cache, grounding_stats, patch_store
+from utils.imageProcessing import Frame
+from utils.llm import PERCEPTION_STRATEGIES, description_cache, page_state_cache, similar_frames
+from utils.recorder import read_manifest
+from utils.retry import retry_stats
+from utils.streaming import stream_stats
+from utils.tracing import tracer
+
+DEFAULT_SESSION = ROOT / "benchmarks" / "sessions" / "bilibili_search"
+STAGES = ["capture", "encode", "describe", "parse", "decide", "ground", "execute", "settle"]
+# 模型调用名 → 阶段
+CALL_STAGES = {
+    "describe": "describe",
+    "page_state": "parse",
+    "image_state": "parse",
+    "decide": "decide",
+    "grounding": "ground",
+    "grounding_batch": "ground",
+    "grounding_marks": "ground",
+}
+
+
+def load_session(path: Path, url: str = "", instruction: str = ""):
+    """读取录制目录：session.json 或 manifest.jsonl（可选）、截图与 responses.jsonl"""
+    meta = {}
+    if (path / "session.json").exists():
+        with open(path / "session.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        frames = [ROOT / p for p in meta["frames"]]
+    elif (path / "manifest.jsonl").exists():
+        entries = read_manifest(str(path))
+        meta = next((e for e in entries if e["kind"] == "session"), {})
+        frames = [path / e["object"] for e in entries if e["kind"] == "frame"]
+    else:
+        # 录制文件名以时间戳开头，按文件名排序即按截图顺序
+        frames = sorted(path.glob("*output_screenshot.png"))
+    if not frames:
+        raise ValueError(f"录制目录中没有截图：{path}")
+    if not (path / "responses.jsonl").exists():
+        raise ValueError(f"录制目录中没有模型回答 responses.jsonl：{path}")
+    return {
+        "url": url or meta.get("url", "about:blank"),
+        "instruction": instruction or meta.get("instruction", "帮我搜索洛天依演唱会的回放视频"),
+        "frames": frames,
+        "responses": path / "responses.jsonl",
+    }
+
+
+class ReplayAgent:
+    record_dir = ""  # 回放时不再录制
+
+
+class ReplayBrowser:
+    """按顺序返回录制截图的浏览器替身，接口与 AsyncWebBrowserOperator 相同；执行与等待稳定用固定耗时模拟"""
+
+    def __init__(self, frames, execute_ms: float = 50, settle_ms: float = 300):
+        self.agent = ReplayAgent()
+        self.frames = frames
+        self.execute_ms = execute_ms
+        self.settle_ms = settle_ms
+        self.timings = {"capture": [], "encode": [], "execute": [], "settle": []}
+        self._index = 0
+
+    async def start(self, url):
+        pass
+
+    async def screen_shot(self) -> Frame:
+        path = self.frames[min(self._index, len(self.frames) - 1)]
+        self._index += 1
+        start = time.perf_counter()
+        frame = await asyncio.to_thread(Frame.from_path, path)
+        self.timings["capture"].append(time.perf_counter() - start)
+        # 提前编码并缓存在帧上，之后的模型调用直接复用，编码耗时单独计入 encode 阶段
+        start = time.perf_counter()
+        await asyncio.to_thread(lambda: frame.encode().data_url)
+        self.timings["encode"].append(time.perf_counter() - start)
+        return frame
+
+    async def execute(self, operation, box=None, text=""):
+        start = time.perf_counter()
+        await asyncio.sleep(self.execute_ms / 1000)
+        self.timings["execute"].append(time.perf_counter() - start)
+
+    async def wait(self, sleep_sec=0, timeout=None):
+        start = time.perf_counter()
+        await asyncio.sleep(self.settle_ms / 1000)
+        self.timings["settle"].append(time.perf_counter() - start)
+
+    async def back(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def clear_caches():
+    """每次回放前清空感知与定位缓存，保证每轮都真正调用模型"""
+    description_cache.clear()
+    page_state_cache.clear()
+    similar_frames.clear()
+    grounding_cache.clear()
+    patch_store.clear()
+
+
+async def replay_once(session, perception, execute_ms, settle_ms) -> dict:
+    clear_caches()
+    stream_stats.reset()
+    tracer.reset()
+    retry_stats.reset()
+    grounding_stats.reset()
+    browser = ReplayBrowser(session["frames"], execute_ms, settle_ms)
+    start = time.perf_counter()
+    error = ""
+    history = []
+    try:
+        history = await agent_start_async(session["url"], session["instruction"], perception, browser,
+                                          interactive=False, max_steps=len(session["frames"]))
+    except Exception as e:
+        error = str(e)
+        logger.error(f"回放失败: {e}")
+    wall = time.perf_counter() - start
+    stages = {stage: list(values) for stage, values in browser.timings.items()}
+    for record in list(stream_stats.records):
+        stages.setdefault(CALL_STAGES.get(record["name"], record["name"]), []).append(record["elapsed"])
+    return {
+        "wall_s": wall,
+        "steps": len(history),
+        "success": bool(history) and history[-1].get("result") == TASK_DONE,
+        "error": error,
+        "stages": {stage: sum(values) for stage, values in stages.items()},
+        "calls": {stage: len(values) for stage, values in stages.items()},
+        "trace": tracer.summary(),
+        "retry": retry_stats.summary(),
+        "grounding": grounding_stats.summary(),
+    }
+
+
+def summarize(runs) -> dict:
+    steps = sum(r["steps"] for r in runs)
+    wall = sum(r["wall_s"] for r in runs)
+    rows = []
+    for stage in STAGES + sorted({s for r in runs for s in r["stages"]} - set(STAGES)):
+        total = sum(r["stages"].get(stage, 0.0) for r in runs)
+        rows.append({
+            "stage": stage,
+            "calls": sum(r["calls"].get(stage, 0) for r in runs),
+            "total_s": round(total, 3),
+            "per_step_ms": round(total / steps * 1000, 1) if steps else None,
+            "share": round(total / wall, 3) if wall else None,
+        })
+    return {
+        "runs": len(runs),
+        "succeeded": sum(r["success"] for r in runs),
+        "steps": steps,
+        "wall_s": round(wall, 3),
+        "wall_median_s": round(statistics.median(r["wall_s"] for r in runs), 3),
+        "steps_per_s": round(steps / wall, 3) if wall else None,
+        "stages": rows,
+    }
+
+
+def compare(current: dict, previous: dict):
+    """与上一次结果对比：每秒步数与各阶段的每步耗时"""
+    if not previous:
+        logger.info("没有之前的回放结果可供对比")
+        return
+    before = previous["summary"]
+    logger.info(f"与上一次（{previous.get('time', '未知时间')}）对比：每秒步数 "
+                f"{before['steps_per_s']} → {current['steps_per_s']}")
+    previous_stages = {row["stage"]: row for row in before["stages"]}
+    rows = []
+    for row in current["stages"]:
+        old = previous_stages.get(row["stage"], {}).get("per_step_ms")
+        new = row["per_step_ms"]
+        rows.append({
+            "stage": row["stage"],
+            "before_ms": old,
+            "after_ms": new,
+            "change": f"{(new - old) / old:+.1%}" if old and new is not None else "",
+        })
+    print_table(rows, ["stage", "before_ms", "after_ms", "change"])
+
+
+async def run(args):
+    session = load_session(Path(args.session), args.url, args.instruction)
+    responder = ScriptedResponder.from_jsonl(session["responses"])
+    latency = MockLatency(ttft_ms=args.ttft_ms, chunk_ms=args.chunk_ms, jitter=args.jitter,
+                          fail_rate=args.fail_rate, malformed_rate=args.malformed_rate)
+    with MockOpenAIServer(responder, latency, seed=args.seed) as server:
+        runtime.config = Config(api_key="replay", api_url=server.url)
+        runs = []
+        for i in range(args.repeat):
+            responder.reset()
+            runs.append(await replay_once(session, args.perception, args.execute_ms, args.settle_ms))
+            logger.info(f"第 {i + 1} 轮：{runs[-1]['steps']} 步，用时 {runs[-1]['wall_s']:.2f}s，成功 {runs[-1]['success']}")
+        server_stats = dict(server.stats)
+    return runs, server_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放基准")
+    parser.add_argument("--session", type=str, default=str(DEFAULT_SESSION), help="录制目录（截图 + responses.jsonl）")
+    parser.add_argument("--url", type=str, default="", help="任务网址（覆盖 session.json）")
+    parser.add_argument("--instruction", type=str, default="", help="任务指令（覆盖 session.json）")
+    parser.add_argument("--perception", type=str, default="two-stage", choices=PERCEPTION_STRATEGIES, help="页面感知策略")
+    parser.add_argument("--repeat", type=int, default=3, help="回放轮数")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="模型首 token 延迟（毫秒）")
+    parser.add_argument("--chunk-ms", type=float, default=20.0, help="流式输出每块的间隔（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟的相对随机抖动")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="模型服务返回 HTTP 500 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="模型返回无法解析内容的比例")
+    parser.add_argument("--execute-ms", type=float, default=50.0, help="模拟的浏览器操作耗时（毫秒）")
+    parser.add_argument("--settle-ms", type=float, default=300.0, help="模拟的等待页面稳定耗时（毫秒）")
+    parser.add_argument("--seed", type=int, default=0, help="延迟抖动与故障注入的随机种子")
+    args = parser.parse_args()
+
+    runs, server_stats = asyncio.run(run(args))
+    summary = summarize(runs)
+    print_table(summary["stages"], ["stage", "calls", "total_s", "per_step_ms", "share"])
+    logger.success(f"共 {summary['runs']} 轮，成功 {summary['succeeded']}，{summary['steps']} 步，"
+                   f"每秒步数 {summary['steps_per_s']}；模型服务：{server_stats}")
+    previous = latest_result("replay")
+    compare(summary, previous)
+    save_results("replay", {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "session": args.session,
+        "settings": {k: v for k, v in vars(args).items() if k not in ("session", "url", "instruction")},
+        "summary": summary,
+        "server": server_stats,
+        "runs": runs,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Set-of-Marks 定位基准：本地候选检测的召回率与耗时，以及（--model）编号选择与 SYSTEM_PROMPT_UI 坐标回归的对比。
+
+- 候选检测：benchmarks/grounding_truth.json 的每个标注目标，是否有候选框的中心落在标注框内
+  （all：全部边缘检测候选；marked：按 pos 优先后实际标出的前 SOM_MAX_MARKS 个），以及检测与画标记的耗时；不需要模型服务
+- 对比（--model）：同一批目标分别用整帧坐标回归（grounding_async，不按 pos 裁剪）与编号选择（mark_grounding_async）定位，
+  统计命中率、IoU、延迟、输出 token 数、无法解析而重试的次数与“没有符合的候选”的次数；
+  需要可用的模型服务（与 grounding_demo.py 相同的环境变量）
+
+用法：python -m benchmarks.set_of_marks [--model] [--repeat 1] [--max-marks 80]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import install_usage_meter, load_grounding_truth, print_table, prompt_pos, save_results, score_box
+from utils import SOM_MAX_MARKS
+from utils.grounding import grounding_async, mark_grounding_async
+from utils.imageProcessing import Frame
+from utils.retry import retry_stats
+from utils.setOfMarks import draw_marks, edge_candidates, find_marks_async
+
+
+def candidate_rows(samples, frames, max_marks: int):
+    rows = []
+    for sample in samples:
+        frame = frames[sample["path"]]
+        start = time.perf_counter()
+        boxes = edge_candidates(frame)
+        detect_ms = (time.perf_counter() - start) * 1000
+        marks = asyncio.run(find_marks_async(frame, {"pos": prompt_pos(sample["prompt"])}, max_marks=max_marks))
+        start = time.perf_counter()
+        draw_marks(frame, marks).encode()
+        draw_ms = (time.perf_counter() - start) * 1000
+        rows.append({
+            "target": sample["target"],
+            "candidates": len(boxes),
+            "marks": len(marks),
+            "hit_all": any(score_box(box, sample["box"])["hit"] for box in boxes),
+            "hit_marked": any(score_box(mark["box"], sample["box"])["hit"] for mark in marks),
+            "best_iou": round(max((score_box(box, sample["box"])["iou"] for box in boxes), default=0.0), 3),
+            "detect_ms": round(detect_ms, 1),
+            "draw_ms": round(draw_ms, 1),
+        })
+    return rows
+
+
+async def run_model(samples, frames, repeat: int, max_marks: int):
+    meter = install_usage_meter()
+    rows = []
+    for mode in ("box", "marks"):
+        meter.reset()
+        retry_stats.reset()
+        latencies, hits, ious, no_match = [], 0, [], 0
+        for _ in range(repeat):
+            for sample in samples:
+                frame = frames[sample["path"]]
+                start = time.perf_counter()
+                try:
+                    if mode == "box":
+                        box_data = await grounding_async(sample["prompt"], frame, use_cache=False, record_dir="")
+                    else:
+                        marks = await find_marks_async(frame, {"pos": prompt_pos(sample["prompt"])}, max_marks=max_marks)
+                        box_data = await mark_grounding_async(sample["prompt"], frame, marks)
+                except Exception as e:
+                    logger.error(f"[{mode}] 定位失败: {e}")
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if box_data is None:
+                    no_match += 1
+                    ious.append(0.0)
+                    continue
+                score = score_box(box_data.get("box"), sample["box"])
+                hits += score["hit"]
+                ious.append(score["iou"])
+        stats = retry_stats.summary().get("grounding" if mode == "box" else "grounding_marks", {})
+        rows.append({
+            "mode": mode,
+            "targets": len(samples) * repeat,
+            "hit_rate": round(hits / len(ious), 3) if ious else None,
+            "iou_mean": round(statistics.mean(ious), 3) if ious else None,
+            "latency_median_s": round(statistics.median(latencies), 2) if latencies else None,
+            "model_calls": meter.calls,
+            "completion_tokens": meter.completion_tokens,
+            "invalid": stats.get("invalid", 0),
+            "failures": stats.get("failures", 0),
+            "no_match": no_match,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set-of-Marks 定位基准")
+    parser.add_argument("--model", action="store_true", help="调用模型服务对比编号选择与坐标回归")
+    parser.add_argument("--repeat", type=int, default=1, help="每个目标重复定位的次数")
+    parser.add_argument("--max-marks", type=int, default=SOM_MAX_MARKS, help="截图上最多标出的候选数")
+    args = parser.parse_args()
+
+    samples = load_grounding_truth()
+    frames = {}
+    for sample in samples:
+        frames.setdefault(sample["path"], Frame.from_path(sample["path"])).gray  # 解码不计入检测耗时
+    rows = candidate_rows(samples, frames, args.max_marks)
+    print_table(rows, list(rows[0].keys()))
+    logger.success(f"候选召回率：全部候选 {sum(r['hit_all'] for r in rows) / len(rows):.0%}，"
+                   f"标出的候选 {sum(r['hit_marked'] for r in rows) / len(rows):.0%}；"
+                   f"检测耗时中位数 {statistics.median(r['detect_ms'] for r in rows)} ms")
+    result = {"settings": vars(args), "candidates": rows}
+    if args.model:
+        result["model"] = asyncio.run(run_model(samples, frames, args.repeat, args.max_marks))
+        print_table(result["model"], list(result["model"][0].keys()))
+    save_results("set_of_marks", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""元素空间索引基准：在合成的页面元素上测量网格索引的构建与查询耗时（与逐个扫描对比），以及框吸附的效果。
+
+- 耗时：视口 1280×720 内随机生成 --sizes 个元素（按钮 / 链接大小，含少量大容器），
+  分别用网格索引与逐个扫描做“某点下的元素”“某区域内的元素”与吸附查询
+- 吸附：随机取一个元素作为目标，把它的框随机平移（最多宽高的 --jitter 倍）与缩放，模拟略有偏差的 VL 框；
+  比较直接点击框中心命中目标的比例与吸附后命中的比例，以及吸附到错误元素的比例
+
+不需要浏览器与模型服务。
+用法：python -m benchmarks.spatial_index [--sizes 200,2000,10000] [--queries 2000] [--jitter 0.4]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from loguru import logger
+
+from benchmarks.common import print_table, save_results
+from utils.imageProcessing import box_center
+from utils.spatialIndex import ElementIndex, _contains, _intersects
+
+VIEWPORT = (1280, 720)
+
+
+def make_elements(n: int, rng: random.Random) -> list:
+    elements = []
+    for i in range(n):
+        if i % 50 == 0:  # 卡片、导航栏等大容器
+            w, h = rng.randint(200, 600), rng.randint(80, 300)
+        else:
+            w, h = rng.randint(16, 160), rng.randint(14, 44)
+        x, y = rng.randint(0, VIEWPORT[0] - w), rng.randint(0, VIEWPORT[1] - h)
+        elements.append({"box": [x, y, x + w, y + h], "editable": i % 10 == 0, "occluded": False})
+    return elements
+
+
+def linear_at_point(elements, x, y):
+    return sorted((e for e in elements if _contains(e["box"], x, y)), key=lambda e: (e["box"][2] - e["box"][0]) * (e["box"][3] - e["box"][1]))
+
+
+def linear_in_region(elements, box):
+    return [e for e in elements if _intersects(e["box"], box)]
+
+
+def jittered(box, jitter: float, rng: random.Random):
+    w, h = box[2] - box[0], box[3] - box[1]
+    cx, cy = box_center(box)
+    cx += rng.uniform(-jitter, jitter) * w
+    cy += rng.uniform(-jitter, jitter) * h
+    w *= rng.uniform(0.7, 1.4)
+    h *= rng.uniform(0.7, 1.4)
+    return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+
+def timed(func, args_list) -> float:
+    """每次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def timing_row(n: int, queries: int, rng: random.Random) -> dict:
+    elements = make_elements(n, rng)
+    start = time.perf_counter()
+    index = ElementIndex(elements)
+    build_ms = (time.perf_counter() - start) * 1000
+    points = [(rng.uniform(0, VIEWPORT[0]), rng.uniform(0, VIEWPORT[1])) for _ in range(queries)]
+    regions = [[x, y, x + 120, y + 40] for x, y in points]
+    return {
+        "elements": n,
+        "build_ms": round(build_ms, 2),
+        "point_us": round(timed(index.at_point, points), 1),
+        "point_linear_us": round(timed(lambda x, y: linear_at_point(elements, x, y), points), 1),
+        "region_us": round(timed(index.in_region, [(r,) for r in regions]), 1),
+        "region_linear_us": round(timed(lambda r: linear_in_region(elements, r), [(r,) for r in regions]), 1),
+        "snap_us": round(timed(index.snap, [(r,) for r in regions]), 1),
+    }
+
+
+def snapping_row(n: int, queries: int, jitter: float, rng: random.Random) -> dict:
+    elements = make_elements(n, rng)
+    index = ElementIndex(elements)
+    # 只以小元素为目标（点击目标通常是按钮或链接，而不是容器）
+    targets = [e for e in elements if e["box"][2] - e["box"][0] <= 160]
+    raw_hits = snap_hits = wrong = 0
+    for _ in range(queries):
+        target = rng.choice(targets)
+        box = jittered(target["box"], jitter, rng)
+        cx, cy = box_center(box)
+        # 直接点击框中心时，点击落在中心处最上层（这里取最小）的元素
+        under = index.at_point(cx, cy)
+        raw_hits += bool(under) and under[0] is target
+        element, _ = index.snap(box)
+        if element is target:
+            snap_hits += 1
+        elif element is not None:
+            wrong += 1
+    return {
+        "elements": n,
+        "jitter": jitter,
+        "raw_hit_rate": round(raw_hits / queries, 3),
+        "snap_hit_rate": round(snap_hits / queries, 3),
+        "wrong_snap_rate": round(wrong / queries, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="元素空间索引基准")
+    parser.add_argument("--sizes", type=str, default="200,2000,10000", help="页面元素数，逗号分隔")
+    parser.add_argument("--queries", type=int, default=2000, help="每种查询的次数")
+    parser.add_argument("--jitter", type=float, default=0.4, help="模拟 VL 框偏差的最大平移（相对元素宽高）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [int(n) for n in args.sizes.split(",")]
+    timing = [timing_row(n, args.queries, rng) for n in sizes]
+    print_table(timing, list(timing[0].keys()))
+    snapping = [snapping_row(sizes[0], args.queries, jitter, rng) for jitter in sorted({0.2, args.jitter, 0.6})]
+    print_table(snapping, list(snapping[0].keys()))
+    logger.success(f"{sizes[-1]} 个元素时吸附查询平均 {timing[-1]['snap_us']} µs；"
+                   f"偏差 {args.jitter} 时点击命中率 {statistics.mean(r['raw_hit_rate'] for r in snapping if r['jitter'] == args.jitter):.1%} → "
+                   f"{statistics.mean(r['snap_hit_rate'] for r in snapping if r['jitter'] == args.jitter):.1%}")
+    save_results("spatial_index", {"settings": vars(args), "timing": timing, "snapping": snapping})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+import os
+import sys
+from dataclasses import replace
+from loguru import logger
+from playwright.async_api import async_playwright
+
+from utils.browserProfile import BrowserProfile
+
+async def serve(port: int, headless: bool):
+    """启动常驻的预热浏览器并开放 CDP 端口，直到 Ctrl+C；代理设置 BROWSER_CDP_ENDPOINT 后连接它，不再每次冷启动"""
+    profile = replace(BrowserProfile.from_env(), headless=headless, user_data_dir="", cdp_endpoint="")
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=profile.headless, args=[f"--remote-debugging-port={port}", *profile.launch_args()])
+        endpoint = f"http://127.0.0.1:{port}"
+        logger.success(f"预热浏览器已启动（pid {os.getpid()} 的子进程），请设置 BROWSER_CDP_ENDPOINT={endpoint}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await browser.close()
+
+def main():
+    args = argparse.ArgumentParser(description="启动供代理连接的预热浏览器")
+    args.add_argument("--port", type=int, default=9222, help="CDP 端口")
+    args.add_argument("--headed", action="store_true", help="显示浏览器窗口（默认无头）")
+    parsed_args = args.parse_args()
+    try:
+        asyncio.run(serve(parsed_args.port, not parsed_args.headed))
+    except KeyboardInterrupt:
+        logger.info("预热浏览器已关闭")
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stdout, level="INFO", colorize=True, format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+    main()
@@ -1,25 +1,127 @@
 import os
-from loguru import logger
-from openai import OpenAI
+import weakref
+from dataclasses import dataclass
+from functools import cached_property
 
 
 # ======= 配置区 =======
-API_KEY = os.getenv("DASHSCOPE_API_KEY")
-if not API_KEY:
-    raise ValueError("请设置环境变量 DASHSCOPE_API_KEY")
 API_URL = os.getenv("DASHSCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url=API_URL,
-)
-
 INPUT_IMAGE_PATH = "output_screenshot.png"
 OUTPUT_IMAGE_PATH = "output_screenshot_with_box.png"
-RECORD_IMAGE_PATH = "log_image"
+RECORD_IMAGE_PATH = os.getenv("RECORD_IMAGE_PATH", "log_image")  # 置空则关闭录制，不写任何文件
+RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", "64"))  # 录制写入队列长度；队列满时事件循环中的录制被丢弃（不阻塞），其他线程等待写入（背压）
+RECORD_MAX_MB = float(os.getenv("RECORD_MAX_MB", "1024"))  # 录制图像对象的总大小上限（MB），超出时从最旧的任务起整段淘汰（对象按引用计数删除），0 表示不限制
+RECORD_MAX_AGE_DAYS = float(os.getenv("RECORD_MAX_AGE_DAYS", "7"))  # 录制任务（清单中的会话及其对象）的保留天数，0 表示不过期
+RECORD_ANNOTATED = os.getenv("RECORD_ANNOTATED", "0") == "1"  # 录制定位框时另存标注图（默认只在清单中记录框坐标）
 MAX_RETRY = 5
 VL_MODEL = os.getenv("VL_MODEL", "qwen2.5-vl-32b-instruct")
 CHAT_MODEL = os.getenv("CHAT_MODEL", "qwen2.5-32b-instruct")
+CACHE_SIZE = int(os.getenv("PERCEPTION_CACHE_SIZE", "256"))  # 内存缓存条目数，0 关闭缓存
+CACHE_DIR = os.getenv("PERCEPTION_CACHE_DIR", "")  # 磁盘缓存目录，置空则只用内存
+CACHE_DISK_SIZE = int(os.getenv("PERCEPTION_CACHE_DISK_SIZE", "4096"))  # 磁盘缓存条目数上限
+CACHE_MAX_AGE = float(os.getenv("PERCEPTION_CACHE_MAX_AGE", "0")) or None  # 缓存存活秒数，0 表示不过期
+GROUNDING_CACHE_SIZE = int(os.getenv("GROUNDING_CACHE_SIZE", "128"))  # 定位缓存条目数，0 关闭
+GROUNDING_CROP_PADS = tuple(float(p) for p in os.getenv("GROUNDING_CROP_PADS", "0.1,0.3").split(",") if p)  # 按 pos 裁剪定位时依次尝试的区域外扩比例，置空则直接发送整帧
+PATCH_STORE_SIZE = int(os.getenv("PATCH_STORE_SIZE", "256"))  # 已定位元素图块的保存目标数，0 关闭本地模板匹配
+PATCH_MATCH_THRESHOLD = float(os.getenv("PATCH_MATCH_THRESHOLD", "0.85"))  # 模板匹配采用结果的最低 NCC 得分
+DOM_GROUNDING = os.getenv("DOM_GROUNDING", "1") == "1"  # CLICK / TYPE 先在 DOM 中定位，置信度不足时再调用 VL
+DOM_GROUNDING_THRESHOLD = float(os.getenv("DOM_GROUNDING_THRESHOLD", "0.75"))  # DOM 定位采用结果的最低得分
+SNAP_TO_ELEMENTS = os.getenv("SNAP_TO_ELEMENTS", "1") == "1"  # 执行前把 VL 等后端给出的框吸附到页面上最匹配的可交互元素
+SNAP_MIN_SCORE = float(os.getenv("SNAP_MIN_SCORE", "0.3"))  # 吸附的最低得分（框中心在元素内时为 0.5 + 0.5×IoU，否则为 IoU）
+SNAP_MAX_AREA_RATIO = float(os.getenv("SNAP_MAX_AREA_RATIO", "4"))  # 元素面积超过框的这么多倍时，框中心落在其中也不加分（避免吸附到大容器）
+SET_OF_MARKS = os.getenv("SET_OF_MARKS", "1") == "1"  # VL 定位前先在截图上标出带编号的候选元素，让模型只回答编号
+SOM_MAX_MARKS = int(os.getenv("SOM_MAX_MARKS", "80"))  # 截图上最多标出的候选元素数
+DOM_GROUNDING_MARGIN = float(os.getenv("DOM_GROUNDING_MARGIN", "0.1"))  # 最佳元素需比其他候选高出的分数
+FULL_PAGE_PERCEPTION = os.getenv("FULL_PAGE_PERCEPTION", "0") == "1"  # 截取整页并分屏并发感知，目标在首屏以下时直接滚动到它的位置
+FULL_PAGE_MAX_TILES = int(os.getenv("FULL_PAGE_MAX_TILES", "4"))  # 整页感知最多切出的屏数（从页面顶部算起）
+FULL_PAGE_TILE_OVERLAP = float(os.getenv("FULL_PAGE_TILE_OVERLAP", "0.15"))  # 相邻两屏重叠的比例，避免元素被切断
+FULL_PAGE_TILE_ELEMENTS = int(os.getenv("FULL_PAGE_TILE_ELEMENTS", "20"))  # 每屏批量定位的可交互元素数上限
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "0") == "1"  # 无头模式启动浏览器（默认显示窗口）
+BROWSER_BLOCK_TYPES = tuple(t.strip() for t in os.getenv("BROWSER_BLOCK_TYPES", "").split(",") if t.strip())  # 拦截的资源类型，如 media,font
+BROWSER_BLOCK_DOMAINS = tuple(d.strip().lower() for d in os.getenv("BROWSER_BLOCK_DOMAINS", "").split(",") if d.strip())  # 拦截的域名（含子域名），如广告与统计
+BROWSER_USER_DATA_DIR = os.getenv("BROWSER_USER_DATA_DIR", "")  # 持久化用户目录，HTTP 缓存与登录状态在重启后保留；置空则每次使用临时目录
+BROWSER_CDP_ENDPOINT = os.getenv("BROWSER_CDP_ENDPOINT", "")  # 预热浏览器的 CDP 地址（见 browser_server.py），置空则每次新启动浏览器
+SETTLE_DEADLINE_MS = int(os.getenv("SETTLE_DEADLINE_MS", "10000"))  # 页面稳定检测的最长等待时间
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") != "0"  # 流式接收模型输出，JSON 完整后提前结束
+RETRY_PARALLEL = int(os.getenv("RETRY_PARALLEL", "1"))  # 结构化输出的调用每轮并行采样的请求数
+RETRY_HEDGE_QUANTILE = float(os.getenv("RETRY_HEDGE_QUANTILE", "0.95"))  # 超过历史延迟该分位数时补发对冲请求，0 关闭
+RETRY_TRANSPORT = int(os.getenv("RETRY_TRANSPORT", "3"))  # 超时、限流、5xx 等传输错误的退避重试次数
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "4"))  # 决策输入中原样保留的最近操作步数，更早的压缩成摘要
+HISTORY_SUMMARY_LINES = int(os.getenv("HISTORY_SUMMARY_LINES", "20"))  # 历史摘要最多保留的行数
+DECIDE_TOKEN_BUDGET = int(os.getenv("DECIDE_TOKEN_BUDGET", "6000"))  # 决策提示词的 token 预算（估算），0 表示不限制
+PAGE_STATE_DELTA = os.getenv("PAGE_STATE_DELTA", "0") == "1"  # 决策输入中相邻步骤的页面状态只发送相对基准的增量；总输入更长，只在服务端有前缀缓存时划算
+PAGE_STATE_FULL_INTERVAL = int(os.getenv("PAGE_STATE_FULL_INTERVAL", "5"))  # 每隔多少步重新发送一次完整页面状态作为新基准
+TRACE_PATH = os.getenv("TRACE_PATH", "")  # span 追加写入的 JSONL 文件，置空则只在内存中汇总
+METRICS_PATH = os.getenv("METRICS_PATH", "")  # 任务结束时写出 Prometheus 文本格式指标的文件
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 提供 /metrics 的端口，0 表示不启动
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # /metrics 监听的地址，默认只允许本机访问；需要远程拉取时设为 0.0.0.0
 # ======================
-from utils.webBrowser import webBrowserOperator
-browser = webBrowserOperator()
\ No newline at end of file
+
+
+@dataclass(frozen=True)
+class Config:
+    """运行配置，首次使用时从环境变量读取"""
+    api_key: str
+    api_url: str = API_URL
+
+    @classmethod
+    def from_env(cls):
+        api_key = os.getenv("DASHSCOPE_API_KEY")
+        if not api_key:
+            raise ValueError("请设置环境变量 DASHSCOPE_API_KEY")
+        return cls(api_key=api_key, api_url=os.getenv("DASHSCOPE_API_URL", API_URL))
+
+
+class Runtime:
+    """惰性运行时：导入 utils 不会读取密钥、创建客户端或启动浏览器。
+    client 在第一次请求时创建，browser 在第一次访问时启动。"""
+
+    def __init__(self):
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @cached_property
+    def config(self) -> Config:
+        return Config.from_env()
+
+    @cached_property
+    def client(self):
+        from openai import OpenAI
+        return OpenAI(api_key=self.config.api_key, base_url=self.config.api_url)
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI 客户端；其连接池绑定事件循环，因此每个事件循环各创建一个"""
+        import asyncio
+        from openai import AsyncOpenAI
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            # 传输错误由 utils.retry 统一退避重试，客户端自身不再重试
+            client = AsyncOpenAI(api_key=self.config.api_key, base_url=self.config.api_url, max_retries=0)
+            self._async_clients[loop] = client
+        return client
+
+    async def chat_completion(self, **kwargs):
+        """所有模型调用的统一入口（chat.completions.create）"""
+        return await self.async_client.chat.completions.create(**kwargs)
+
+    @cached_property
+    def browser(self):
+        from utils.webBrowser import webBrowserOperator
+        return webBrowserOperator()
+
+    def close(self):
+        """关闭已创建的资源；未启动过的浏览器不会被启动"""
+        if "browser" in self.__dict__:
+            self.__dict__.pop("browser").close()
+
+
+runtime = Runtime()
+
+
+def __getattr__(name):
+    # 兼容旧写法 `from utils import client, browser`：在访问时才创建
+    if name in ("client", "browser"):
+        return getattr(runtime, name)
+    raise AttributeError(f"module 'utils' has no attribute {name!r}")
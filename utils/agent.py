@@ -0,0 +1,218 @@
+"""智能体主循环：截图 → 感知 → 决策 → 执行 → 等待页面稳定。
+
+agent_demo.py 运行单个任务，utils.pool.AgentPool 在共享浏览器上并发运行多个会话；两者共用这里的实现。
+"""
+import json
+import os
+import asyncio
+from loguru import logger
+
+from utils import FULL_PAGE_PERCEPTION
+from utils.grounding import grounding_stats, locate_async, locate_batch_async
+from utils.history import HistoryManager
+from utils.pageDelta import PageStateEncoder
+from utils.recorder import recorder_for, writer as record_writer
+from utils.llm import decide_next_action_async, perceive_page_state_async
+from utils.streaming import response_log
+from utils.tiledPerception import covered_height, perceive_full_page_async
+from utils.tracing import span, start_metrics_server, tracer
+from utils.webBrowser import AsyncWebBrowserOperator
+
+MAX_RETRY = 3
+TASK_DONE = "用户确认操作成功，代理将退出。"
+UNATTENDED_ANSWER = "当前为无人值守模式，无法询问用户，请根据页面自行决定。"
+
+def type_prompt(params: dict) -> str:
+    """TYPE 操作对应的定位指令"""
+    return f"请找出页面中用于输入“{params['target']}”相关内容的输入框，位于{params['pos']}，我将输入“{params['text']}”。"
+
+def click_prompt(params: dict) -> str:
+    """CLICK 操作对应的定位指令"""
+    return f"请找出页面中标注为“{params['target']}”的按钮或可点击区域，位于{params['pos']}，我准备点击它。"
+
+def _dom_page(browser):
+    """DOM 定位使用的页面；没有真实页面的执行器（如离线回放）返回 None，只用 VL 定位"""
+    return getattr(browser.agent, "page", None)
+
+async def do_instruction_from_todo_async(todo: dict, frame, browser: AsyncWebBrowserOperator, interactive: bool = True,
+                                         page_index=None):
+    """在给定的浏览器执行器上执行决策器给出的 operation。
+    interactive 为 False 时（无人值守，如智能体池）不向用户提问：ASK_USER 返回固定回答，SUCCESS 直接视为完成。
+    page_index 为整页感知得到的元素索引（见 utils.tiledPerception）：CLICK 与单个输入框的 TYPE 的目标在索引中时，
+    直接滚动到目标的页面坐标执行，不再在视口截图上定位。"""
+    action = todo.get("action")
+    params = todo.get("params", {})
+
+    # 所有支持的动作类型
+    supported_actions = {"CLICK", "TYPE", "SCROLL", "SUCCESS", "FAIL", "ASK_USER"}
+    if action not in supported_actions:
+        raise ValueError(f"[错误] 不支持的操作类型: {action}，请让 LLM 重新分析")
+
+    # 对每种操作类型进行参数校验
+    if action == "TYPE":
+        # 表单等多个输入框：params.fields 为 [{target, pos, text}, ...]，一次 VL 请求定位全部输入框
+        fields = params.get("fields") or [params]
+        for field in fields:
+            if not all(k in field for k in ("target", "pos", "text")):
+                raise ValueError("[TYPE] 缺少必要参数（target, pos, text）")
+        element = page_index.find(fields[0]["target"], "TYPE") if page_index and len(fields) == 1 else None
+        if element:
+            await browser.execute_at_page({"type": "TYPE"}, element["page_box"], fields[0]["text"])
+            return f"输入内容到 {fields[0]['target']}：{fields[0]['text']}"
+        prompts = {i: type_prompt(field) for i, field in enumerate(fields)}
+        boxes = await locate_batch_async(frame, prompts, dict(enumerate(fields)), "TYPE", page=_dom_page(browser),
+                                         record_dir=browser.agent.record_dir)
+        for i, field in enumerate(fields):
+            box = boxes[i]["box"]
+            if not box or len(box) != 4:
+                raise ValueError(f"[TYPE] 未找到标注为“{field['target']}”的输入框，请让 LLM 重新分析")
+            await browser.execute({"type": "TYPE"}, box, field["text"])
+        return "；".join(f"输入内容到 {field['target']}：{field['text']}" for field in fields)
+    
+    elif action == "CLICK":
+        if not all(k in params for k in ("target", "pos")):
+            raise ValueError("[CLICK] 缺少必要参数（target, pos）")
+        element = page_index.find(params["target"], "CLICK") if page_index else None
+        if element:
+            await browser.execute_at_page({"type": "CLICK"}, element["page_box"])
+            return f"点击 {params['target']} 按钮或区域"
+        prompt = click_prompt(params)
+
+        box_data = await locate_async(prompt, frame, params, "CLICK", page=_dom_page(browser),
+                                      record_dir=browser.agent.record_dir)
+        box = box_data["box"]
+        if not box or len(box) != 4:
+            raise ValueError(f"[CLICK] 未找到标注为“{params['target']}”的按钮或区域，请让 LLM 重新分析")
+        await browser.execute({"type": "CLICK"}, box)
+        return f"点击 {params['target']} 按钮或区域"
+    
+    elif action == "SCROLL":
+        if "direction" not in params:
+            raise ValueError("[SCROLL] 缺少必要参数（direction）")
+        if params["direction"] not in {"向上", "向下", "向左", "向右"}:
+            raise ValueError("[SCROLL] 方向参数无效，请选择：向上、向下、向左或向右")
+
+        await browser.execute({"type": "SCROLL", "direction": params["direction"]})
+        return f"向{params['direction']}滚动页面"
+    
+    elif action == "ASK_USER":
+        if "question" not in params:
+            raise ValueError("[ASK_USER] 缺少必要参数（question）")
+        if not interactive:
+            return f"用户回答: {UNATTENDED_ANSWER}"
+
+        response = ""
+        while not response.strip():
+            response = await asyncio.to_thread(ask_user_for_plain_answer, params["question"])
+        return f"用户回答: {response}"
+        
+    elif action == "SUCCESS":
+        if not interactive:
+            logger.success(TASK_DONE)
+            return TASK_DONE
+        response = await asyncio.to_thread(ask_user_for_decision, "确认操作成功？")
+        if response:
+            logger.success(TASK_DONE)
+            return TASK_DONE
+        else:
+            logger.success("用户未确认操作成功，继续执行任务。")
+            return "用户未确认操作成功，继续执行任务。"
+
+    elif action == "FAIL":
+        await browser.back()
+        return ("操作失败，返回上一步。")
+
+def ask_user_for_plain_answer(question: str):
+    """向用户询问问题，并返回用户的回答"""
+    logger.info(f"需要用户确认: {question}")
+    response = input("请输入您的回答：")
+    return response
+
+def ask_user_for_decision(question: str):
+    """向用户询问问题，并返回用户的决策"""
+    logger.info(f"🧠 需要用户决策: {question}")
+    response = input("请输入您的决策（YES/NO）：")
+    if response.strip().upper() == "YES":
+        return True
+    elif response.strip().upper() == "NO":
+        return False
+    else:
+        logger.error("无效的输入，请输入 YES 或 NO")
+        return ask_user_for_decision(question)
+
+async def agent_start_async(url: str, instruction: str = "帮我搜索洛天依演唱会的回放视频", perception: str = "two-stage",
+                            browser: AsyncWebBrowserOperator = None, interactive: bool = True, max_steps: int = None,
+                            full_page: bool = None):
+    """启动代理，执行一系列操作，返回操作历史。browser 为空时新启动一个浏览器并在结束时关闭；
+    max_steps 限制最多执行的步数（无人值守时避免无限循环），为空则不限制；
+    full_page 为是否使用整页感知（见 utils.tiledPerception），为空时取 FULL_PAGE_PERCEPTION。"""
+    logger.info("🧠 启动浏览器代理...")
+    own_browser = browser is None
+    if own_browser:
+        browser = await AsyncWebBrowserOperator.launch()
+    # 开启录制时把模型回答与截图写在同一目录，之后可用 benchmarks.replay 离线回放
+    record_dir = browser.agent.record_dir
+    log_token = response_log.set(os.path.join(record_dir, "responses.jsonl") if record_dir else "")
+    recorder = recorder_for(record_dir) if record_dir else None
+    if recorder:
+        recorder.session(url=url, instruction=instruction, perception=perception)
+    start_metrics_server()
+    history = HistoryManager()
+    encoder = PageStateEncoder()
+    # 离线回放等没有整页截图能力的执行器只用视口截图
+    full_page = (FULL_PAGE_PERCEPTION if full_page is None else full_page) and hasattr(browser, "full_page_shot")
+    try:
+        with span("task", "task", url=url, perception=perception) as task:
+            await browser.start(url)
+
+            while max_steps is None or len(history) < max_steps:
+                with span("step", "step", step=len(history) + 1) as step:
+                    logger.info("\n\n1. 截图当前页面...")
+                    with span("capture"):
+                        frame = await browser.screen_shot()
+                        full, top = await browser.full_page_shot(covered_height(frame.resolution[1])) if full_page else (None, 0)
+
+                    logger.info(f"\n\n2. 分析页面结构并解析页面状态（感知策略：{perception}）...")
+                    with span("perceive", strategy=perception, full_page=full is not None):
+                        page_index = await perceive_full_page_async(full, frame.resolution, perception, top) if full else None
+                        page_state = page_index.page_state() if page_index else await perceive_page_state_async(frame, perception)
+                    logger.success("页面状态结构化结果：\n")
+                    logger.opt(lazy=True).info("{}", lambda: json.dumps(page_state, indent=2, ensure_ascii=False))
+
+                    with span("decide"):
+                        operation = await decide_next_action_async(page_state, instruction, history, encoder=encoder)
+                    logger.success("\n\n3. 决定的下一步操作：\n")
+                    logger.opt(lazy=True).info("{}", lambda: json.dumps(operation, indent=2, ensure_ascii=False))
+                    step.set(action=operation.get("action"))
+
+                    with span("act", action=operation.get("action")):
+                        result = await do_instruction_from_todo_async(operation, frame, browser, interactive, page_index)
+                    logger.success(f"\n\n4. 操作结果：{result}")
+                    operation["result"] = result
+                    history.append(operation)
+                    if recorder:
+                        recorder.action(len(history), operation)
+                    if result == TASK_DONE:
+                        break
+
+                    logger.info(f"\n\n 5. 等待下一步操作（已执行 {len(history)} 步）...")
+                    # 完整历史只在 DEBUG 级别序列化，避免每步重复序列化整段历史
+                    logger.opt(lazy=True).debug("当前历史操作记录：\n{}", lambda: json.dumps(history.steps, indent=2, ensure_ascii=False))
+                    with span("settle"):
+                        await browser.wait()
+            else:
+                logger.warning(f"已达到最大步数 {max_steps}，任务未完成")
+            task.set(steps=len(history), success=bool(history) and history[-1].get("result") == TASK_DONE)
+
+        logger.info("🧠 代理执行完毕，关闭浏览器...")
+    finally:
+        logger.info(f"定位后端统计：{grounding_stats.summary()}")
+        if recorder:
+            await asyncio.to_thread(record_writer.flush)
+            logger.info(f"录制统计：{record_writer.stats}")
+        response_log.reset(log_token)
+        tracer.write_metrics()
+        if own_browser:
+            logger.info(f"浏览器启动与加载：{browser.agent.profile_metrics()}")
+            await browser.close()
+    return history.steps
@@ -0,0 +1,59 @@
+"""同步 API 与异步核心之间的桥。
+
+核心实现（模型调用、浏览器操作、智能体循环）都是 async 的；同步函数只是把协程提交到
+后台线程里常驻的事件循环并阻塞等待结果。这样 Playwright 对象与 AsyncOpenAI 的连接池
+始终属于同一个事件循环，同步调用之间可以安全复用。
+"""
+import asyncio
+import threading
+
+from loguru import logger
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """返回后台事件循环（首次调用时在守护线程中启动）"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="utils-aio", daemon=True)
+            _thread.start()
+    return _loop
+
+
+def run_sync(coro):
+    """在后台事件循环中执行协程并返回结果（供同步 API 使用）"""
+    loop = background_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("不能在后台事件循环线程内调用同步 API，请直接 await 对应的 *_async 版本")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+_background_tasks = set()
+
+
+def run_in_background(func, *args):
+    """把阻塞的 I/O（如写录制文件）丢到线程池执行，不阻塞当前步骤；返回 Future"""
+    future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+    _background_tasks.add(future)
+    future.add_done_callback(_on_background_done)
+    return future
+
+
+def _on_background_done(future):
+    _background_tasks.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"后台 I/O 失败: {future.exception()}")
+
+
+async def drain_background():
+    """等待所有后台 I/O 完成（关闭前调用，避免丢失录制文件）"""
+    loop = asyncio.get_running_loop()
+    pending = [f for f in list(_background_tasks) if f.get_loop() is loop]
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,131 @@
+"""浏览器启动配置（profile）：无头 / 有头、请求拦截、持久化用户目录、连接预先启动的浏览器。
+
+- 无头：BROWSER_HEADLESS=1，服务器上运行时不需要显示器，启动也更快
+- 请求拦截：BROWSER_BLOCK_TYPES 按 Playwright 的 resource_type（media、font、image 等）拦截，经 context.route 在每个请求上判断；
+  BROWSER_BLOCK_DOMAINS 按域名（含子域名）拦截广告与统计脚本，自己启动的浏览器在 DNS 解析层（--host-resolver-rules）拦截，
+  请求不经过 Python 回调；连接外部浏览器时改由 context.route 拦截。注意 context.route 会让该上下文不再使用 HTTP 缓存
+- 持久化用户目录：BROWSER_USER_DATA_DIR，HTTP 缓存、cookie 与登录状态在重启后保留（同一目录同时只能由一个浏览器使用）
+- 预热浏览器：BROWSER_CDP_ENDPOINT 指向 browser_server.py 启动的常驻浏览器，会话通过 CDP 连接并新建隔离的上下文，
+  不再每次冷启动 Chromium；关闭会话只关闭自己的上下文
+
+各配置的冷启动、页面加载耗时与内存占用可用 python -m benchmarks.browser_profiles 对比。
+"""
+import os
+from collections import Counter
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from utils import BROWSER_BLOCK_DOMAINS, BROWSER_BLOCK_TYPES, BROWSER_CDP_ENDPOINT, BROWSER_HEADLESS, BROWSER_USER_DATA_DIR
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """浏览器启动配置，默认值与原先的行为一致（有头、不拦截、临时用户目录、每次新启动）"""
+    headless: bool = False
+    block_types: tuple = ()
+    block_domains: tuple = ()
+    user_data_dir: str = ""
+    cdp_endpoint: str = ""
+
+    def __post_init__(self):
+        if self.user_data_dir and self.cdp_endpoint:
+            raise ValueError("持久化用户目录与连接预热浏览器只能二选一：连接的会话使用新建的隔离上下文，不会用到该目录")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            headless=BROWSER_HEADLESS,
+            block_types=BROWSER_BLOCK_TYPES,
+            block_domains=BROWSER_BLOCK_DOMAINS,
+            user_data_dir=BROWSER_USER_DATA_DIR,
+            cdp_endpoint=BROWSER_CDP_ENDPOINT,
+        )
+
+    def launch_args(self) -> list:
+        """自己启动浏览器时的命令行参数：拦截的域名解析为不存在"""
+        if not self.block_domains:
+            return []
+        rules = ", ".join(f"MAP {domain} ~NOTFOUND, MAP *.{domain} ~NOTFOUND" for domain in self.block_domains)
+        return [f"--host-resolver-rules={rules}"]
+
+
+def _blocked_host(host: str, domains) -> bool:
+    return bool(host) and any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class BlockStats:
+    """请求拦截的计数：按资源类型 / 域名汇总被拦截与放行的请求数"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocked = Counter()
+        self.allowed = 0
+
+    def summary(self) -> dict:
+        return {"blocked": sum(self.blocked.values()), "allowed": self.allowed, "by_reason": dict(self.blocked)}
+
+
+block_stats = BlockStats()
+
+
+async def install_blocking(context, profile: BrowserProfile, route_domains: bool = False, stats: BlockStats = None):
+    """在上下文上安装请求拦截；route_domains 为 True 时域名也经 context.route 拦截（连接外部浏览器时）"""
+    types = set(profile.block_types)
+    domains = profile.block_domains if route_domains else ()
+    if not types and not domains:
+        return
+    stats = stats or block_stats
+
+    async def handle(route):
+        request = route.request
+        if request.resource_type in types:
+            stats.blocked[request.resource_type] += 1
+            await route.abort("blockedbyclient")
+        elif _blocked_host(urlsplit(request.url).hostname, domains):
+            stats.blocked["domain"] += 1
+            await route.abort("blockedbyclient")
+        else:
+            stats.allowed += 1
+            await route.continue_()
+
+    await context.route("**/*", handle)
+    logger.info(f"已开启请求拦截：资源类型 {sorted(types) or '无'}，域名 {list(domains) or '无'}")
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kb(pid: int) -> tuple:
+    """(RSS, PSS)，单位 KB；读不到时为 0"""
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            rss = next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            pss = next((int(line.split()[1]) for line in f if line.startswith("Pss:")), 0)
+    except OSError:
+        pass
+    return rss, pss
+
+
+def process_tree_memory(root_pid: int = None) -> dict:
+    """root_pid（默认当前进程）所有子孙进程（Playwright 驱动与 Chromium 的各个进程）的内存之和，不含 root 自身。
+    RSS 会把共享的页重复计入，PSS 按共享进程数分摊；仅 Linux（读 /proc），其他平台返回 None"""
+    if not os.path.isdir("/proc"):
+        return None
+    pending, pids = _children(root_pid or os.getpid()), []
+    while pending:
+        pid = pending.pop()
+        pids.append(pid)
+        pending.extend(_children(pid))
+    rss, pss = map(sum, zip(*[_memory_kb(pid) for pid in pids])) if pids else (0, 0)
+    return {"processes": len(pids), "rss_mb": round(rss / 1024, 1), "pss_mb": round(pss / 1024, 1)}
@@ -0,0 +1,384 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+from utils.imageProcessing import match_template, scale_box, tile_diff
+
+
+def make_cache_key(*parts) -> str:
+    """把任意多个键片段（帧哈希、模型名、prompt 版本……）合成一个定长键"""
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def prompt_version(prompt: str) -> str:
+    """prompt 内容的短哈希；修改 prompt 会自动让旧缓存失效"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+
+
+class PerceptionCache:
+    """两级缓存：内存 LRU + 可选的磁盘目录（JSON 文件，跨进程/跨运行持久化）。
+
+    - max_entries：内存层最多保留的条目数，超出按 LRU 淘汰
+    - disk_dir：磁盘层目录，为空则不启用
+    - max_disk_entries：磁盘层最多保留的条目数，超出按修改时间淘汰最旧的
+    - max_age：条目的最长存活秒数，过期视为未命中（两层都生效）
+
+    存取的都是副本：调用方修改取到的页面状态不会影响缓存里的条目。
+    """
+
+    def __init__(self, name: str, max_entries=256, disk_dir=None, max_disk_entries=None, max_age=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) / name if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        self.max_age = max_age
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.max_age) and time.time() - created > self.max_age
+
+    def get(self, key):
+        """命中返回缓存值的副本，未命中返回 None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self._memory.pop(key, None)
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._memory_put(key, copy.deepcopy(value), time.time())
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, copy.deepcopy(value), now)
+        self._disk_put(key, value, now)
+
+    def _memory_put(self, key, value, created):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry.get("created", 0)):
+            path.unlink(missing_ok=True)
+            return None
+        return entry.get("value")
+
+    def _disk_put(self, key, value, created):
+        if not self.disk_dir:
+            return
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.disk_dir / f"{key}.json.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.disk_dir / f"{key}.json")
+            if self.max_disk_entries:
+                self._prune_disk()
+        except OSError as e:
+            logger.warning(f"写入磁盘缓存失败（{self.name}）: {e}")
+
+    def _prune_disk(self):
+        files = sorted(self.disk_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)  # type: ignore
+        for path in files[: max(0, len(files) - self.max_disk_entries)]:  # type: ignore
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir and self.disk_dir.exists():
+            for path in self.disk_dir.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class SimilarFrames:
+    """画面相同但字节不同的帧（重新编码、无效滚动后重截的图）的归并：感知哈希找候选，
+    再用半分辨率灰度图的分块差异（tile×tile 块的平均绝对差全部不超过 threshold）确认。
+
+    canonical(frame) 返回先前登记的同画面帧的 digest（没有时登记 frame 本身），感知缓存以它为键。
+    感知哈希只用来缩小候选范围：16×16 的 dHash 分不清搜索框里多了几个字，确认一律看像素。
+    只在内存中登记；磁盘缓存跨进程时仍按字节哈希命中。
+    """
+
+    def __init__(self, max_entries=64, tile=8, threshold=3.0):
+        self.max_entries = max_entries
+        self.tile = tile
+        self.threshold = threshold
+        self._entries = OrderedDict()  # digest -> (phash, resolution, 半分辨率灰度图)
+        self._by_phash = {}  # phash -> [digest]
+        self._lock = threading.Lock()
+        self.aliased = 0  # 字节不同、按画面相同归并的帧数
+
+    @staticmethod
+    def _thumbnail(frame):
+        gray = frame.gray
+        h, w = gray.shape[0] // 2 * 2, gray.shape[1] // 2 * 2
+        return gray[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3)).astype("uint8")
+
+    def canonical(self, frame) -> str:
+        digest = frame.digest
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return digest
+        phash = frame.phash
+        with self._lock:
+            candidates = [(d, self._entries[d]) for d in self._by_phash.get(phash, ()) if d in self._entries]
+        thumbnail = self._thumbnail(frame)
+        for candidate, (_, resolution, other) in candidates:
+            if tuple(resolution) == tuple(frame.resolution) and other.shape == thumbnail.shape \
+                    and float(tile_diff(other, thumbnail, self.tile).max()) <= self.threshold:
+                with self._lock:
+                    self.aliased += 1
+                    if candidate in self._entries:
+                        self._entries.move_to_end(candidate)
+                return candidate
+        with self._lock:
+            self._entries[digest] = (phash, tuple(frame.resolution), thumbnail)
+            self._by_phash.setdefault(phash, []).append(digest)
+            while len(self._entries) > self.max_entries:
+                old, (old_phash, _, _) = self._entries.popitem(last=False)
+                digests = self._by_phash.get(old_phash, [])
+                if old in digests:
+                    digests.remove(old)
+                if not digests:
+                    self._by_phash.pop(old_phash, None)
+        return digest
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_phash.clear()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """去掉空白、标点与大小写差异，让措辞相同的定位指令落到同一个键上"""
+    return "".join(ch for ch in prompt.lower() if ch.isalnum())
+
+
+class GroundingCache:
+    """定位结果缓存：键为规范化后的指令，值为上次定位到的框及其周边像素。
+
+    复用条件不是整帧相同，而是框内及其周围 margin 像素范围内的灰度分块差异
+    （tile×tile 块的平均绝对差）全部低于 threshold；页面其他区域的变化不影响命中。
+    """
+
+    def __init__(self, max_entries=128, margin=16, tile=16, threshold=6.0):
+        self.max_entries = max_entries
+        self.margin = margin
+        self.tile = tile
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _region(self, box, screen, resolution):
+        x1, y1, x2, y2 = scale_box(box, screen, resolution)
+        w, h = resolution
+        return (max(0, min(x1, x2) - self.margin), max(0, min(y1, y2) - self.margin),
+                min(w, max(x1, x2) + self.margin), min(h, max(y1, y2) + self.margin))
+
+    def lookup(self, prompt: str, frame, *parts):
+        """命中返回缓存的定位结果（副本），否则返回 None"""
+        key = make_cache_key(normalize_prompt(prompt), *parts)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or tuple(entry["resolution"]) != tuple(frame.resolution):
+            with self._lock:
+                self.misses += 1
+            return None
+        x1, y1, x2, y2 = entry["region"]
+        current = frame.gray[y1:y2, x1:x2]
+        dirty = float(tile_diff(entry["patch"], current, self.tile).max()) if current.size else float("inf")
+        with self._lock:
+            if dirty > self.threshold:
+                self._entries.pop(key, None)
+                self.invalidations += 1
+                self.misses += 1
+                logger.debug(f"定位缓存失效：框周边最大分块差异 {dirty:.1f} > {self.threshold}")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return dict(entry["box_data"])
+
+    def lookup_any(self, prompt: str, frame, variants: list):
+        """variants 为多组键片段（如各定位后端的 prompt 版本），按第一组有条目的键查找；只计一次命中或未命中"""
+        with self._lock:
+            parts = next((p for p in variants if make_cache_key(normalize_prompt(prompt), *p) in self._entries), variants[0])
+        return self.lookup(prompt, frame, *parts)
+
+    def store(self, prompt: str, frame, box_data: dict, *parts):
+        box, screen = box_data.get("box"), box_data.get("screen")
+        if not box or len(box) != 4 or not screen:
+            return
+        region = self._region(box, screen, frame.resolution)
+        x1, y1, x2, y2 = region
+        entry = {
+            "box_data": dict(box_data),
+            "resolution": tuple(frame.resolution),
+            "region": region,
+            "patch": frame.gray[y1:y2, x1:x2].copy(),
+        }
+        with self._lock:
+            self._entries[make_cache_key(normalize_prompt(prompt), *parts)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "name": "grounding",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class PatchStore:
+    """已定位元素的图块库：定位成功后按目标保存框内的灰度图块，之后在新截图中用多尺度模板匹配（NCC）重新找到它。
+
+    GroundingCache 只在框周边像素完全未变时命中；滚动、重新布局或再次访问同一页面后元素换了位置，
+    图块仍然能在本地找回，不必再请求 VL 模型。
+    - max_entries：保存的目标数上限，超出按 LRU 淘汰
+    - per_target：每个目标保留的最近图块数（同一元素的不同外观，如悬停、选中）
+    - threshold：接受匹配的最低 NCC 得分
+    - scales：模板的缩放比例，应对缩放与轻微重排
+    """
+
+    def __init__(self, max_entries=256, per_target=3, threshold=0.85, scales=(0.9, 1.0, 1.1)):
+        self.max_entries = max_entries
+        self.per_target = per_target
+        self.threshold = threshold
+        self.scales = scales
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.rejected = 0  # 有图块但得分低于阈值
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return normalize_prompt(key) in self._entries
+
+    def add(self, key: str, frame, box_data: dict):
+        box, screen = box_data.get("box"), box_data.get("screen")
+        if not box or len(box) != 4 or not screen:
+            return
+        x1, y1, x2, y2 = scale_box(box, screen, frame.resolution)
+        w, h = frame.resolution
+        x1, y1, x2, y2 = max(0, min(x1, x2)), max(0, min(y1, y2)), min(w, max(x1, x2)), min(h, max(y1, y2))
+        if x2 - x1 < 6 or y2 - y1 < 6:
+            return
+        patch = {"gray": frame.gray[y1:y2, x1:x2].copy(), "resolution": tuple(frame.resolution),
+                 "label": box_data.get("label", ""), "type": box_data.get("type", "")}
+        key = normalize_prompt(key)
+        with self._lock:
+            patches = self._entries.pop(key, [])
+            self._entries[key] = ([patch] + patches)[:self.per_target]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _search(self, patches, frame, region):
+        x0, y0 = (region[0], region[1]) if region else (0, 0)
+        gray = frame.gray[region[1]:region[3], region[0]:region[2]] if region else frame.gray
+        best, best_patch = (0.0, None), None
+        for patch in patches:
+            # 截图分辨率变化（如设备像素比不同）时按比例缩放模板
+            ratio = frame.resolution[0] / patch["resolution"][0]
+            score, box = match_template(gray, patch["gray"], tuple(scale * ratio for scale in self.scales))
+            if box is not None and score > best[0]:
+                best, best_patch = (score, [box[0] + x0, box[1] + y0, box[2] + x0, box[3] + y0]), patch
+        return best, best_patch
+
+    def match(self, key: str, frame, region=None):
+        """在 frame 中找回 key 对应的元素；给定 region 时先在该区域内匹配，得分不足再搜索整帧。
+        得分不低于阈值时返回定位结果，否则返回 None"""
+        key = normalize_prompt(key)
+        with self._lock:
+            patches = list(self._entries.get(key, ()))
+            if patches:
+                self._entries.move_to_end(key)
+                self.lookups += 1
+        if not patches:
+            return None
+        best, best_patch = self._search(patches, frame, region)
+        if best[0] < self.threshold and region is not None:
+            best, best_patch = self._search(patches, frame, None)
+        with self._lock:
+            if best[0] < self.threshold:
+                self.rejected += 1
+                logger.debug(f"图块匹配得分 {best[0]:.3f} 低于阈值 {self.threshold}")
+                return None
+            self.hits += 1
+        return {"box": best[1], "label": best_patch["label"], "type": best_patch["type"],
+                "screen": list(frame.resolution), "source": "template", "score": round(best[0], 4)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "name": "patch",
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "rejected": self.rejected,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
@@ -1,13 +1,25 @@
-import json
-import os
-import sys
-from openai import OpenAI
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
 from loguru import logger
-from pathlib import Path
+from PIL import Image
 
-from utils.imageProcessing import (
-    draw_box_on_image, get_resolution, encode_image_to_base64, get_date_time)
-from utils import client, INPUT_IMAGE_PATH, OUTPUT_IMAGE_PATH, MAX_RETRY, VL_MODEL, CHAT_MODEL
+from utils.aio import run_sync, run_in_background
+from utils.imageProcessing import DEFAULT_ENCODE_OPTIONS, EncodeOptions, Frame, as_frame, draw_box_on_image, pos_region, scale_box
+from utils import (
+    INPUT_IMAGE_PATH, VL_MODEL, GROUNDING_CACHE_SIZE, DOM_GROUNDING,
+    PATCH_STORE_SIZE, PATCH_MATCH_THRESHOLD, GROUNDING_CROP_PADS, SET_OF_MARKS, SNAP_TO_ELEMENTS, RECORD_IMAGE_PATH)
+from utils.cache import GroundingCache, PatchStore, prompt_version
+from utils.domGrounding import dom_grounding_async
+from utils.setOfMarks import draw_marks, find_marks_async
+from utils.spatialIndex import index_for
+from utils.streaming import json_acceptor, stream_completion
+from utils.retry import RetryPolicy, call_with_policy
+from utils.tool import load_json_from_llm
+from utils.recorder import recorder_for
+from utils.tracing import span
 
 SYSTEM_PROMPT_UI = '''你是一个视觉助手，可以定位图像中的 UI 元素并返回坐标。
 
@@ -57,15 +69,115 @@ SYSTEM_PROMPT_UI = '''你是一个视觉助手，可以定位图像中的 UI 元
 请确保json包裹在三重反引号内，并且没有额外的文本或解释。只返回json内容，不要添加任何其他信息。
 '''
 
-def send_grounding_request(base64_image, prompt):
-    response = client.chat.completions.create(
+SYSTEM_PROMPT_UI_BATCH = SYSTEM_PROMPT_UI.split("你需要输出一个 JSON 元素")[0] + '''用户会一次给出多条带编号的指令，请对每条指令分别找出一个交互元素（不同指令可以对应同一个元素）。
+
+你需要输出一个 JSON 对象，内容包含：
+
+    - "screen"：图像的分辨率，例如 [800, 600]
+
+    - "elements"：以指令编号（字符串）为键的对象，每个值包含：
+
+        - "box"：该 UI 元素的边界框坐标，格式为 [x1, y1, x2, y2]（左上角、右下角，单位：像素）
+
+        - "label"：该元素上的文字内容（如按钮文字）
+
+        - "type"：元素的类型，如按钮、输入框等
+
+输出示例如下：
+
+```json
+    {
+        "screen": [800, 600],
+        "elements": {
+            "1": {"box": [120, 200, 380, 236], "label": "用户名", "type": "输入框"},
+            "2": {"box": [300, 400, 420, 460], "label": "确认提交", "type": "按钮"}
+        }
+    }
+```
+
+请确保每条指令都有对应的结果，json包裹在三重反引号内，并且没有额外的文本或解释。只返回json内容，不要添加任何其他信息。
+'''
+
+SYSTEM_PROMPT_UI_CROP = SYSTEM_PROMPT_UI + '''
+补充说明：用户提供的图像只是页面的一部分区域，目标可能不在其中。如果图中没有任何与指令相关的元素，请返回空的边界框，例如：
+
+```json
+    {"box": [], "label": "", "type": "", "screen": [800, 600]}
+```
+'''
+
+SYSTEM_PROMPT_UI_MARKS = '''你是一个视觉助手，可以根据指令在截图中选出要操作的 UI 元素。
+
+图像中的候选元素已用彩色细框标出，每个框的左上角有一个数字编号。请根据用户的指令，选出可以用来实现用户指令的那个元素的编号。要求：
+
+    - 交互元素包括按钮、输入框、下拉菜单、标签、可点击的文字、图标等。
+
+    - 用户提供指令中涉及到的的元素名称不一定与页面上的元素名称完全一致，请选出文字相似、语义相近的元素。
+
+    - 请仔细的思考并且区分指令的内容。比如，如果用户打算往搜索框输入字符，你要选出搜索框；相反，如果用户打算点击搜索按钮，你要选出搜索按钮。
+
+    - 只能回答图中标出的编号。如果没有任何一个被标出的元素符合指令，"mark" 返回 null。
+
+你需要输出一个 JSON 元素，元素内容包含：
+
+    - "mark"：所选元素的编号（整数），没有符合的元素时为 null
+
+    - "label"：该元素上的文字内容（如按钮文字）
+
+    - "type"：元素的类型，如按钮、输入框等
+
+输出示例如下：
+
+```json
+    {"mark": 12, "label": "确认提交", "type": "按钮"}
+```
+
+请确保json包裹在三重反引号内，并且没有额外的文本或解释。只返回json内容，不要添加任何其他信息。
+'''
+
+# 定位结果缓存：同一指令在框周边像素未变化时直接复用上次的框
+grounding_cache = GroundingCache(max_entries=GROUNDING_CACHE_SIZE)
+# 已定位元素的图块：元素位置变化后用本地模板匹配找回（见 locate_async）
+patch_store = PatchStore(max_entries=PATCH_STORE_SIZE, threshold=PATCH_MATCH_THRESHOLD)
+
+def _validate_box_data(data) -> dict:
+    """流式提前截断用的最小校验：定位结果必须带 box 与 screen"""
+    if isinstance(data, list):
+        data = data[0]
+    if not data.get("box") or not data.get("screen"):
+        raise ValueError("定位结果缺少 box 或 screen")
+    return data
+
+def _validate_crop_box(data) -> dict:
+    """区域定位允许返回空的 box（区域内没有目标）"""
+    if isinstance(data, list):
+        data = data[0]
+    if not isinstance(data.get("box"), list) or not data.get("screen"):
+        raise ValueError("定位结果缺少 box 或 screen")
+    return data
+
+def _validate_mark(data) -> dict:
+    """编号选择的结果必须带 mark（整数或 null）"""
+    if isinstance(data, list):
+        data = data[0]
+    if "mark" not in data:
+        raise ValueError("结果缺少 mark")
+    if data["mark"] is not None:
+        data["mark"] = int(data["mark"])
+    return data
+
+async def send_grounding_request_async(frame: Frame, prompt, encode: EncodeOptions = None,
+                                       system_prompt: str = SYSTEM_PROMPT_UI, validate=_validate_box_data):
+    response = await stream_completion(
+        name="grounding",
+        accept=json_acceptor(validate),
         model=VL_MODEL,
         messages=[
-                    {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT_UI}]},
+                    {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
                     {
                         "role": "user",
                         "content": [
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}},
+                            frame.image_part(encode),
                             {"type": "text", "text": prompt},
                         ],
                     },
@@ -73,60 +185,443 @@ def send_grounding_request(base64_image, prompt):
     )
     return response
 
+def send_grounding_request(frame: Frame, prompt, encode: EncodeOptions = None):
+    return run_sync(send_grounding_request_async(frame, prompt, encode))
+
 
-def parse_box_from_response(response):
-    """提取三重反引号中的 JSON 块并解析坐标和分辨率"""
+def parse_box_from_response(response, frame: Frame = None):
+    """从模型输出中提取带 box 与 screen 的 JSON 并解析坐标和分辨率。
+    给定 frame 时，按模型返回的 screen 把 box 换算回帧（视口）像素坐标，原值保留在 model_box / model_screen。"""
     try:
         content = response.choices[0].message.content
-        logger.info(f"模型原始回答：\n{content}")
-        json_text = content.split("```json")[-1].split("```")[0].strip()
-        data = json.loads(json_text)
-        if isinstance(data, list):
-            data = data[0]
-        if "box" in data and "screen" in data:
-            box = data["box"]
-            screen = data["screen"]
-            logger.info(f"提取到的坐标框: {box}, 分辨率: {screen}")
-        return data
+        logger.info("模型原始回答：\n{}", content)
+        return _to_frame_coords(load_json_from_llm(content, _validate_box_data), frame)
     except Exception as e:
         logger.error(f"解析 response 失败: {e}")
         return None
-    
-from utils import RECORD_IMAGE_PATH
 
-def grounding(prompt, input_image_path=INPUT_IMAGE_PATH, output_image_path=OUTPUT_IMAGE_PATH):
-    base64_img = encode_image_to_base64(input_image_path)
-    os.system(f"cp -f {input_image_path} {output_image_path}")
+def _to_frame_coords(data: dict, frame: Frame = None) -> dict:
+    box = data["box"]
+    screen = data["screen"]
+    logger.info(f"提取到的坐标框: {box}, 分辨率: {screen}")
+    if frame is not None and box and screen and tuple(screen) != tuple(frame.resolution):
+        data["model_box"], data["model_screen"] = box, screen
+        data["box"] = scale_box(box, screen, frame.resolution)
+        data["screen"] = list(frame.resolution)
+        logger.info(f"换算到视口坐标: {data['box']}, 分辨率: {data['screen']}")
+    return data
+
+def _record_box(frame, box_data, record_dir):
+    """把定位结果写入录制清单；标注图在录制线程中绘制保存"""
+    if record_dir:
+        recorder_for(record_dir).box(frame, box_data)
+
+def _cache_parts(system_prompt: str, encode: EncodeOptions = None):
+    """定位缓存的键片段：prompt 版本取实际产生结果的 system prompt（整帧 / 裁剪 / 批量），修改其中之一只让它的结果失效"""
+    return (VL_MODEL, prompt_version(system_prompt), encode or DEFAULT_ENCODE_OPTIONS)
+
+def _cache_lookup(prompt, frame: Frame, encode: EncodeOptions = None):
+    """按各定位 prompt 的键查找定位缓存"""
+    return grounding_cache.lookup_any(prompt, frame, [_cache_parts(system_prompt, encode) for system_prompt in
+                                                      (SYSTEM_PROMPT_UI, SYSTEM_PROMPT_UI_CROP, SYSTEM_PROMPT_UI_BATCH)])
+
+def crop_regions(pos, resolution, pads=GROUNDING_CROP_PADS) -> list:
+    """pos 对应的由小到大的裁剪区域（不含整帧）；无法识别 pos 时为空"""
+    full = [0, 0, *resolution]
+    regions = []
+    for pad in pads:
+        region = pos_region(pos, resolution, pad)
+        if region and region != full and region not in regions:
+            regions.append(region)
+    return regions
+
+def _crop_frame(frame: Frame, region, encode: EncodeOptions = None, max_pixel_ratio: float = 0.5) -> Frame:
+    """裁出 region；区域较小时放大（最多 2 倍），让模型以更高的有效分辨率看小图标。
+    放大后的像素数不超过整帧编码后的 max_pixel_ratio，长边不超过整帧编码后的长边"""
+    x1, y1, x2, y2 = region
+    image = frame.image.crop((x1, y1, x2, y2))
+    full = frame.encode(encode).resolution
+    scale = min(2.0, max(full) / max(image.size), (max_pixel_ratio * full[0] * full[1] / (image.width * image.height)) ** 0.5)
+    if scale > 1.05:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.LANCZOS)
+    return Frame.from_image(image)
+
+async def _ground_in_region(frame: Frame, region, prompt, encode: EncodeOptions = None, policy: RetryPolicy = None):
+    """在裁剪区域内定位，返回换算回整帧坐标的结果；区域内没有目标、或框贴着区域内侧边缘（目标可能被截断）时返回 None"""
+    crop = _crop_frame(frame, region, encode)
+    resolution_prompt = f"图像分辨率为 {crop.encode(encode).resolution}"
+
+    async def attempt():
+        response = await send_grounding_request_async(crop, resolution_prompt + prompt, encode,
+                                                      SYSTEM_PROMPT_UI_CROP, _validate_crop_box)
+        content = response.choices[0].message.content
+        logger.info("模型原始回答：\n{}", content)
+        data = response.value or load_json_from_llm(content, _validate_crop_box)
+        if not data["box"]:
+            return None
+        if len(data["box"]) != 4:
+            raise ValueError(f"边界框格式错误: {data['box']}")
+        return _to_frame_coords(data, crop)
+
+    box_data = await call_with_policy("grounding", attempt, policy, "所有尝试均失败，请检查输入图像和提示内容。")
+    if box_data is None:
+        return None
+    x1, y1, x2, y2 = scale_box(box_data["box"], crop.resolution, (region[2] - region[0], region[3] - region[1]))
+    width, height = frame.resolution
+    edge = 2
+    if (x1 <= edge and region[0] > 0) or (y1 <= edge and region[1] > 0) or \
+            (x2 >= region[2] - region[0] - edge and region[2] < width) or (y2 >= region[3] - region[1] - edge and region[3] < height):
+        logger.info(f"区域 {region} 内的框贴近边缘，目标可能被截断")
+        return None
+    box_data.update(box=[x1 + region[0], y1 + region[1], x2 + region[0], y2 + region[1]], screen=list(frame.resolution),
+                    region=list(region))
+    return box_data
+
+async def grounding_async(prompt, image=INPUT_IMAGE_PATH, output_image_path=None, use_cache: bool = True,
+                          encode: EncodeOptions = None, record_dir: str = None, policy: RetryPolicy = None,
+                          pos: str = None):
+    """定位 UI 元素；image 可以是 Frame 或图像路径。仅在给定 output_image_path 或开启录制时写出标注图。
+    录制时把定位框写入 record_dir 的清单（utils.recorder，后台写入），record_dir 默认为 RECORD_IMAGE_PATH（多会话时各用各的目录）。
+    给定 pos（如“顶部右侧”）时先只把对应区域裁剪放大后发给模型，区域内找不到再逐步扩大，最后才发送整帧。"""
+    frame = as_frame(image)
+    record_dir = RECORD_IMAGE_PATH if record_dir is None else record_dir
+    use_cache = use_cache and GROUNDING_CACHE_SIZE > 0
+    if use_cache:
+        cached = _cache_lookup(prompt, frame, encode)
+        if cached is not None:
+            logger.info(f"命中定位缓存，跳过 VL 调用：{cached.get('box')}（{grounding_cache.stats()}）")
+            return cached
 
-    rsolution_prompt = f"图像分辨率为 {get_resolution(input_image_path)}"
-    for i in range(MAX_RETRY):
+    box_data, system_prompt = None, SYSTEM_PROMPT_UI_CROP
+    for level, region in enumerate(crop_regions(pos, frame.resolution) if pos else []):
+        start = time.perf_counter()
         try:
-            response = send_grounding_request(base64_img, rsolution_prompt + prompt)
-            box_data = parse_box_from_response(response)
-            if box_data:
-                box = box_data.get("box")  # type: ignore
-                screen = box_data.get("screen")  # type: ignore
-                label = box_data.get("label", "未知元素")  # type: ignore
-                if box and screen:
-                    draw_box_on_image(output_image_path, box, screen, label, output_image_path)
-                    if RECORD_IMAGE_PATH:
-                        if not os.path.exists(RECORD_IMAGE_PATH):
-                            os.makedirs(RECORD_IMAGE_PATH)
-                        # 备份图像
-                        backup_image_path = Path(f"{get_date_time()}_{output_image_path}")
-                        backup_image_path = Path.joinpath(Path(RECORD_IMAGE_PATH), Path(backup_image_path))
-                        os.system(f"cp -f {output_image_path} {backup_image_path}")
-                        logger.success(f"已保存结果图像：{backup_image_path}")
-                else:
-                    raise ValueError("未能成功提取边界框或分辨率。")
-            else:
-                raise ValueError("未能从响应中解析到有效数据。")
-            return box_data
+            box_data = await _ground_in_region(frame, region, prompt, encode, policy)
+        except RuntimeError as e:
+            logger.warning(f"区域 {region} 内定位失败: {e}")
+        grounding_stats.record(f"vl_crop_{level}", box_data is not None, time.perf_counter() - start)
+        if box_data is not None:
+            logger.info(f"在区域 {region} 内定位到目标：{box_data['box']}")
+            break
+        logger.info(f"区域 {region} 内未找到目标，扩大区域")
+    if box_data is None:
+        box_data, system_prompt = await _ground_full_frame(frame, prompt, encode, policy), SYSTEM_PROMPT_UI
+
+    _record_box(frame, box_data, record_dir)
+    if output_image_path:
+        await run_in_background(draw_box_on_image, frame, box_data["box"], box_data["screen"],
+                                box_data.get("label", "未知元素"), output_image_path)
+    if use_cache:
+        grounding_cache.store(prompt, frame, box_data, *_cache_parts(system_prompt, encode))  # type: ignore
+    return box_data
+
+async def _ground_full_frame(frame: Frame, prompt, encode: EncodeOptions = None, policy: RetryPolicy = None):
+    # 告诉模型它实际看到的（可能被缩放过的）分辨率，返回的框再按 screen 换算回视口坐标
+    rsolution_prompt = f"图像分辨率为 {frame.encode(encode).resolution}"
+    async def attempt():
+        response = await send_grounding_request_async(frame, rsolution_prompt + prompt, encode)
+        box_data = parse_box_from_response(response, frame)
+        if not box_data:
+            raise ValueError("未能从响应中解析到有效数据。")
+        if not box_data.get("box") or not box_data.get("screen"):  # type: ignore
+            raise ValueError("未能成功提取边界框或分辨率。")
+        return box_data
+
+    return await call_with_policy("grounding", attempt, policy, "所有尝试均失败，请检查输入图像和提示内容。")
+
+def grounding(prompt, image=INPUT_IMAGE_PATH, output_image_path=None, use_cache: bool = True,
+              encode: EncodeOptions = None, record_dir: str = None, policy: RetryPolicy = None, pos: str = None):
+    """定位 UI 元素，见 grounding_async。"""
+    return run_sync(grounding_async(prompt, image, output_image_path, use_cache, encode, record_dir, policy, pos))
+
+async def mark_grounding_async(prompt, frame: Frame, marks: list, encode: EncodeOptions = None, policy: RetryPolicy = None):
+    """Set-of-Marks 定位：在标出候选元素编号的截图上让模型选出编号，返回该候选的框（source 为 "som"）；
+    模型认为没有符合的候选时返回 None"""
+    marked = draw_marks(frame, marks)
+
+    async def attempt():
+        response = await stream_completion(
+            name="grounding_marks",
+            accept=json_acceptor(_validate_mark),
+            model=VL_MODEL,
+            messages=[
+                {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT_UI_MARKS}]},
+                {"role": "user", "content": [marked.image_part(encode), {"type": "text", "text": f"图中共标出 {len(marks)} 个候选元素。{prompt}"}]},
+            ],
+        )
+        content = response.choices[0].message.content
+        logger.info("模型原始回答：\n{}", content)
+        data = response.value or load_json_from_llm(content, _validate_mark)
+        if data["mark"] is not None and not 1 <= data["mark"] <= len(marks):
+            raise ValueError(f"编号超出范围: {data['mark']}")
+        return data
+
+    data = await call_with_policy("grounding_marks", attempt, policy, "所有尝试均失败，请检查输入图像和提示内容。")
+    if data["mark"] is None:
+        return None
+    mark = marks[data["mark"] - 1]
+    return {
+        "box": list(mark["box"]),
+        "label": data.get("label") or mark.get("label", ""),
+        "type": data.get("type", ""),
+        "screen": list(frame.resolution),
+        "source": "som",
+        "mark": data["mark"],
+    }
+
+def mark_grounding(prompt, image, marks: list, encode: EncodeOptions = None, policy: RetryPolicy = None):
+    """Set-of-Marks 定位，见 mark_grounding_async。"""
+    return run_sync(mark_grounding_async(prompt, as_frame(image), marks, encode, policy))
+
+def _validate_batch(data) -> dict:
+    """批量定位结果必须带 screen 与以编号为键的 elements"""
+    if not isinstance(data, dict) or not isinstance(data.get("elements"), dict) or not data.get("screen"):
+        raise ValueError("批量定位结果缺少 screen 或 elements")
+    return data
+
+async def grounding_batch_async(image, targets, use_cache: bool = True, encode: EncodeOptions = None,
+                                record_dir: str = None, retry_missing: bool = True) -> dict:
+    """一次 VL 请求定位多个目标。targets 为 {键: 指令} 或指令列表（以指令本身为键），返回 {键: 定位结果}。
+
+    已命中定位缓存的目标不进入请求；结果缺失或无法解析的目标逐个退回 grounding_async 重试，
+    retry_missing 为 False 时不重试，返回的结果中不含这些目标。"""
+    frame = as_frame(image)
+    if not isinstance(targets, dict):
+        targets = {prompt: prompt for prompt in targets}
+    record_dir = RECORD_IMAGE_PATH if record_dir is None else record_dir
+    use_cache = use_cache and GROUNDING_CACHE_SIZE > 0
+    cache_parts = _cache_parts(SYSTEM_PROMPT_UI_BATCH, encode)
+
+    results, pending = {}, []
+    for key, prompt in targets.items():
+        cached = _cache_lookup(prompt, frame, encode) if use_cache else None
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending.append(key)
+    if results:
+        logger.info(f"批量定位：{len(results)} 个目标命中缓存")
+
+    if len(pending) > 1:
+        instructions = "\n".join(f"{i}. {targets[key]}" for i, key in enumerate(pending, 1))
+        elements, screen = {}, None
+        try:
+            response = await call_with_policy("grounding_batch", lambda: stream_completion(
+                name="grounding_batch",
+                accept=json_acceptor(_validate_batch),
+                model=VL_MODEL,
+                messages=[
+                    {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT_UI_BATCH}]},
+                    {
+                        "role": "user",
+                        "content": [
+                            frame.image_part(encode),
+                            {"type": "text", "text": f"图像分辨率为 {frame.encode(encode).resolution}\n{instructions}"},
+                        ],
+                    },
+                ],
+            ), failure_message="批量定位请求失败")
+            logger.info("模型原始回答：\n{}", response.content)
+            data = response.value or load_json_from_llm(response.content, _validate_batch)
+            elements, screen = data["elements"], data["screen"]
         except Exception as e:
-            logger.error(f"第 {i+1} 次尝试失败: {e}")
-            if i < MAX_RETRY - 1:
-                logger.info("正在重试...")
+            logger.error(f"批量定位请求失败，全部目标改为逐个定位: {e}")
+        for i, key in enumerate(pending, 1):
+            item = elements.get(str(i))
+            if not isinstance(item, dict):
+                logger.warning(f"批量定位结果中缺少第 {i} 个目标（{targets[key]}）")
+                continue
+            try:
+                box_data = _to_frame_coords(_validate_box_data({"screen": screen, **item}), frame)
+                if len(box_data["box"]) != 4:
+                    raise ValueError(f"边界框格式错误: {box_data['box']}")
+            except Exception as e:
+                logger.warning(f"批量定位中第 {i} 个目标（{targets[key]}）无效: {e}")
+                continue
+            results[key] = box_data
+            if use_cache:
+                grounding_cache.store(targets[key], frame, box_data, *cache_parts)
+            _record_box(frame, box_data, record_dir)
+
+    missing = [key for key in targets if key not in results]
+    if missing and (retry_missing or len(pending) == 1):
+        logger.info(f"逐个定位 {len(missing)} 个目标")
+        retried = await asyncio.gather(*(grounding_async(targets[key], frame, use_cache=use_cache, encode=encode,
+                                                         record_dir=record_dir) for key in missing))
+        results.update(zip(missing, retried))
+    return {key: results[key] for key in targets if key in results}
+
+def grounding_batch(image, targets, use_cache: bool = True, encode: EncodeOptions = None, record_dir: str = None) -> dict:
+    """一次请求定位多个目标，见 grounding_batch_async。"""
+    return run_sync(grounding_batch_async(image, targets, use_cache, encode, record_dir))
+
+
+class BackendStats:
+    """按定位后端（dom / template / vl / vl_batch）统计尝试次数、命中次数与耗时"""
+
+    def __init__(self, max_samples: int = 256):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
+
+    def record(self, backend: str, hit: bool, latency: float):
+        with self._lock:
+            record = self.records.setdefault(backend, {"attempts": 0, "hits": 0, "latencies": deque(maxlen=self.max_samples)})
+            record["attempts"] += 1
+            record["hits"] += hit
+            record["latencies"].append(latency)
+
+    def summary(self) -> dict:
+        with self._lock:
+            records = {name: (r["attempts"], r["hits"], list(r["latencies"])) for name, r in self.records.items()}
+        return {name: {
+            "attempts": attempts,
+            "hits": hits,
+            "hit_rate": round(hits / attempts, 3) if attempts else None,
+            "latency_mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+            "latency_p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        } for name, (attempts, hits, latencies) in records.items()}
+
+
+grounding_stats = BackendStats()
+
+async def _timed_backend(backend: str, coro):
+    """执行一个定位后端并记录命中与耗时；返回 None 或抛异常都记为未命中"""
+    start = time.perf_counter()
+    result = None
+    with span(backend, "grounding") as current:
+        try:
+            result = await coro
+            return result
+        finally:
+            current.set(hit=bool(result))
+            grounding_stats.record(backend, bool(result), time.perf_counter() - start)
+
+async def _dom_locate(page, frame: Frame, params: dict, action: str, record_dir: str):
+    async def locate():
+        # 元素在同一帧内只收集一次，之后的候选标记与吸附共用（见 spatialIndex.index_for）
+        elements = (await index_for(page, frame)).elements
+        return await dom_grounding_async(page, frame, params, action, elements=elements)
+
+    try:
+        box_data = await _timed_backend("dom", locate())
+    except Exception as e:
+        logger.warning(f"DOM 定位出错，改用 VL 定位: {e}")
+        return None
+    if box_data is None:
+        logger.info(f"DOM 定位“{params.get('target')}”置信度不足，改用 VL 定位")
+        return None
+    logger.info(f"DOM 定位命中“{params.get('target')}”：{box_data['box']}（得分 {box_data['score']}）")
+    _record_box(frame, box_data, record_dir)
+    return box_data
+
+async def _marks_locate(prompt, frame: Frame, params: dict, action: str, page, record_dir: str, policy: RetryPolicy = None):
+    if not SET_OF_MARKS:
+        return None
+    marks = await find_marks_async(frame, params, action, page)
+    if not marks:
+        return None
+    try:
+        box_data = await _timed_backend("som", mark_grounding_async(prompt, frame, marks, policy=policy))
+    except RuntimeError as e:
+        logger.warning(f"编号选择定位失败，改用 VL 定位: {e}")
+        return None
+    if box_data is None:
+        logger.info(f"{len(marks)} 个候选中没有“{(params or {}).get('target', prompt)}”，改用 VL 定位")
+        return None
+    logger.info(f"编号选择命中第 {box_data['mark']} 个候选（{marks[box_data['mark'] - 1]['source']}）：{box_data['box']}")
+    _record_box(frame, box_data, record_dir)
+    return box_data
+
+async def _snap(page, frame: Frame, box_data: dict, action: str) -> dict:
+    """把 VL、图块匹配或编号选择给出的框吸附到页面上最匹配的可交互元素（见 spatialIndex）；没有合适的元素时原样返回"""
+    if page is None or not SNAP_TO_ELEMENTS or not box_data or box_data.get("source") == "dom" or len(box_data.get("box") or []) != 4:
+        return box_data
+    start = time.perf_counter()
+    try:
+        element, score = (await index_for(page, frame)).snap(box_data["box"], action)
+    except Exception as e:
+        logger.warning(f"吸附到页面元素失败，使用原框: {e}")
+        return box_data
+    grounding_stats.record("snap", element is not None, time.perf_counter() - start)
+    if element is None:
+        logger.info(f"框 {box_data['box']} 附近没有匹配的页面元素（最高得分 {score}），使用原框")
+        return box_data
+    if list(element["box"]) != list(box_data["box"]):
+        logger.info(f"框 {box_data['box']} 吸附到页面元素 {element['box']}（得分 {score}）")
+    return {**box_data, "box": list(element["box"]), "snapped_from": box_data["box"], "snap_score": score}
+
+def _patch_key(prompt, params: dict, action: str) -> str:
+    """图块库的键：有 target 时按动作与目标名（不含位置与输入内容），否则按定位指令"""
+    return f"{action}:{params['target']}" if params and params.get("target") else prompt
+
+async def _template_locate(key: str, frame: Frame, params: dict):
+    if PATCH_STORE_SIZE <= 0 or key not in patch_store:
+        return None
+    # 有 pos 时先在对应区域内匹配，既快又能优先选中该位置的元素
+    region = pos_region(params.get("pos"), frame.resolution, pad=0.15) if params else None
+    box_data = await _timed_backend("template", asyncio.to_thread(patch_store.match, key, frame, region))
+    if box_data is not None:
+        logger.info(f"图块匹配找回“{key}”：{box_data['box']}（得分 {box_data['score']}）")
+    return box_data
 
-    raise RuntimeError("所有尝试均失败，请检查输入图像和提示内容。")
+def _remember(key: str, frame: Frame, box_data: dict):
+    if PATCH_STORE_SIZE > 0 and box_data and box_data.get("source") != "template":
+        run_in_background(patch_store.add, key, frame, box_data)
 
+async def locate_async(prompt, frame, params: dict = None, action: str = "CLICK", page=None,
+                       record_dir: str = None, policy: RetryPolicy = None) -> dict:
+    """CLICK / TYPE 目标的定位入口，依次尝试：
+    1. 给定 page 且开启 DOM_GROUNDING 时，按 params（target / pos / text）在 DOM 中定位
+    2. 在 pos 对应区域内匹配之前定位成功时保存的元素图块（patch_store）
+    3. 开启 SET_OF_MARKS 时，在截图上标出候选元素（DOM 元素或边缘检测结果）的编号，让 VL 模型只回答编号
+    4. 用 prompt 调用 VL 定位（grounding_async）
+    前一个后端置信度不足时才进入下一个；非 DOM 后端给出的框在返回前吸附到页面上最匹配的可交互元素（_snap）。
+    各后端的命中率与耗时见 grounding_stats。"""
+    frame = as_frame(frame)
+    record_dir = RECORD_IMAGE_PATH if record_dir is None else record_dir
+    key = _patch_key(prompt, params, action)
+    box_data = None
+    if page is not None and params and DOM_GROUNDING:
+        box_data = await _dom_locate(page, frame, params, action, record_dir)
+    if box_data is None:
+        box_data = await _template_locate(key, frame, params)
+    if box_data is None:
+        box_data = await _marks_locate(prompt, frame, params, action, page, record_dir, policy)
+    if box_data is None:
+        box_data = await _timed_backend("vl", grounding_async(prompt, frame, record_dir=record_dir, policy=policy,
+                                                              pos=(params or {}).get("pos")))
+    box_data = await _snap(page, frame, box_data, action)
+    _remember(key, frame, box_data)
+    return box_data
 
+async def locate_batch_async(frame, prompts: dict, params: dict, action: str = "TYPE", page=None,
+                             record_dir: str = None) -> dict:
+    """多个目标的定位：prompts 与 params 均以同样的键索引；每个目标依次尝试 DOM 与图块匹配，其余合并为一次批量 VL 请求"""
+    frame = as_frame(frame)
+    record_dir = RECORD_IMAGE_PATH if record_dir is None else record_dir
+    patch_keys = {key: _patch_key(prompt, params[key], action) for key, prompt in prompts.items()}
+    results = {}
+    for key in prompts:
+        box_data = None
+        if page is not None and DOM_GROUNDING:
+            box_data = await _dom_locate(page, frame, params[key], action, record_dir)
+        if box_data is None:
+            box_data = await _template_locate(patch_keys[key], frame, params[key])
+        if box_data is not None:
+            results[key] = box_data
+    pending = {key: prompt for key, prompt in prompts.items() if key not in results}
+    if len(pending) > 1:
+        results.update(await _timed_backend("vl_batch", grounding_batch_async(frame, pending, record_dir=record_dir)))
+    elif pending:
+        key, prompt = next(iter(pending.items()))
+        results[key] = await _marks_locate(prompt, frame, params[key], action, page, record_dir) or \
+            await _timed_backend("vl", grounding_async(prompt, frame, record_dir=record_dir, pos=params[key].get("pos")))
+    for key, box_data in results.items():
+        results[key] = box_data = await _snap(page, frame, box_data, action)
+        _remember(patch_keys[key], frame, box_data)
+    return {key: results[key] for key in prompts}
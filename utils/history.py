@@ -0,0 +1,184 @@
+"""决策输入的历史管理：最近几步原样保留，更早的步骤压缩成一行一条的摘要，并检测重复操作。
+
+build_decision_input 按 token 预算组装 decide_next_action 的输入：先缩小原样保留的窗口，仍超出预算时再裁剪
+页面状态中的元素。长任务中每步的决策提示词大小因此保持稳定，而不是随步数线性增长。
+"""
+import json
+
+from utils import DECIDE_TOKEN_BUDGET, HISTORY_SUMMARY_LINES, HISTORY_WINDOW
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文等非 ASCII 字符约 1 字 1 token，ASCII 约 4 个字符 1 token"""
+    chars = len(text)
+    non_ascii = (len(text.encode("utf-8")) - chars) // 2  # 中文在 UTF-8 中占 3 字节
+    return non_ascii + (chars - non_ascii + 3) // 4
+
+
+def action_key(operation: dict) -> tuple:
+    """用于判断两步是否为“同一个操作”的键：动作类型与目标参数（不含理由与结果）"""
+    params = operation.get("params") or {}
+    if params.get("fields"):
+        target = tuple((f.get("target"), f.get("text")) for f in params["fields"] if isinstance(f, dict))
+    else:
+        target = (params.get("target"), params.get("text"), params.get("direction"), params.get("question"))
+    return operation.get("action"), target
+
+
+def describe_operation(operation: dict) -> str:
+    """一步操作的单行摘要，如“CLICK 搜索按钮（页面顶部）”"""
+    params = operation.get("params") or {}
+    action = operation.get("action", "?")
+    if params.get("fields"):
+        detail = "、".join(f"{f.get('target')}={f.get('text')}" for f in params["fields"] if isinstance(f, dict))
+    elif action == "TYPE":
+        detail = f"{params.get('target')}={params.get('text')}"
+    elif action == "SCROLL":
+        detail = params.get("direction", "")
+    elif action == "ASK_USER":
+        detail = params.get("question", "")
+    else:
+        detail = params.get("target", "")
+    if params.get("pos"):
+        detail += f"（{params['pos']}）"
+    return f"{action} {detail}".strip()
+
+
+def _clip(text, limit: int = 40) -> str:
+    text = str(text or "")
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class HistoryManager:
+    """智能体的操作历史。steps 保存完整记录；render 给出 {earlier, recent, warnings} 形式的压缩视图：
+    - recent：最近 window 步的原样记录
+    - earlier：更早的步骤，每行一条摘要，连续相同的操作合并为一行；最多 summary_lines 行，更早的只保留步数
+    - warnings：最近 loop_threshold 步重复同一操作、或在两个操作之间来回切换时的提醒
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW, summary_lines: int = HISTORY_SUMMARY_LINES, loop_threshold: int = 3):
+        if window < 1:
+            raise ValueError("历史窗口至少为 1 步")
+        self.window = window
+        self.summary_lines = summary_lines
+        self.loop_threshold = loop_threshold
+        self.steps = []
+        self._summary = []  # [[起始步, 结束步, 摘要, 结果]]，随步骤移出窗口增量维护
+        self._dropped = 0  # 超出 summary_lines 后不再保留摘要的步数
+
+    @classmethod
+    def from_list(cls, steps, **kwargs):
+        manager = cls(**kwargs)
+        for step in steps:
+            manager.append(step)
+        return manager
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __getitem__(self, index):
+        return self.steps[index]
+
+    def append(self, operation: dict):
+        self.steps.append(operation)
+        if len(self.steps) > self.window:
+            self._fold(len(self.steps) - self.window - 1)
+
+    def _fold(self, index: int):
+        """把第 index 步（0 起）并入摘要"""
+        operation = self.steps[index]
+        text = describe_operation(operation)
+        result = _clip(operation.get("result"))
+        last = self._summary[-1] if self._summary else None
+        if last is not None and last[2] == text and last[3] == result:
+            last[1] = index + 1
+        else:
+            self._summary.append([index + 1, index + 1, text, result])
+        while len(self._summary) > self.summary_lines:
+            first, end, _, _ = self._summary.pop(0)
+            self._dropped += end - first + 1
+
+    @staticmethod
+    def _summary_line(first: int, end: int, text: str, result: str) -> str:
+        steps = f"第{first}步" if first == end else f"第{first}-{end}步（重复 {end - first + 1} 次）"
+        return f"{steps} {text} → {result}" if result else f"{steps} {text}"
+
+    def warnings(self) -> list:
+        keys = [action_key(step) for step in self.steps[-max(self.loop_threshold, 4):]]
+        warnings = []
+        n = self.loop_threshold
+        if n > 1 and len(keys) >= n and len(set(keys[-n:])) == 1:
+            warnings.append(f"最近 {n} 步重复执行了同一操作（{describe_operation(self.steps[-1])}），"
+                            "页面可能没有按预期变化，请换一种操作或重新判断任务状态。")
+        elif len(keys) >= 4 and keys[-1] == keys[-3] and keys[-2] == keys[-4] and keys[-1] != keys[-2]:
+            warnings.append(f"最近 4 步在“{describe_operation(self.steps[-1])}”与“{describe_operation(self.steps[-2])}”"
+                            "之间来回切换，请换一种操作或重新判断任务状态。")
+        return warnings
+
+    def render(self, window: int = None) -> dict:
+        """压缩视图；window 小于 self.window 时，多出的步骤临时以摘要形式给出"""
+        window = self.window if window is None else max(1, min(window, self.window))
+        lines = []
+        if self._dropped:
+            lines.append(f"（更早的 {self._dropped} 步已省略）")
+        lines += [self._summary_line(*entry) for entry in self._summary]
+        start = max(0, len(self.steps) - self.window)
+        recent_start = max(0, len(self.steps) - window)
+        lines += [self._summary_line(i + 1, i + 1, describe_operation(self.steps[i]), _clip(self.steps[i].get("result")))
+                  for i in range(start, recent_start)]
+        view = {"earlier": lines, "recent": self.steps[recent_start:]}
+        warnings = self.warnings()
+        if warnings:
+            view["warnings"] = warnings
+        return view
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def build_decision_input(page_state: dict, target: str, history, system_prompt: str = "",
+                         budget: int = DECIDE_TOKEN_BUDGET):
+    """按 token 预算组装决策输入，返回 (user 消息文本, 报告)。
+
+    history 可以是 HistoryManager 或操作列表。超出预算时依次：缩小原样保留的历史窗口直到 1 步；
+    从末尾起裁掉页面状态中非交互的元素；再裁掉其余元素。budget 为 0 表示不限制。"""
+    manager = history if isinstance(history, HistoryManager) else HistoryManager.from_list(history or [])
+    fixed = estimate_tokens(system_prompt)
+    report = {"history_steps": len(manager), "trimmed_elements": 0}
+
+    def compose(state, window):
+        return _dumps({"page_state": state, "user_target": target, "user_history": manager.render(window)})
+
+    window = manager.window
+    text = compose(page_state, window)
+    tokens = fixed + estimate_tokens(text)
+    while budget and tokens > budget and window > 1:
+        window -= 1
+        text = compose(page_state, window)
+        tokens = fixed + estimate_tokens(text)
+
+    elements = page_state.get("elements") if isinstance(page_state, dict) else None
+    if budget and tokens > budget and isinstance(elements, list) and elements:
+        # 先裁非交互元素，再裁其余元素；按元素各自的大小估算，避免反复序列化整段输入
+        order = sorted(range(len(elements)), key=lambda i: (elements[i].get("role") == "interactive", -i)
+                       if isinstance(elements[i], dict) else (False, -i))
+        removed, remaining = set(), iter(order)
+        while tokens > budget and len(removed) < len(elements):
+            excess = tokens - budget
+            for i in remaining:
+                removed.add(i)
+                excess -= estimate_tokens(_dumps(elements[i])) + 1
+                if excess <= 0:
+                    break
+            state = {**page_state, "elements": [e for i, e in enumerate(elements) if i not in removed],
+                     "omitted_elements": len(removed)}
+            text = compose(state, window)
+            tokens = fixed + estimate_tokens(text)
+        report["trimmed_elements"] = len(removed)
+
+    report.update(prompt_tokens_est=tokens, verbatim_steps=min(window, len(manager)), over_budget=bool(budget) and tokens > budget)
+    return text, report
@@ -1,10 +1,175 @@
 from PIL import Image, ImageDraw, ImageFont
+from dataclasses import dataclass
+from functools import cached_property
+from io import BytesIO
+from pathlib import Path
 import base64
+import hashlib
 import os
+import struct
 from loguru import logger
 
-def draw_box_on_image(image_path, box, screen_resolution, label, output_path):
-    img = Image.open(image_path).convert("RGB")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    """送入 VL 模型前的编码参数。默认值与截图原样（PNG、原分辨率）一致，不做任何重编码。
+
+    - max_side：长边上限（像素），0 表示不缩放
+    - format：png / jpeg / webp
+    - quality：jpeg / webp 的质量（1-100）
+    - grayscale：转为灰度（适合文字为主的页面）
+    - detail：OpenAI 兼容接口 image_url 的 detail 字段（auto / low / high）
+    """
+    max_side: int = 0
+    format: str = "png"
+    quality: int = 85
+    grayscale: bool = False
+    detail: str = "auto"
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_side=int(os.getenv("IMAGE_MAX_SIDE", "0")),
+            format=os.getenv("IMAGE_FORMAT", "png").lower(),
+            quality=int(os.getenv("IMAGE_QUALITY", "85")),
+            grayscale=os.getenv("IMAGE_GRAYSCALE", "0") == "1",
+            detail=os.getenv("IMAGE_DETAIL", "auto"),
+        )
+
+    @property
+    def mime(self) -> str:
+        return {"jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}.get(self.format, "image/png")
+
+class EncodedImage:
+    """某一组 EncodeOptions 下的编码结果；resolution 为模型实际看到的分辨率"""
+    def __init__(self, data: bytes, mime: str, resolution, detail: str = "auto"):
+        self.data = data
+        self.mime = mime
+        self.resolution = tuple(resolution)
+        self.detail = detail
+
+    @cached_property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.base64}"
+
+    def image_part(self) -> dict:
+        """chat.completions 消息中的 image_url 内容块"""
+        image_url = {"url": self.data_url}
+        if self.detail != "auto":
+            image_url["detail"] = self.detail
+        return {"type": "image_url", "image_url": image_url}
+
+class Frame:
+    """内存中的一帧截图：原始字节 + 惰性计算的 base64 / data URL / 分辨率，每帧只编码一次"""
+    def __init__(self, data: bytes, mime: str = "image/png", resolution=None):
+        self.data = data
+        self.mime = mime
+        if resolution:
+            self.__dict__["resolution"] = tuple(resolution)
+
+    @classmethod
+    def from_path(cls, path):
+        suffix = Path(path).suffix.lower()
+        mime = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}.get(suffix, "image/png")
+        with open(path, "rb") as f:
+            return cls(f.read(), mime=mime)
+
+    @classmethod
+    def from_image(cls, img, format="PNG"):
+        buf = BytesIO()
+        img.save(buf, format=format)
+        return cls(buf.getvalue(), mime=f"image/{format.lower()}", resolution=img.size)
+
+    @cached_property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.base64}"
+
+    @cached_property
+    def resolution(self):
+        """(width, height)；PNG 直接读 IHDR 头，无需解码"""
+        if self.data[:8] == PNG_SIGNATURE:
+            return struct.unpack(">II", self.data[16:24])
+        return self.image.size
+
+    @cached_property
+    def digest(self) -> str:
+        """原始字节的 SHA-1"""
+        return hashlib.sha1(self.data).hexdigest()
+
+    @cached_property
+    def phash(self) -> str:
+        """感知哈希：外观相近的帧哈希相同，只用来找候选（见 cache.SimilarFrames），不能单独用作缓存键"""
+        return perceptual_hash(self)
+
+    @cached_property
+    def gray(self):
+        """灰度 NumPy 数组 (H, W)，uint8"""
+        import numpy as np  # 延迟导入，保持 import utils.* 轻量
+        return np.asarray(self.image.convert("L"))
+
+    @cached_property
+    def image(self):
+        """解码后的 RGB 图像（只读，需要修改时请先 copy）"""
+        return Image.open(BytesIO(self.data)).convert("RGB")
+
+    def encode(self, options: EncodeOptions = None) -> EncodedImage:
+        """按 options 编码（结果按参数缓存在帧上）。未缩放、未转灰度且格式相同时直接复用原始字节"""
+        options = options or DEFAULT_ENCODE_OPTIONS
+        cache = self.__dict__.setdefault("_encoded", {})
+        if options in cache:
+            return cache[options]
+        width, height = self.resolution
+        scale = min(1.0, options.max_side / max(width, height)) if options.max_side else 1.0
+        if scale == 1.0 and not options.grayscale and options.mime == self.mime:
+            encoded = EncodedImage(self.data, self.mime, (width, height), options.detail)
+            encoded.__dict__["base64"] = self.base64
+        else:
+            img = self.image
+            if scale < 1.0:
+                img = img.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.LANCZOS)
+            if options.grayscale:
+                img = img.convert("L")
+            buf = BytesIO()
+            pil_format = {"image/jpeg": "JPEG", "image/webp": "WEBP"}.get(options.mime, "PNG")
+            if pil_format == "PNG":
+                img.save(buf, format=pil_format, optimize=False)
+            else:
+                img.save(buf, format=pil_format, quality=options.quality)
+            encoded = EncodedImage(buf.getvalue(), options.mime, img.size, options.detail)
+        cache[options] = encoded
+        return encoded
+
+    def image_part(self, options: EncodeOptions = None) -> dict:
+        """按 options 编码后的 image_url 内容块"""
+        return self.encode(options).image_part()
+
+    def save(self, path):
+        """原样写出字节，不做重新编码"""
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+DEFAULT_ENCODE_OPTIONS = EncodeOptions.from_env()
+
+def as_frame(image) -> Frame:
+    """统一输入：Frame / 文件路径 / 原始字节"""
+    if isinstance(image, Frame):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        return Frame(bytes(image))
+    return Frame.from_path(image)
+
+def draw_box_on_image(image, box, screen_resolution, label, output_path=None):
+    """在图像副本上绘制边界框；给定 output_path 时保存，返回绘制后的图像"""
+    img = as_frame(image).image.copy()
     draw = ImageDraw.Draw(img)
     actual_width, actual_height = img.size
     screen_width, screen_height = screen_resolution
@@ -30,23 +195,151 @@ def draw_box_on_image(image_path, box, screen_resolution, label, output_path):
         font = ImageFont.load_default()
 
     draw.text((scaled_box[0], scaled_box[1] - 20), label, fill="red", font=font)
-    img.save(output_path)
-    logger.success(f"已保存结果图像：{output_path}")
+    if output_path:
+        img.save(output_path)
+        logger.success(f"已保存结果图像：{output_path}")
+    return img
 
-def get_resolution(image_path):
+def get_resolution(image):
     """获取图像的分辨率"""
     try:
-        img = Image.open(image_path)
-        return img.size  # 返回 (width, height)
+        return tuple(as_frame(image).resolution)  # 返回 (width, height)
     except Exception as e:
         logger.error(f"获取图像分辨率失败: {e}")
         return None
     
-def encode_image_to_base64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+def encode_image_to_base64(image):
+    return as_frame(image).base64
     
 def get_date_time():
     """获取当前日期时间：yyyy-MM-dd@HH:mm:ss"""
     from datetime import datetime
-    return datetime.now().strftime("%Y-%m-%d@%H:%M:%S")
\ No newline at end of file
+    return datetime.now().strftime("%Y-%m-%d@%H:%M:%S")
+
+def get_record_path(record_dir, filename):
+    """生成录制目录下带时间戳的备份路径（目录不存在时自动创建）"""
+    os.makedirs(record_dir, exist_ok=True)
+    return Path(record_dir) / f"{get_date_time()}_{filename}"
+
+def perceptual_hash(image, hash_size=16):
+    """差值哈希（dHash）：灰度缩放到 (hash_size+1)×hash_size 后比较相邻像素，返回十六进制串。
+    字节完全相同的帧哈希必然相同；仅有压缩噪声等细微差异的帧通常也相同。"""
+    img = as_frame(image).image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = img.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+def tile_diff(a, b, tile=16):
+    """两张同尺寸灰度数组的分块差异：返回每个 tile×tile 块的平均绝对差 (rows, cols)。
+    边缘不足一块的部分补零参与计算。"""
+    import numpy as np
+    diff = np.abs(a.astype(np.int16) - b.astype(np.int16))
+    h, w = diff.shape
+    rows, cols = -(-h // tile), -(-w // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=np.int32)
+    padded[:h, :w] = diff
+    sums = padded.reshape(rows, tile, cols, tile).sum(axis=(1, 3))
+    counts = np.zeros_like(padded)
+    counts[:h, :w] = 1
+    return sums / np.maximum(counts.reshape(rows, tile, cols, tile).sum(axis=(1, 3)), 1)
+
+def scale_box(box, from_resolution, to_resolution):
+    """把 [x1, y1, x2, y2] 从一个分辨率坐标系换算到另一个"""
+    x_scale = to_resolution[0] / from_resolution[0]
+    y_scale = to_resolution[1] / from_resolution[1]
+    return [int(round(box[0] * x_scale)), int(round(box[1] * y_scale)),
+            int(round(box[2] * x_scale)), int(round(box[3] * y_scale))]
+
+def box_iou(a, b) -> float:
+    """两个 [x1, y1, x2, y2] 框的交并比"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def box_center(box):
+    return ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+
+def pos_region(pos, resolution, pad: float = 0.1):
+    """把决策给出的位置描述（如“顶部右侧”“页面正中”）映射为屏幕上的区域 [x1, y1, x2, y2]。
+    每个方向三等分，区域四周各外扩 pad（占宽 / 高的比例）；无法识别位置时返回 None。"""
+    if not pos:
+        return None
+    vertical = (0.0, 1 / 3) if ("顶" in pos or "上" in pos) else (2 / 3, 1.0) if ("底" in pos or "下" in pos) else None
+    horizontal = (0.0, 1 / 3) if "左" in pos else (2 / 3, 1.0) if "右" in pos else None
+    if "中" in pos:
+        vertical = vertical or (1 / 3, 2 / 3)
+        horizontal = horizontal or (1 / 3, 2 / 3)
+    if vertical is None and horizontal is None:
+        return None
+    (top, bottom), (left, right) = vertical or (0.0, 1.0), horizontal or (0.0, 1.0)
+    width, height = resolution
+    return [int(max(0.0, left - pad) * width), int(max(0.0, top - pad) * height),
+            int(min(1.0, right + pad) * width), int(min(1.0, bottom + pad) * height)]
+
+def _fft_shape(shape):
+    """不小于 shape 且只含因子 2、3、5 的尺寸，FFT 在这类尺寸上最快"""
+    def fast(n):
+        while True:
+            m = n
+            for p in (2, 3, 5):
+                while m % p == 0:
+                    m //= p
+            if m == 1:
+                return n
+            n += 1
+    return tuple(fast(n) for n in shape)
+
+def match_template(gray, template, scales=(1.0,), min_side: int = 12):
+    """多尺度归一化互相关（NCC）模板匹配，gray 与 template 为灰度数组。
+    返回 (得分, [x1, y1, x2, y2])，得分在 -1~1 之间；模板无纹理或大于搜索图时返回 (0.0, None)。
+    相关项用 FFT 计算，窗口均值与方差用积分图计算；模板较大时先按比例缩小再匹配（最短边不少于 min_side 像素）。"""
+    import numpy as np
+    best = (0.0, None)
+    image = np.asarray(gray, dtype=np.float64)
+    height, width = image.shape
+    prepared = {}  # 缩小倍数 → (搜索图, 其 FFT, 积分图, 平方积分图)，各尺度共用
+    for scale in scales:
+        th, tw = round(template.shape[0] * scale), round(template.shape[1] * scale)
+        if th < 4 or tw < 4 or th > height or tw > width:
+            continue
+        factor = max(1, min(th, tw) // min_side)
+        if factor not in prepared:
+            img = image if factor == 1 else np.asarray(Image.fromarray(image.astype(np.uint8)).resize(
+                (max(1, width // factor), max(1, height // factor)), Image.Resampling.BOX), dtype=np.float64)
+            prepared[factor] = (img, np.fft.rfft2(img, s=_fft_shape(img.shape)), np.pad(img.cumsum(0).cumsum(1), ((1, 0), (1, 0))),
+                                np.pad((img ** 2).cumsum(0).cumsum(1), ((1, 0), (1, 0))))
+        img, img_fft, s1, s2 = prepared[factor]
+        t = np.asarray(Image.fromarray(np.asarray(template, dtype=np.uint8)).resize((max(1, tw // factor), max(1, th // factor)),
+                                                                                   Image.Resampling.BOX), dtype=np.float64)
+        h, w = t.shape
+        H, W = img.shape
+        if h > H or w > W:
+            continue
+        t0 = t - t.mean()
+        t_norm = np.sqrt((t0 ** 2).sum())
+        if t.std() < 2.0:
+            continue  # 纯色模板无法可靠匹配
+        shape = _fft_shape(img.shape)
+        corr = np.fft.irfft2(img_fft * np.conj(np.fft.rfft2(t0, s=shape)), s=shape)[:H - h + 1, :W - w + 1]
+        window = lambda s: s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+        var = window(s2) - window(s1) ** 2 / (h * w)
+        score = np.where(var > 1e-3 * h * w, corr / (t_norm * np.sqrt(np.maximum(var, 1e-12))), 0.0)
+        y, x = np.unravel_index(int(np.argmax(score)), score.shape)
+        found = (float(score[y, x]), [int(x * factor), int(y * factor), int(x * factor + tw), int(y * factor + th)])
+        if factor > 1:
+            # 缩小后的位置误差在 factor 像素以内，在原分辨率下于附近重新匹配
+            x1, y1 = max(0, found[1][0] - 2 * factor), max(0, found[1][1] - 2 * factor)
+            x2, y2 = min(width, found[1][2] + 2 * factor), min(height, found[1][3] + 2 * factor)
+            refined = match_template(image[y1:y2, x1:x2], template, (scale,), min_side=max(th, tw))
+            if refined[1] is not None:
+                bx1, by1, bx2, by2 = refined[1]
+                found = (refined[0], [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1])
+        if found[0] > best[0]:
+            best = found
+    return best
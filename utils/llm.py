@@ -1,10 +1,21 @@
+import asyncio
 import os
 import json
+from dataclasses import replace
 from loguru import logger
 
-from utils.imageProcessing import encode_image_to_base64
-from utils import client, INPUT_IMAGE_PATH, MAX_RETRY, VL_MODEL, CHAT_MODEL
+from utils.aio import run_sync
+from utils.imageProcessing import DEFAULT_ENCODE_OPTIONS, EncodeOptions, as_frame
+from utils import (
+    INPUT_IMAGE_PATH, MAX_RETRY, VL_MODEL, CHAT_MODEL, DECIDE_TOKEN_BUDGET,
+    CACHE_SIZE, CACHE_DIR, CACHE_DISK_SIZE, CACHE_MAX_AGE)
 from utils.tool import load_json_from_llm
+from utils.streaming import json_acceptor, stream_completion
+from utils.retry import RetryPolicy, call_with_policy, policy_for
+from utils.history import build_decision_input
+from utils.pageDelta import PageStateEncoder
+from utils.tracing import current_span
+from utils.cache import PerceptionCache, SimilarFrames, make_cache_key, prompt_version
 PIC_TO_JSON_PROMPT = """我需要你作为一名前端无障碍与用户体验专家，对提供的网页截图进行分析。请仔细观察页面，找出主要的可交互或可视信息元素，并将分析结果以结构化JSON格式呈现。
 
 具体要求如下：
@@ -118,7 +129,9 @@ OPERATION_INFERENCE_PROMPT = '''
 
     - 任务目标是一个简短的描述，表明用户通过 **整个操作流程** 希望完成的操作或目标。
 
-    - 历史操作是一个列表，包含用户在当前页面上已经执行过的操作、用户做出当前操作的原因、用户观察到的页面布局和元素状态。
+    - 页面状态可能以增量形式给出：此时对话开头另有一条消息给出第 step 步的完整页面状态（基准），page_state 中 delta_from_step 指明基准步数，added 为新出现的元素，removed 为已消失的元素（label 与 position），changed 为属性发生变化的元素（给出变化后的完整内容），fields 为变化的其他字段；当前页面 = 基准 + 增量。
+
+    - 历史操作是一个对象：recent 是最近几步操作的完整记录（包含操作、做出操作的原因与执行结果）；earlier 是更早步骤的摘要，每行一步，连续重复的操作合并为一行；warnings（如果有）是系统检测到的重复操作提醒。
 
     - 你需要特别注意用户的历史操作，不要执行重复操作。
 
@@ -164,6 +177,17 @@ OPERATION_INFERENCE_PROMPT = '''
     }
     ```
 
+    - 如果页面上有多个需要依次填写的输入框（例如表单），可以一次给出全部输入框，参数格式如下：
+
+    ```json
+    {
+        "fields": [
+            {"target": "输入框的 label 或者图标含义", "pos": 大致位置, "text": "要输入的文本内容"},
+            ...
+        ]
+    }
+    ```
+
 3. "SCROLL": 滚动页面；
 
     - 如果用户需要滚动页面，你需要标注出滚动的方向（如向上、向下、向左、向右）。
@@ -217,135 +241,275 @@ OPERATION_INFERENCE_PROMPT = '''
 请不要添加任何额外的文字或解释，只返回 JSON 内容，确保JSON的格式有效。
 '''
 
+# 页面描述 / 页面状态缓存：键 = 帧哈希（或描述文本哈希）+ 模型 + prompt 版本
+# 帧哈希取 similar_frames 归并后的 digest：字节不同但像素确认相同的帧共用一个键
+description_cache = PerceptionCache("describe", CACHE_SIZE, CACHE_DIR, CACHE_DISK_SIZE, CACHE_MAX_AGE)
+page_state_cache = PerceptionCache("page_state", CACHE_SIZE, CACHE_DIR, CACHE_DISK_SIZE, CACHE_MAX_AGE)
+similar_frames = SimilarFrames()
 
-def ask_question_about_image(image_path: str, question: str) -> str:
-    """向图像提问，使用视觉问答模型回答问题。"""
-    base64_img = encode_image_to_base64(image_path)
-    response = client.chat.completions.create(
+def _cache_enabled(use_cache: bool) -> bool:
+    return use_cache and CACHE_SIZE > 0
+
+def _validate_page_state(page_state) -> dict:
+    """流式提前截断用的最小校验：页面状态必须是带 elements 列表的对象"""
+    if not isinstance(page_state, dict) or not isinstance(page_state.get("elements"), list):
+        raise ValueError("页面状态缺少 elements 列表")
+    return page_state
+
+# 以下每个函数都有 async 版本（*_async，核心实现）与同名同步版本（在后台事件循环中执行 async 版本）
+
+async def ask_question_about_image_async(image, question: str, encode: EncodeOptions = None) -> str:
+    """向图像提问，使用视觉问答模型回答问题。image 可以是 Frame 或图像路径。"""
+    frame = as_frame(image)
+    response = await call_with_policy("vqa", lambda: stream_completion(
+        name="vqa",
         model=VL_MODEL,
         messages=[
             {"role": "system", "content": [{"type": "text", "text": "你是一个视觉问答助手，能回答用户提出的关于图像的问题。"}]},
             {
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}},
+                    frame.image_part(encode),
                     {"type": "text", "text": question}
                 ]
             }
         ]
-    )
+    ), failure_message="视觉问答请求失败")
     content = response.choices[0].message.content
-    logger.debug(f"模型原始回答：\n{content}")
+    logger.debug("模型原始回答：\n{}", content)
     return response.choices[0].message.content # type: ignore
 
-def describe_screen_caption(image_path: str = INPUT_IMAGE_PATH) -> str:
-    """描述屏幕截图的结构和功能。"""
-    base64_img = encode_image_to_base64(image_path)
-    response = client.chat.completions.create(
+def ask_question_about_image(image, question: str, encode: EncodeOptions = None) -> str:
+    """向图像提问，使用视觉问答模型回答问题。image 可以是 Frame 或图像路径。"""
+    return run_sync(ask_question_about_image_async(image, question, encode))
+
+async def describe_screen_caption_async(image=INPUT_IMAGE_PATH, use_cache: bool = True, encode: EncodeOptions = None) -> str:
+    """描述屏幕截图的结构和功能。image 可以是 Frame 或图像路径。"""
+    frame = as_frame(image)
+    use_cache = _cache_enabled(use_cache)
+    if use_cache:
+        frame_key = await asyncio.to_thread(similar_frames.canonical, frame)
+        key = make_cache_key(frame_key, VL_MODEL, prompt_version(DESCRIBE_PROMPT), encode or DEFAULT_ENCODE_OPTIONS)
+        cached = description_cache.get(key)
+        if cached is not None:
+            logger.info(f"命中页面描述缓存，跳过 VL 调用（{description_cache.stats()}）")
+            return cached
+    response = await call_with_policy("describe", lambda: stream_completion(
+        name="describe",
         model=VL_MODEL,
         messages=[
             {"role": "system", "content": [{"type": "text", "text": DESCRIBE_PROMPT}]},
             {
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}},
+                    frame.image_part(encode),
                     {"type": "text", "text": "请分析这个页面的结构和功能。"}
                 ]
             }
         ]
-    )
+    ), failure_message="页面描述请求失败")
     content = response.choices[0].message.content
-    logger.debug(f"模型原始回答：\n{content}")
+    logger.debug("模型原始回答：\n{}", content)
+    if use_cache and content:
+        description_cache.put(key, content)
     return response.choices[0].message.content # type: ignore
 
-def parse_page_state_from_description(description: str) -> dict:
+def describe_screen_caption(image=INPUT_IMAGE_PATH, use_cache: bool = True, encode: EncodeOptions = None) -> str:
+    """描述屏幕截图的结构和功能。image 可以是 Frame 或图像路径。"""
+    return run_sync(describe_screen_caption_async(image, use_cache, encode))
+
+async def parse_page_state_from_description_async(description: str, use_cache: bool = True,
+                                                  policy: RetryPolicy = None) -> dict:
+    """将页面描述转换为结构化的页面状态对象。policy 为重试策略，默认见 utils.retry.POLICIES。"""
+    use_cache = _cache_enabled(use_cache)
+    if use_cache:
+        key = make_cache_key(make_cache_key(description), CHAT_MODEL, prompt_version(DESC_TO_STATE_PROMPT))
+        cached = page_state_cache.get(key)
+        if cached is not None:
+            logger.info(f"命中页面状态缓存，跳过解析调用（{page_state_cache.stats()}）")
+            return cached
+    async def attempt():
+        # 使用 Qwen Turbo 模型解析页面状态
+        logger.info("正在解析页面状态...")
+        response = await stream_completion(
+            name="page_state",
+            accept=json_acceptor(_validate_page_state),
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": [{"type": "text", "text": DESC_TO_STATE_PROMPT}]},
+                {"role": "user", "content": [{"type": "text", "text": description}]}
+            ]
+        )
+        content = response.choices[0].message.content
+        logger.debug("模型原始回答：\n{}", content)
+        return response.value or load_json_from_llm(content, _validate_page_state) # type: ignore
+
+    page_state = await call_with_policy("page_state", attempt, policy, "所有尝试均失败，请检查输入描述。")
+    if use_cache:
+        page_state_cache.put(key, page_state)
+    return page_state # type: ignore
+
+def parse_page_state_from_description(description: str, use_cache: bool = True, policy: RetryPolicy = None) -> dict:
     """将页面描述转换为结构化的页面状态对象。"""
-    for i in range(MAX_RETRY):
-        try:
-            # 使用 Qwen Turbo 模型解析页面状态
-            logger.info("正在解析页面状态...")
-            response = client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": [{"type": "text", "text": DESC_TO_STATE_PROMPT}]},
-                    {"role": "user", "content": [{"type": "text", "text": description}]}
-                ]
-            )
-            content = response.choices[0].message.content
-            logger.debug(f"模型原始回答：\n{content}")
-            page_state = load_json_from_llm(content) # type: ignore
-            return page_state # type: ignore
-        except Exception as e:
-            logger.error("解析失败：", e)
-    raise RuntimeError("所有尝试均失败，请检查输入描述。")
-
-def parse_image_state_to_json(image_path: str = INPUT_IMAGE_PATH):
-    """将图像状态解析为结构化的 JSON 对象。"""
-    for i in range(MAX_RETRY):
+    return run_sync(parse_page_state_from_description_async(description, use_cache, policy))
+
+async def parse_image_state_to_json_async(image=INPUT_IMAGE_PATH, use_cache: bool = True, retries: int = MAX_RETRY,
+                                          encode: EncodeOptions = None, policy: RetryPolicy = None):
+    """将图像状态解析为结构化的 JSON 对象。image 可以是 Frame 或图像路径；retries 覆盖 policy 的尝试轮数。"""
+    frame = as_frame(image)
+    use_cache = _cache_enabled(use_cache)
+    if use_cache:
+        frame_key = await asyncio.to_thread(similar_frames.canonical, frame)
+        key = make_cache_key(frame_key, VL_MODEL, prompt_version(PIC_TO_JSON_PROMPT), encode or DEFAULT_ENCODE_OPTIONS)
+        cached = page_state_cache.get(key)
+        if cached is not None:
+            logger.info(f"命中页面状态缓存，跳过 VL 调用（{page_state_cache.stats()}）")
+            return cached
+    async def attempt():
+        logger.info("正在解析图像状态...")
+        response = await stream_completion(
+            name="image_state",
+            accept=json_acceptor(_validate_page_state),
+            model=VL_MODEL,
+            messages=[
+                {"role": "system", "content": [{"type": "text", "text": PIC_TO_JSON_PROMPT}]},
+                {
+                    "role": "user",
+                    "content": [
+                        frame.image_part(encode)
+                    ]
+                }
+            ]
+        )
+        content = response.choices[0].message.content
+        logger.debug("模型原始回答：\n{}", content)
+        return response.value or load_json_from_llm(content, _validate_page_state) # type: ignore
+
+    policy = replace(policy or policy_for("image_state"), attempts=retries)
+    page_state = await call_with_policy("image_state", attempt, policy, "所有尝试均失败，请检查输入图像。")
+    if use_cache:
+        page_state_cache.put(key, page_state)
+    return page_state
+
+def parse_image_state_to_json(image=INPUT_IMAGE_PATH, use_cache: bool = True, retries: int = MAX_RETRY,
+                              encode: EncodeOptions = None, policy: RetryPolicy = None):
+    """将图像状态解析为结构化的 JSON 对象。image 可以是 Frame 或图像路径。"""
+    return run_sync(parse_image_state_to_json_async(image, use_cache, retries, encode, policy))
+
+PERCEPTION_STRATEGIES = ("two-stage", "direct", "hybrid")
+
+def _is_usable_page_state(page_state, min_elements: int) -> bool:
+    return (isinstance(page_state, dict)
+            and isinstance(page_state.get("elements"), list)
+            and len(page_state["elements"]) >= min_elements)
+
+async def perceive_page_state_async(image=INPUT_IMAGE_PATH, strategy: str = "two-stage",
+                                    use_cache: bool = True, min_elements: int = 3) -> dict:
+    """按感知策略得到页面状态。
+
+    - two-stage：VL 自然语言描述 + CHAT_MODEL 解析成 JSON（两次串行调用，元素最全）
+    - direct：VL 直接输出 JSON（一次调用）
+    - hybrid：先尝试一次 direct，结果不可用或元素少于 min_elements 时退回 two-stage
+    """
+    if strategy not in PERCEPTION_STRATEGIES:
+        raise ValueError(f"未知的感知策略: {strategy}，可选：{', '.join(PERCEPTION_STRATEGIES)}")
+    frame = as_frame(image)
+    if strategy in ("direct", "hybrid"):
         try:
-            logger.info("正在解析图像状态...")
-            base64_img = encode_image_to_base64(image_path)
-            response = client.chat.completions.create(
-                model=VL_MODEL,
-                messages=[
-                    {"role": "system", "content": [{"type": "text", "text": PIC_TO_JSON_PROMPT}]},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}}
-                        ]
-                    }
-                ]
-            )
-            content = response.choices[0].message.content
-            logger.debug(f"模型原始回答：\n{content}")
-            page_state = load_json_from_llm(content) # type: ignore
-            return page_state
-        except Exception as e:
-            logger.error(f"第 {i+1} 次尝试失败: {e}")
-            if i < MAX_RETRY - 1:
-                logger.info("正在重试...")
-    raise RuntimeError("所有尝试均失败，请检查输入图像。")
-
-def decide_next_action(page_state, target, history=[]):
+            page_state = await parse_image_state_to_json_async(
+                frame, use_cache=use_cache, retries=MAX_RETRY if strategy == "direct" else 1)
+            if strategy == "direct" or _is_usable_page_state(page_state, min_elements):
+                return page_state # type: ignore
+            logger.warning("直接解析得到的元素过少，退回两阶段感知")
+        except RuntimeError:
+            if strategy == "direct":
+                raise
+            logger.warning("直接解析失败，退回两阶段感知")
+    description = await describe_screen_caption_async(frame, use_cache=use_cache)
+    logger.success("页面结构分析结果：\n")
+    logger.info(description)
+    return await parse_page_state_from_description_async(description, use_cache=use_cache)
+
+def perceive_page_state(image=INPUT_IMAGE_PATH, strategy: str = "two-stage",
+                        use_cache: bool = True, min_elements: int = 3) -> dict:
+    """按感知策略得到页面状态，见 perceive_page_state_async。"""
+    return run_sync(perceive_page_state_async(image, strategy, use_cache, min_elements))
+
+def validate_action(action) -> dict:
+    """校验决策器输出的 operation 对象，不合法时抛出 ValueError"""
+    if action["action"] not in ["CLICK", "TYPE", "SUCCESS", "FAIL", "SCROLL", "ASK_USER"]: # type: ignore
+        raise ValueError("操作类型不合法，请检查模型输出。")
+    if action["action"] == "TYPE": # type: ignore
+        fields = action.get("params", {}).get("fields") or [action.get("params", {})] # type: ignore
+        for field in fields:
+            if not isinstance(field, dict) or "target" not in field or "pos" not in field or "text" not in field:
+                raise ValueError("TYPE 操作缺少必要参数（target, pos, text）")
+    elif action["action"] == "CLICK": # type: ignore
+        if "params" not in action or "target" not in action["params"] or "pos" not in action["params"]: # type: ignore
+            raise ValueError("CLICK 操作缺少必要参数（target, pos）")
+    elif action["action"] == "SCROLL": # type: ignore
+        if "params" not in action or "direction" not in action["params"]: # type: ignore
+            raise ValueError("SCROLL 操作缺少必要参数（direction）")
+        if action["params"]["direction"] not in ["向上", "向下", "向左", "向右"]: # type: ignore
+            raise ValueError("SCROLL 操作的方向参数无效，请选择：向上、向下、向左或向右")
+    elif action["action"] == "ASK_USER": # type: ignore
+        if "params" not in action or "question" not in action["params"]: # type: ignore
+            raise ValueError("ASK_USER 操作缺少必要参数（question）")
+    return action
+
+async def decide_next_action_async(page_state, target, history=[], policy: RetryPolicy = None,
+                                   encoder: PageStateEncoder = None):
+    """根据页面状态、用户目标和历史操作，决定下一步操作。
+    history 为 HistoryManager 或操作列表，按 DECIDE_TOKEN_BUDGET 压缩后发送（见 utils.history）；
+    policy 为重试策略，默认见 utils.retry.POLICIES；
+    encoder 为同一任务内共享的 PageStateEncoder，给出时页面状态以“基准 + 增量”的形式发送（见 utils.pageDelta）。"""
+    messages = [{"role": "system", "content": [{"type": "text", "text": OPERATION_INFERENCE_PROMPT}]}]
+    reference, encoded = encoder.encode(page_state) if encoder is not None else (None, page_state)
+    if reference is not None:
+        # 基准紧跟 system prompt，基准不变的各步请求前缀相同，可命中服务端的前缀缓存
+        reference_text = json.dumps({"reference_page_state": reference}, ensure_ascii=False)
+        user_input, report = build_decision_input(encoded, target, history, OPERATION_INFERENCE_PROMPT + reference_text)
+        if report["over_budget"]:
+            # 基准与增量里没有可裁剪的元素列表：本步改发完整页面状态（可按预算裁剪），并放弃基准
+            logger.warning(f"基准 + 增量超出 token 预算 {DECIDE_TOKEN_BUDGET}，本步改为发送裁剪后的完整页面状态")
+            encoder.reset()
+            reference = None
+        else:
+            messages.append({"role": "user", "content": [{"type": "text", "text": reference_text}]})
+            report["page_state_base_step"] = encoded["delta_from_step"]
+    if reference is None:
+        user_input, report = build_decision_input(page_state, target, history, OPERATION_INFERENCE_PROMPT)
+        if encoder is not None:
+            report["page_state_base_step"] = None
+    logger.info(f"决策输入：约 {report['prompt_tokens_est']} tokens，历史 {report['history_steps']} 步"
+                f"（原样保留 {report['verbatim_steps']} 步），裁剪元素 {report['trimmed_elements']} 个")
+    if report["over_budget"]:
+        logger.warning(f"决策输入超出 token 预算 {DECIDE_TOKEN_BUDGET}")
+    current = current_span()
+    if current is not None:
+        current.set(**report)
+
+    async def attempt():
+        response = await stream_completion(
+            name="decide",
+            accept=json_acceptor(validate_action),
+            model=CHAT_MODEL,
+            messages=messages + [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": user_input}
+                    ]
+                }
+            ]
+        )
+        content = response.choices[0].message.content
+        logger.debug("模型原始回答：\n{}", content)
+        return response.value or load_json_from_llm(content, validate_action) # type: ignore
+
+    return await call_with_policy("decide", attempt, policy, "所有尝试均失败，请检查输入数据。")
+
+def decide_next_action(page_state, target, history=[], policy: RetryPolicy = None,
+                       encoder: PageStateEncoder = None):
     """根据页面状态、用户目标和历史操作，决定下一步操作。"""
-    for i in range(MAX_RETRY):
-        try:
-            response = client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": [{"type": "text", "text": OPERATION_INFERENCE_PROMPT}]},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": json.dumps({"page_state": page_state, "user_target": target, "user_history": history}, ensure_ascii=False)}
-                        ]
-                    }
-                ]
-            )
-            content = response.choices[0].message.content
-            logger.debug(f"模型原始回答：\n{content}")
-            action = load_json_from_llm(content) # type: ignore
-
-            if action["action"] not in ["CLICK", "TYPE", "SUCCESS", "FAIL", "SCROLL", "ASK_USER"]: # type: ignore
-                raise ValueError("操作类型不合法，请检查模型输出。")
-            if action["action"] == "TYPE": # type: ignore
-                if "params" not in action or "target" not in action["params"] or "pos" not in action["params"] or "text" not in action["params"]: # type: ignore
-                    raise ValueError("TYPE 操作缺少必要参数（target, pos, text）")
-            elif action["action"] == "CLICK": # type: ignore
-                if "params" not in action or "target" not in action["params"] or "pos" not in action["params"]: # type: ignore
-                    raise ValueError("CLICK 操作缺少必要参数（target, pos）")
-            elif action["action"] == "SCROLL": # type: ignore
-                if "params" not in action or "direction" not in action["params"]: # type: ignore
-                    raise ValueError("SCROLL 操作缺少必要参数（direction）")
-                if action["params"]["direction"] not in ["向上", "向下", "向左", "向右"]: # type: ignore
-                    raise ValueError("SCROLL 操作的方向参数无效，请选择：向上、向下、向左或向右")
-            elif action["action"] == "ASK_USER": # type: ignore
-                if "params" not in action or "question" not in action["params"]: # type: ignore
-                    raise ValueError("ASK_USER 操作缺少必要参数（question）")
-            return action
-        except Exception as e:
-            print("解析失败：", e)
-            print("正在重试...")
-
-    raise RuntimeError("所有尝试均失败，请检查输入数据。")
\ No newline at end of file
+    return run_sync(decide_next_action_async(page_state, target, history, policy, encoder))
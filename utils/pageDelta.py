@@ -0,0 +1,114 @@
+"""相邻步骤间页面状态的增量编码。
+
+输入文字、滚动等操作之后，页面状态通常只有少数元素变化。PageStateEncoder 记住最近一次完整发送的页面状态（基准），
+之后的步骤只发送相对基准的差异：按 (label, position) 对齐元素（同键的多个元素按出现顺序逐个对齐），给出新增、消失与属性变化的元素。
+基准本身放在决策请求中紧跟 system prompt 的一条独立消息里，基准不变时这段前缀逐字相同，
+可以命中服务端的前缀缓存（usage 中的 cached_tokens），每步真正需要处理的只有增量部分。
+
+以下情况以当前页面状态作为新基准（本步增量为空）：没有基准、距上次更新基准已满 full_interval 步、页面类型变化、
+变化的元素超过当前元素数的 max_delta_ratio、或者增量涉及同一 (label, position) 的多个元素（无法看出指的是哪一个）。新基准在更新的当步就放在前缀位置，下一步即可命中缓存。
+
+基准与增量都不能按 token 预算裁剪；二者合起来超出 DECIDE_TOKEN_BUDGET 时，决策改发可裁剪的完整页面状态并调用 reset
+放弃基准（见 llm.decide_next_action_async）。
+"""
+import json
+
+from utils import PAGE_STATE_DELTA, PAGE_STATE_FULL_INTERVAL
+
+
+def element_key(element) -> tuple:
+    """元素的对齐键：label 与 position"""
+    if not isinstance(element, dict):
+        return (json.dumps(element, ensure_ascii=False, sort_keys=True), None)
+    return element.get("label"), element.get("position")
+
+
+def _keyed(elements) -> dict:
+    """{(label, position, 同键元素中的序号): 元素}：同键的元素（如同一位置的多张卡片）按出现顺序逐个对齐"""
+    keyed, counts = {}, {}
+    for element in elements or []:
+        key = element_key(element)
+        occurrence = counts[key] = counts.get(key, -1) + 1
+        keyed[(*key, occurrence)] = element
+    return keyed
+
+
+def diff_page_state(base: dict, current: dict) -> dict:
+    """current 相对 base 的差异：added / changed 为完整元素，removed 为 {label, position}"""
+    base_elements = _keyed(base.get("elements"))
+    current_elements = _keyed(current.get("elements"))
+    added, changed = [], []
+    for key, element in current_elements.items():
+        old = base_elements.get(key)
+        if old is None:
+            added.append(element)
+        elif old != element:
+            changed.append(element)
+    removed = [{"label": label, "position": position} for label, position, n in base_elements
+               if (label, position, n) not in current_elements]
+    delta = {"added": added, "removed": removed, "changed": changed}
+    for field in set(base) | set(current):
+        if field != "elements" and base.get(field) != current.get(field):
+            delta.setdefault("fields", {})[field] = current.get(field)
+    return delta
+
+
+def _duplicated_keys(elements) -> set:
+    seen, duplicated = set(), set()
+    for element in elements or []:
+        key = element_key(element)
+        (duplicated if key in seen else seen).add(key)
+    return duplicated
+
+
+def ambiguous(base: dict, current: dict, delta: dict) -> bool:
+    """增量是否涉及重复的键：同一 (label, position) 有多个元素时，增量里的元素对应哪一个无法看出"""
+    duplicated = _duplicated_keys(base.get("elements")) | _duplicated_keys(current.get("elements"))
+    touched = {element_key(e) for e in delta["added"] + delta["changed"]} | {(r["label"], r["position"]) for r in delta["removed"]}
+    return bool(duplicated & touched)
+
+
+def delta_size(delta: dict) -> int:
+    return len(delta["added"]) + len(delta["removed"]) + len(delta["changed"])
+
+
+class PageStateEncoder:
+    """为每一步的决策请求给出基准与增量。encode 返回 (基准, 本步的 page_state 字段)：
+    基准为 {"step", "page_state"}，本步字段为相对它的增量；未开启或页面状态没有元素列表时返回 (None, 原页面状态)。"""
+
+    def __init__(self, full_interval: int = PAGE_STATE_FULL_INTERVAL, max_delta_ratio: float = 0.5,
+                 enabled: bool = PAGE_STATE_DELTA):
+        self.full_interval = full_interval
+        self.max_delta_ratio = max_delta_ratio
+        self.enabled = enabled
+        self.base = None
+        self.base_step = 0
+        self.step = 0
+        self.full_count = 0
+        self.delta_count = 0
+        self.reset_count = 0
+
+    def encode(self, page_state: dict):
+        self.step += 1
+        if not self.enabled or not isinstance(page_state, dict) or not isinstance(page_state.get("elements"), list):
+            self.base = None
+            return None, page_state
+        delta = None
+        if self.base is not None and self.step - self.base_step < self.full_interval:
+            delta = diff_page_state(self.base, page_state)
+            elements = len(page_state["elements"])
+            if "page_type" in delta.get("fields", {}) or delta_size(delta) > self.max_delta_ratio * max(1, elements) \
+                    or ambiguous(self.base, page_state, delta):
+                delta = None
+        if delta is None:
+            self.base, self.base_step = page_state, self.step
+            self.full_count += 1
+            delta = {"added": [], "removed": [], "changed": []}
+        else:
+            self.delta_count += 1
+        return {"step": self.base_step, "page_state": self.base}, {"delta_from_step": self.base_step, **delta}
+
+    def reset(self):
+        """放弃当前基准（本步没有按基准 + 增量发送），下一步以当时的页面状态作为新基准"""
+        self.base = None
+        self.reset_count += 1
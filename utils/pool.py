@@ -0,0 +1,171 @@
+"""多会话智能体池：一个 Chromium 进程下开多个隔离的浏览器上下文，从任务队列中取 (url, instruction) 并发执行。
+
+每个任务使用独立的上下文（cookie / 存储互不影响）、独立的操作历史与录制目录（<record_root>/<session>/），
+结束后汇总吞吐量（任务/小时）、单任务耗时与每个上下文的内存占用。
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+from dataclasses import asdict, dataclass, field, replace
+
+from loguru import logger
+from playwright.async_api import async_playwright
+
+from utils import RECORD_IMAGE_PATH
+from utils.agent import TASK_DONE, agent_start_async
+from utils.browserProfile import BrowserProfile
+from utils.webBrowser import AsyncWebBrowserOperator
+
+
+@dataclass
+class AgentJob:
+    url: str
+    instruction: str
+    perception: str = "two-stage"
+
+
+@dataclass
+class AgentTaskResult:
+    job: AgentJob
+    session: str
+    success: bool = False
+    steps: int = 0
+    latency: float = 0.0
+    memory: dict = field(default_factory=dict)
+    record_dir: str = ""
+    error: str = ""
+    history: list = field(default_factory=list)
+
+
+@dataclass
+class PoolReport:
+    size: int
+    elapsed: float
+    results: list
+
+    @property
+    def throughput(self) -> float:
+        """每小时完成的任务数（按墙钟时间计，含失败任务）"""
+        return len(self.results) / self.elapsed * 3600 if self.elapsed else 0.0
+
+    def summary(self) -> dict:
+        latencies = [r.latency for r in self.results]
+        heaps = [r.memory.get("js_heap_used_mb", 0) for r in self.results if r.memory]
+        return {
+            "sessions": self.size,
+            "tasks": len(self.results),
+            "succeeded": sum(r.success for r in self.results),
+            "elapsed_s": round(self.elapsed, 1),
+            "tasks_per_hour": round(self.throughput, 1),
+            "latency_median_s": round(statistics.median(latencies), 1) if latencies else None,
+            "latency_max_s": round(max(latencies), 1) if latencies else None,
+            "js_heap_mean_mb": round(statistics.mean(heaps), 1) if heaps else None,
+            "js_heap_max_mb": max(heaps) if heaps else None,
+        }
+
+
+class AgentPool:
+    """在共享浏览器上并发运行多个智能体会话。
+
+    用法：
+        async with AgentPool(size=4) as pool:
+            report = await pool.run([AgentJob(url, instruction), ...])
+    """
+
+    def __init__(self, size: int = 4, headless: bool = True, resolution=(1280, 720),
+                 record_root: str = RECORD_IMAGE_PATH, max_steps: int = 30, profile: BrowserProfile = None):
+        if size < 1:
+            raise ValueError("智能体池的会话数至少为 1")
+        profile = replace(profile or BrowserProfile.from_env(), headless=headless)
+        if profile.user_data_dir:
+            raise ValueError("智能体池的每个会话使用隔离的上下文，不支持持久化用户目录")
+        self.size = size
+        self.headless = headless
+        self.profile = profile
+        self.resolution = resolution
+        self.record_root = record_root
+        self.max_steps = max_steps
+        self.playwright = None
+        self.browser = None
+        self._sessions = 0
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        if self.profile.cdp_endpoint:
+            self.browser = await self.playwright.chromium.connect_over_cdp(self.profile.cdp_endpoint)
+        else:
+            self.browser = await self.playwright.chromium.launch(headless=self.headless, args=self.profile.launch_args())
+        logger.success(f"智能体池已启动：{'预热' if self.profile.cdp_endpoint else '共享'}浏览器，最多 {self.size} 个并发会话")
+        return self
+
+    async def close(self):
+        if self.browser is not None:
+            await self.browser.close()
+            await self.playwright.stop()
+            self.browser = self.playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run(self, jobs) -> PoolReport:
+        """把任务放入队列，由 size 个工作协程并发领取执行，全部完成后返回 PoolReport"""
+        if self.browser is None:
+            await self.start()
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        results = []
+        start = time.perf_counter()
+        workers = [asyncio.create_task(self._worker(queue, results)) for _ in range(min(self.size, queue.qsize()))]
+        await asyncio.gather(*workers)
+        report = PoolReport(self.size, time.perf_counter() - start, results)
+        logger.success(f"智能体池运行结束：{report.summary()}")
+        return report
+
+    async def _worker(self, queue: asyncio.Queue, results: list):
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results.append(await self.run_job(job))
+
+    async def run_job(self, job: AgentJob) -> AgentTaskResult:
+        """在新的隔离上下文中执行一个任务；异常不会中断其他会话"""
+        self._sessions += 1
+        session = f"session-{self._sessions:04d}"
+        record_dir = os.path.join(self.record_root, session) if self.record_root else ""
+        result = AgentTaskResult(job=job, session=session, record_dir=record_dir)
+        logger.info(f"[{session}] 开始任务：{job.instruction}（{job.url}）")
+        start = time.perf_counter()
+        browser = await AsyncWebBrowserOperator.open_session(self.browser, self.resolution, record_dir, self.profile)
+        try:
+            result.history = await agent_start_async(job.url, job.instruction, job.perception, browser,
+                                                     interactive=False, max_steps=self.max_steps)
+            result.success = bool(result.history) and result.history[-1].get("result") == TASK_DONE
+        except Exception as e:
+            result.error = str(e)
+            logger.error(f"[{session}] 任务失败: {e}")
+        finally:
+            result.latency = time.perf_counter() - start
+            result.steps = len(result.history)
+            try:
+                result.memory = await browser.agent.memory_metrics()
+            except Exception as e:
+                logger.warning(f"[{session}] 读取内存指标失败: {e}")
+            await browser.close()
+        if record_dir:
+            await asyncio.to_thread(self._save_history, result)
+        logger.info(f"[{session}] 任务结束：成功 {result.success}，{result.steps} 步，用时 {result.latency:.1f}s，内存 {result.memory}")
+        return result
+
+    @staticmethod
+    def _save_history(result: AgentTaskResult):
+        os.makedirs(result.record_dir, exist_ok=True)
+        with open(os.path.join(result.record_dir, "history.json"), "w", encoding="utf-8") as f:
+            json.dump(asdict(result), f, ensure_ascii=False, indent=2)
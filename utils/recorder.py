@@ -0,0 +1,316 @@
+"""录制：截图、定位框与操作写入录制目录，供回放（benchmarks.replay）与排查使用。
+
+- 后台写入：所有写盘都由一个守护线程完成，调用方只把任务放进有界队列，内存占用有上限；队列满时，事件循环中的调用
+  丢弃该条记录（计入 stats["dropped"]，不阻塞事件循环与同一进程中的其他会话），其他线程中的调用等待（背压）
+- 内容寻址：图像按 SHA-1 存到 <RECORD_IMAGE_PATH>/objects/<前两位>/<哈希>.png，页面没有变化时重复的截图只存一份
+- 清单：每个录制目录一个 manifest.jsonl，按顺序记录 frame（截图）、box（定位框，引用所在帧；RECORD_ANNOTATED
+  开启时附标注图）与 action（操作），对象路径相对清单所在目录；每次任务开始时写一条 session 记录
+- 保留策略：以清单中的每次任务为单位淘汰，超过 RECORD_MAX_AGE_DAYS 的任务、以及对象总大小超过 RECORD_MAX_MB 时
+  最旧的任务从清单中删去（根目录的 manifest.jsonl 改写，智能体池的 <record_root>/<session>/ 子目录整个删除），
+  对象按引用计数删除，仍被保留的清单引用的对象不会被删
+
+用法：
+    recorder = recorder_for(record_dir)
+    recorder.frame(frame)
+    recorder.box(frame, box_data)
+    recorder.action(step, operation)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import weakref
+from collections import Counter
+from io import BytesIO
+
+from loguru import logger
+
+from utils import RECORD_ANNOTATED, RECORD_IMAGE_PATH, RECORD_MAX_AGE_DAYS, RECORD_MAX_MB, RECORD_QUEUE_SIZE
+from utils.imageProcessing import draw_box_on_image
+
+
+class RecordWriter:
+    """唯一的后台写入线程与有界队列；按写入次数定期执行保留策略"""
+
+    def __init__(self, queue_size: int = RECORD_QUEUE_SIZE, max_bytes: int = RECORD_MAX_MB * 2**20,
+                 max_age: float = RECORD_MAX_AGE_DAYS * 86400, retention_every: int = 200):
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retention_every = retention_every
+        self.roots = set()  # 出现过的 (录制根目录, 对象目录)，保留策略作用于这些目录
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_retention = 0.0
+        self.stats = {"tasks": 0, "objects_written": 0, "objects_deduped": 0, "bytes_written": 0,
+                      "write_s": 0.0, "blocked_s": 0.0, "removed_objects": 0, "removed_sessions": 0, "dropped": 0, "errors": 0}
+
+    def submit(self, func, *args) -> bool:
+        """放入写入队列，返回是否已入队。在事件循环线程中调用时不等待：队列已满则丢弃该任务并计入 dropped；
+        其他线程中调用时等待队列腾出位置"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+                self._thread.start()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            start = time.perf_counter()
+            self.queue.put((func, args))
+            waited = time.perf_counter() - start
+            if waited > 0.001:
+                self._add("blocked_s", waited)
+        else:
+            try:
+                self.queue.put_nowait((func, args))
+            except queue.Full:
+                self._add("dropped")
+                logger.debug("录制队列已满，丢弃一条录制")
+                return False
+        self._add("tasks")
+        return True
+
+    def _add(self, key: str, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _run(self):
+        done = 0
+        while True:
+            func, args = self.queue.get()
+            start = time.perf_counter()
+            try:
+                func(*args)
+            except Exception as e:
+                self._add("errors")
+                logger.error(f"录制写入失败: {e}")
+            finally:
+                self._add("write_s", time.perf_counter() - start)
+                self.queue.task_done()
+            done += 1
+            if done % self.retention_every == 1:
+                self.enforce_retention()
+
+    def flush(self):
+        """等待队列中的写入全部完成"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def store(self, objects_dir: str, data: bytes, ext: str = "png") -> str:
+        """写入内容寻址的对象，返回其路径；已存在时只更新修改时间"""
+        digest = hashlib.sha1(data).hexdigest()
+        path = os.path.join(objects_dir, digest[:2], f"{digest}.{ext}")
+        if os.path.exists(path):
+            os.utime(path)
+            self._add("objects_deduped")
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._add("objects_written")
+        self._add("bytes_written", len(data))
+        return path
+
+    def enforce_retention(self):
+        """按会话淘汰：清单中的每次任务（session 记录起的一段）是淘汰单位，对象按引用计数删除。
+        超过 max_age 的会话、以及对象总大小超过 max_bytes 时从最旧的会话起删去其清单条目，
+        不再被任何清单引用的对象随之删除；清单变空的会话子目录整个删除，根目录的清单改写为剩下的会话。
+        上次执行以来仍在写入的清单的最后一个会话（正在进行的任务）不会因大小超限被淘汰"""
+        now = time.time()
+        since, self._last_retention = self._last_retention, now
+        for root, objects_dir in list(self.roots):
+            objects = {}
+            for dirpath, _, filenames in os.walk(objects_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    objects[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+            units = _manifest_units(root, objects_dir, since)
+            refs = Counter(ref for unit in units for ref in unit["refs"])
+            total = sum(size for path, (_, size) in objects.items() if refs[path])
+            for unit in sorted(units, key=lambda u: u["time"]):
+                expired = self.max_age and now - unit["time"] > self.max_age
+                over = self.max_bytes and total > self.max_bytes and not unit["active"]
+                if not expired and not over:
+                    continue
+                unit["evicted"] = True
+                self._add("removed_sessions")
+                for ref in unit["refs"]:
+                    refs[ref] -= 1
+                    if not refs[ref] and ref in objects:
+                        total -= objects[ref][1]
+            for manifest, manifest_units in _group(units).items():
+                if any(u.get("evicted") for u in manifest_units):
+                    _rewrite_manifest(root, manifest, [u for u in manifest_units if not u.get("evicted")])
+            for path, (mtime, _) in objects.items():
+                # 未被引用的对象：被淘汰会话的对象，或其他进程刚写入、清单条目尚未追加的对象（留出一分钟）
+                if not refs[path] and now - mtime > 60:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    self._add("removed_objects")
+
+
+def _manifest_units(root: str, objects_dir: str, since: float) -> list:
+    """root 下（不含对象目录）所有清单按 session 记录切成的淘汰单位：时间、引用的对象（绝对路径）与清单中的行"""
+    units = []
+    objects_dir = os.path.abspath(objects_dir)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != objects_dir]
+        if "manifest.jsonl" not in filenames:
+            continue
+        manifest = os.path.join(dirpath, "manifest.jsonl")
+        try:
+            with open(manifest, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            mtime = os.path.getmtime(manifest)
+        except OSError:
+            continue
+        current = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("kind") == "session" or not current:
+                current.append({"manifest": manifest, "time": mtime, "refs": [], "lines": [], "active": False})
+            unit = current[-1]
+            unit["lines"].append(line)
+            unit["time"] = entry.get("time", unit["time"])
+            unit["refs"] += [os.path.abspath(os.path.join(dirpath, entry[k])) for k in ("object", "annotated") if entry.get(k)]
+        if current and mtime > since:
+            current[-1]["active"] = True
+        units += current
+    return units
+
+
+def _group(units: list) -> dict:
+    grouped = {}
+    for unit in units:
+        grouped.setdefault(unit["manifest"], []).append(unit)
+    return grouped
+
+
+def _rewrite_manifest(root: str, manifest: str, kept: list):
+    """清单只保留 kept 中的会话；会话子目录的清单变空时删除整个子目录"""
+    directory = os.path.dirname(manifest)
+    if not kept and os.path.abspath(directory) != os.path.abspath(root):
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    if not kept:
+        os.remove(manifest)
+        return
+    tmp = f"{manifest}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(line for unit in kept for line in unit["lines"])
+    os.replace(tmp, manifest)
+
+
+writer = RecordWriter()
+
+
+def _default_objects_dir(record_dir: str) -> str:
+    """录制目录在 RECORD_IMAGE_PATH 之下时共用 <RECORD_IMAGE_PATH>/objects（各会话之间也能去重），否则放在录制目录内"""
+    root = os.path.abspath(RECORD_IMAGE_PATH) if RECORD_IMAGE_PATH else None
+    if root and os.path.commonpath([root, os.path.abspath(record_dir)]) == root:
+        return os.path.join(RECORD_IMAGE_PATH, "objects")
+    return os.path.join(record_dir, "objects")
+
+
+class Recorder:
+    """一个录制目录的清单；所有写入经 writer 在后台完成"""
+
+    def __init__(self, record_dir: str, objects_dir: str = None, annotated: bool = RECORD_ANNOTATED):
+        self.record_dir = record_dir
+        self.annotated = annotated
+        self.objects_dir = objects_dir or _default_objects_dir(record_dir)
+        self.manifest_path = os.path.join(record_dir, "manifest.jsonl")
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._frames = weakref.WeakKeyDictionary()  # Frame → 清单中的序号
+        writer.roots.add((os.path.dirname(self.objects_dir), self.objects_dir))
+
+    def _next(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def _append(self, entry: dict):
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.record_dir)
+
+    def session(self, **meta):
+        writer.submit(self._append, {"seq": self._next(), "time": time.time(), "kind": "session", **meta})
+
+    def frame(self, frame) -> int:
+        """记录一帧截图（同一 Frame 只记录一次），返回清单中的序号"""
+        seq = self._frames.get(frame)
+        if seq is not None:
+            return seq
+        seq = self._frames[frame] = self._next()
+        entry = {"seq": seq, "time": time.time(), "kind": "frame", "resolution": list(frame.resolution)}
+        if not writer.submit(self._write_frame, frame, entry):
+            self._frames.pop(frame, None)  # 被丢弃的帧下次引用时重新提交
+        return seq
+
+    def _write_frame(self, frame, entry):
+        ext = {"image/jpeg": "jpg", "image/webp": "webp"}.get(frame.mime, "png")
+        entry["object"] = self._relative(writer.store(self.objects_dir, frame.data, ext))
+        self._append(entry)
+
+    def box(self, frame, box_data: dict):
+        """记录定位结果（所在帧的序号与框坐标）；annotated 开启时还在后台绘制标注图并存为对象"""
+        entry = {"seq": self._next(), "time": time.time(), "kind": "box", "frame": self.frame(frame),
+                 **{k: box_data.get(k) for k in ("box", "screen", "label", "source", "score") if box_data.get(k) is not None}}
+        writer.submit(self._write_box, frame, entry)
+
+    def _write_box(self, frame, entry):
+        if self.annotated:
+            buf = BytesIO()
+            draw_box_on_image(frame, entry["box"], entry.get("screen") or frame.resolution,
+                              entry.get("label") or "未知元素").save(buf, format="PNG", compress_level=1)
+            entry["annotated"] = self._relative(writer.store(self.objects_dir, buf.getvalue()))
+        self._append(entry)
+
+    def action(self, step: int, operation: dict):
+        writer.submit(self._append, {"seq": self._next(), "time": time.time(), "kind": "action", "step": step,
+                                     **{k: operation[k] for k in ("action", "params", "result") if k in operation}})
+
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def recorder_for(record_dir: str) -> Recorder:
+    """录制目录对应的 Recorder（同一目录共用一个）"""
+    with _recorders_lock:
+        recorder = _recorders.get(record_dir)
+        if recorder is None:
+            recorder = _recorders[record_dir] = Recorder(record_dir)
+        return recorder
+
+
+def read_manifest(record_dir: str, last_session: bool = True) -> list:
+    """按写入顺序读取清单；last_session 为 True 时只返回最后一次任务（最后一条 session 记录起）的条目"""
+    path = os.path.join(record_dir, "manifest.jsonl")
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if last_session:
+        starts = [i for i, e in enumerate(entries) if e["kind"] == "session"]
+        if starts:
+            entries = entries[starts[-1]:]
+    return entries
@@ -0,0 +1,249 @@
+"""模型调用的重试策略：对冲请求、并行采样与按错误类型区分的退避重试。
+
+一次调用（attempt）是调用方的一个协程：发请求并解析 / 校验结果，失败时抛异常。call_with_policy 按策略执行它：
+- 并行采样（parallel > 1）：每轮同时发出多个请求，取第一个通过校验的结果，其余取消
+- 对冲（hedge_quantile > 0）：本轮请求超过该调用名历史延迟的分位数仍未返回时，再补发一个请求，先到先用
+- 解析 / 校验失败：立即开始下一轮，最多 attempts 轮
+- 传输错误（超时、连接失败、408/409/429/5xx）：指数退避（带抖动，优先遵循 Retry-After）后重试，最多 transport_retries 次
+- 其他错误（如 400/401）：不再重试
+
+每个调用名的对冲胜出率、并行采样胜出率与浪费率（发出但未被采用的请求占比）记录在 retry_stats 中。
+"""
+import asyncio
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+
+from loguru import logger
+
+from utils import MAX_RETRY, RETRY_HEDGE_QUANTILE, RETRY_PARALLEL, RETRY_TRANSPORT
+from utils.tracing import record_retry
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = MAX_RETRY  # 解析 / 校验失败时最多尝试的轮数
+    parallel: int = 1  # 每轮并行采样的请求数
+    hedge_quantile: float = 0.0  # 对冲阈值：历史延迟的分位数，0 表示不对冲
+    hedge_max: int = 1  # 每轮最多补发的对冲请求数
+    hedge_min_samples: int = 8  # 历史样本少于该数时不对冲
+    transport_retries: int = RETRY_TRANSPORT  # 传输错误的最多重试次数
+    backoff_base: float = 0.5  # 退避基数（秒），第 n 次为 base * 2^(n-1) 内的随机值
+    backoff_max: float = 8.0
+
+
+DEFAULT_POLICY = RetryPolicy(parallel=RETRY_PARALLEL, hedge_quantile=RETRY_HEDGE_QUANTILE)
+# 各调用点的默认策略；自由文本的调用（describe / vqa）没有校验，只做传输错误重试
+POLICIES = {
+    "grounding": DEFAULT_POLICY,
+    "page_state": DEFAULT_POLICY,
+    "image_state": DEFAULT_POLICY,
+    "decide": DEFAULT_POLICY,
+    "grounding_batch": replace(DEFAULT_POLICY, attempts=1, parallel=1),
+    "grounding_marks": replace(DEFAULT_POLICY, attempts=2),  # 失败时还会退回 VL 定位，不必多试
+    "describe": RetryPolicy(attempts=1, hedge_quantile=RETRY_HEDGE_QUANTILE),
+    "vqa": RetryPolicy(attempts=1),
+}
+
+
+def policy_for(name: str) -> RetryPolicy:
+    return POLICIES.get(name, DEFAULT_POLICY)
+
+
+TRANSPORT = "transport"
+INVALID = "invalid"
+FATAL = "fatal"
+
+
+def classify_error(error: BaseException) -> str:
+    """transport：可退避重试的传输错误；fatal：请求本身有问题，重试无意义；invalid：回答无法解析或未通过校验"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return TRANSPORT
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return TRANSPORT if status in (408, 409, 429) or status >= 500 else FATAL
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return TRANSPORT
+    return INVALID
+
+
+def _retry_after(error: BaseException):
+    """服务端在 429 / 503 中给出的 Retry-After（秒），没有则返回 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryStats:
+    """按调用名统计请求数、对冲 / 并行采样的胜出次数、浪费的请求数与退避时间，并保留成功请求的延迟样本"""
+
+    def __init__(self, max_samples: int = 256):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
+
+    def _record(self, name: str) -> dict:
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = {
+                "calls": 0, "requests": 0, "hedges": 0, "hedge_wins": 0, "parallel_wins": 0,
+                "wasted": 0, "invalid": 0, "transport_errors": 0, "backoff_s": 0.0, "failures": 0,
+                "latencies": deque(maxlen=self.max_samples),
+            }
+        return record
+
+    def add(self, name: str, key: str, n=1):
+        with self._lock:
+            self._record(name)[key] += n
+
+    def win(self, name: str, kind: str, latency: float, launched: int):
+        with self._lock:
+            record = self._record(name)
+            record["latencies"].append(latency)
+            record["wasted"] += launched - 1
+            if kind == "hedge":
+                record["hedge_wins"] += 1
+            elif kind == "parallel":
+                record["parallel_wins"] += 1
+
+    def hedge_delay(self, name: str, policy: RetryPolicy):
+        """对冲阈值（秒）：该调用名成功请求延迟的 hedge_quantile 分位数；样本不足或未开启时返回 None"""
+        if not policy.hedge_quantile or policy.hedge_max < 1:
+            return None
+        with self._lock:
+            samples = list(self._record(name)["latencies"])
+        if len(samples) < policy.hedge_min_samples:
+            return None
+        return statistics.quantiles(samples, n=100, method="inclusive")[min(98, max(0, int(policy.hedge_quantile * 100) - 1))]
+
+    def summary(self) -> dict:
+        with self._lock:
+            records = {name: dict(record) for name, record in self.records.items()}
+        result = {}
+        for name, record in records.items():
+            latencies = record.pop("latencies")
+            requests = record["requests"]
+            result[name] = {
+                **record,
+                "backoff_s": round(record["backoff_s"], 3),
+                "hedge_win_rate": round(record["hedge_wins"] / record["hedges"], 3) if record["hedges"] else None,
+                "waste_rate": round(record["wasted"] / requests, 3) if requests else None,
+                "latency_p50": round(statistics.median(latencies), 3) if latencies else None,
+            }
+        return result
+
+
+retry_stats = RetryStats()
+
+
+async def _timed(attempt):
+    start = time.perf_counter()
+    value = await attempt()
+    return value, time.perf_counter() - start
+
+
+def _pick_error(errors):
+    """同一轮的多个请求都失败时，按 fatal > invalid > transport 的优先级决定下一步"""
+    order = {FATAL: 0, INVALID: 1, TRANSPORT: 2}
+    return min(errors, key=lambda e: order[classify_error(e)])
+
+
+async def _run_round(name: str, attempt, policy: RetryPolicy):
+    """执行一轮：parallel 个请求并发，必要时补发对冲请求，返回第一个成功的结果"""
+    hedge_delay = retry_stats.hedge_delay(name, policy)
+    if policy.parallel <= 1 and hedge_delay is None:
+        retry_stats.add(name, "requests")
+        value, latency = await _timed(attempt)
+        retry_stats.win(name, "primary", latency, 1)
+        return value
+
+    loop = asyncio.get_running_loop()
+    pending, errors = {}, []
+    launched = hedges = 0
+    start = loop.time()
+
+    def launch(kind):
+        nonlocal launched
+        pending[asyncio.create_task(_timed(attempt))] = kind
+        launched += 1
+        retry_stats.add(name, "requests")
+
+    for i in range(max(1, policy.parallel)):
+        launch("primary" if i == 0 else "parallel")
+    try:
+        while pending:
+            timeout = None
+            if hedge_delay is not None and hedges < policy.hedge_max:
+                timeout = max(0.0, start + hedge_delay * (hedges + 1) - loop.time())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"[{name}] 请求超过对冲阈值 {hedge_delay:.2f}s，补发对冲请求")
+                hedges += 1
+                retry_stats.add(name, "hedges")
+                launch("hedge")
+                continue
+            for task in done:
+                kind = pending.pop(task)
+                if task.exception() is None:
+                    value, latency = task.result()
+                    retry_stats.win(name, kind, latency, launched)
+                    if kind != "primary":
+                        logger.info(f"[{name}] 采用{'对冲' if kind == 'hedge' else '并行采样'}请求的结果")
+                    return value
+                errors.append(task.exception())
+        retry_stats.add(name, "wasted", launched - 1)
+        raise _pick_error(errors)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def call_with_policy(name: str, attempt, policy: RetryPolicy = None, failure_message: str = None):
+    """按策略执行 attempt（无参协程函数，失败时抛异常），返回第一个成功的结果；全部失败时抛出 RuntimeError"""
+    policy = policy or policy_for(name)
+    failure_message = failure_message or f"[{name}] 所有尝试均失败"
+    retry_stats.add(name, "calls")
+    rounds = transport_errors = 0
+    while True:
+        try:
+            return await _run_round(name, attempt, policy)
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == FATAL:
+                retry_stats.add(name, "failures")
+                logger.error(f"[{name}] 请求无法重试: {e}")
+                raise RuntimeError(failure_message) from e
+            if kind == TRANSPORT:
+                transport_errors += 1
+                retry_stats.add(name, "transport_errors")
+                if transport_errors > policy.transport_retries:
+                    retry_stats.add(name, "failures")
+                    logger.error(f"[{name}] 传输错误重试 {policy.transport_retries} 次后仍失败: {e}")
+                    raise RuntimeError(failure_message) from e
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** (transport_errors - 1)))
+                retry_stats.add(name, "backoff_s", delay)
+                logger.warning(f"[{name}] 传输错误（第 {transport_errors} 次）: {e}，{delay:.2f}s 后重试")
+                record_retry()
+                await asyncio.sleep(delay)
+                continue
+            rounds += 1
+            retry_stats.add(name, "invalid")
+            logger.error(f"[{name}] 第 {rounds} 次尝试失败: {e}")
+            if rounds >= policy.attempts:
+                retry_stats.add(name, "failures")
+                raise RuntimeError(failure_message) from e
+            record_retry()
+            logger.info("正在重试...")
@@ -0,0 +1,174 @@
+"""Set-of-Marks：在本地找出候选元素，在截图上画出带编号的标记，VL 模型只需回答编号，再由编号换回候选元素的边界框。
+
+- 候选：有页面时取 DOM 中可见的可交互元素（见 domGrounding），按与 target / pos 的匹配度取前若干个；
+  否则在截图上做边缘检测与连通域分析（纯 NumPy），取文字、图标、输入框等紧凑区域，pos 对应区域内的优先
+- 标记：每个候选画一个细框，左上角标出编号；编号按阅读顺序（从上到下、从左到右）分配
+
+回答只有一个编号，比回归像素坐标短得多，不会出现坐标格式错误，得到的框也正好贴合元素。
+"""
+from io import BytesIO
+
+from loguru import logger
+from PIL import ImageDraw, ImageFont
+
+from utils import SOM_MAX_MARKS
+from utils.domGrounding import TEXT_FIELDS, rank_elements
+from utils.imageProcessing import Frame, box_center, pos_region
+from utils.spatialIndex import index_for
+
+MARK_COLORS = ["#e6194b", "#3cb44b", "#4363d8", "#f58231", "#911eb4", "#008080", "#9a6324", "#800000", "#000075", "#f032e6"]
+
+
+def _edge_cells(gray, cell: int, threshold: int):
+    """水平 / 垂直方向相邻像素的灰度差超过 threshold 的位置，按 cell×cell 的格子汇总为布尔网格"""
+    import numpy as np
+    g = gray.astype(np.int16)
+    edges = (np.abs(g[:-1, 1:] - g[:-1, :-1]) > threshold) | (np.abs(g[1:, :-1] - g[:-1, :-1]) > threshold)
+    h, w = edges.shape[0] // cell, edges.shape[1] // cell
+    return edges[:h * cell, :w * cell].reshape(h, cell, w, cell).any(axis=(1, 3))
+
+
+def _label_runs(mask, gap: int):
+    """按行程（每行连续的 True）做连通域分析：同一行间隔不超过 gap 格的行程、相邻行有重叠（含对角）的行程属于同一区域。
+    返回每个区域的格子坐标框 [x1, y1, x2, y2)"""
+    import numpy as np
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    diff = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(diff == 1)
+    ends = np.nonzero(diff == -1)[1]
+    n = len(rows)
+    if not n:
+        return []
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    row_start = np.searchsorted(rows, np.arange(mask.shape[0] + 1)).tolist()
+    starts_l, ends_l = starts.tolist(), ends.tolist()
+    for r in range(mask.shape[0]):
+        b0, b1 = row_start[r], row_start[r + 1]
+        for i in range(b0 + 1, b1):
+            if starts_l[i] - ends_l[i - 1] <= gap:
+                union(i - 1, i)
+        if r == 0:
+            continue
+        i, j = row_start[r - 1], b0
+        while i < b0 and j < b1:
+            if starts_l[i] <= ends_l[j] and starts_l[j] <= ends_l[i]:
+                union(i, j)
+            if ends_l[i] < ends_l[j]:
+                i += 1
+            else:
+                j += 1
+
+    roots = np.array([find(i) for i in range(n)])
+    x1 = np.full(n, mask.shape[1])
+    y1 = np.full(n, mask.shape[0])
+    x2 = np.zeros(n, dtype=np.int64)
+    y2 = np.zeros(n, dtype=np.int64)
+    np.minimum.at(x1, roots, starts)
+    np.minimum.at(y1, roots, rows)
+    np.maximum.at(x2, roots, ends)
+    np.maximum.at(y2, roots, rows + 1)
+    return [[int(x1[r]), int(y1[r]), int(x2[r]), int(y2[r])] for r in np.unique(roots)]
+
+
+def edge_candidates(frame: Frame, cell: int = 4, threshold: int = 24, gap: int = 2,
+                    min_side: int = 8, max_width: float = 0.6, max_height: float = 0.25) -> list:
+    """截图中的候选元素框（像素坐标）：边缘格子的连通域，去掉过小的噪点。
+    过大的区域（面板、背景图上的整片文字等）在区域内提高阈值再分析一次，找出其中对比度更高的文字与图标"""
+    width, height = frame.resolution
+    gray = frame.gray
+    boxes = []
+    pending = [(0, 0, gray, threshold)]
+    for depth in range(2):
+        regions, pending = pending, []
+        for ox, oy, crop, t in regions:
+            for x1, y1, x2, y2 in _label_runs(_edge_cells(crop, cell, t), gap):
+                box = [ox + x1 * cell, oy + y1 * cell, min(ox + x2 * cell + 1, width), min(oy + y2 * cell + 1, height)]
+                w, h = box[2] - box[0], box[3] - box[1]
+                if min(w, h) < min_side:
+                    continue
+                if w <= max_width * width and h <= max_height * height:
+                    boxes.append(box)
+                elif depth == 0:
+                    pending.append((box[0], box[1], gray[box[1]:box[3], box[0]:box[2]], t * 3))
+    return boxes
+
+
+def _reading_order(marks: list, row_height: int = 12) -> list:
+    return sorted(marks, key=lambda m: (m["box"][1] // row_height, m["box"][0]))
+
+
+def _prioritize(boxes: list, region, max_marks: int) -> list:
+    """超过 max_marks 个候选时，优先保留中心落在 region 内、其次离 region 边界较近的"""
+    if len(boxes) <= max_marks or region is None:
+        return boxes[:max_marks]
+
+    def distance(box):
+        x, y = box_center(box)
+        return max(region[0] - x, 0, x - region[2]) + max(region[1] - y, 0, y - region[3])
+
+    return sorted(boxes, key=distance)[:max_marks]
+
+
+async def find_marks_async(frame: Frame, params: dict = None, action: str = "CLICK", page=None,
+                           max_marks: int = SOM_MAX_MARKS) -> list:
+    """候选元素 [{"box", "label", "source"}]，按编号顺序排列（编号从 1 开始）"""
+    import asyncio
+    params = params or {}
+    if page is not None:
+        try:
+            elements = (await index_for(page, frame)).elements
+        except Exception as e:
+            logger.warning(f"读取 DOM 元素失败，改用截图边缘检测: {e}")
+            elements = []
+        if elements:
+            ranked = rank_elements(elements, params, action, frame.resolution)[:max_marks]
+            return _reading_order([{
+                "box": element["box"],
+                "label": next((element[field] for field in TEXT_FIELDS if element.get(field)), ""),
+                "source": "dom",
+            } for _, element in ranked])
+    boxes = await asyncio.to_thread(edge_candidates, frame)
+    # pos 只是大致方位，区域取得宽一些
+    region = pos_region(params.get("pos"), frame.resolution, pad=0.3)
+    return _reading_order([{"box": box, "label": "", "source": "edges"} for box in _prioritize(boxes, region, max_marks)])
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 的默认字体不能缩放
+        return ImageFont.load_default()
+
+
+def draw_marks(frame: Frame, marks: list) -> Frame:
+    """在截图副本上画出候选框与编号（编号 = 下标 + 1），返回新的 Frame"""
+    img = frame.image.convert("RGB")
+    draw = ImageDraw.Draw(img)
+    font = _font(max(12, round(min(frame.resolution) / 50)))
+    for i, mark in enumerate(marks, 1):
+        color = MARK_COLORS[i % len(MARK_COLORS)]
+        x1, y1, x2, y2 = mark["box"]
+        draw.rectangle([x1, y1, x2, y2], outline=color, width=2)
+        text = str(i)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        tw, th = right - left + 4, bottom - top + 4
+        # 编号放在框的左上角外侧；贴着图像上边缘时放在框内
+        ty = y1 - th if y1 - th >= 0 else y1
+        draw.rectangle([x1, ty, x1 + tw, ty + th], fill=color)
+        draw.text((x1 + 2 - left, ty + 2 - top), text, fill="white", font=font)
+    buf = BytesIO()
+    img.save(buf, format="PNG", compress_level=1)  # 只发送一次，压缩率让位于速度
+    return Frame(buf.getvalue(), resolution=img.size)
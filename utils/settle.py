@@ -0,0 +1,179 @@
+"""事件驱动的页面稳定检测，替代固定的 sleep / wait_for_timeout。
+
+页面被判定为稳定需要同时满足：
+    - DOM 在 dom_quiet_ms 内没有变更（页面内注入的 MutationObserver 记录最后一次变更时间）
+    - 网络在 network_quiet_ms 内没有新的请求开始或结束
+    - 连续 stable_frames 张截图基本一致（变化分块比例不超过 max_changed_ratio）
+期间打开的新页面 / 弹窗会被切换为当前页面并重新开始检测；超过 deadline_ms 时放弃等待。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from utils import SETTLE_DEADLINE_MS
+from utils.imageProcessing import Frame, tile_diff
+
+# 在每个文档中安装 MutationObserver，记录最后一次 DOM 变更的时间
+MUTATION_OBSERVER_JS = """() => {
+    if (window.__settleObserver) return;
+    window.__settleLastMutation = performance.now();
+    window.__settleObserver = new MutationObserver(() => { window.__settleLastMutation = performance.now(); });
+    window.__settleObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+}"""
+MS_SINCE_MUTATION_JS = "() => window.__settleLastMutation === undefined ? -1 : performance.now() - window.__settleLastMutation"
+
+
+@dataclass
+class SettleConfig:
+    dom_quiet_ms: int = 500
+    network_quiet_ms: int = 500
+    stable_frames: int = 2
+    max_changed_ratio: float = 0.02  # 允许变化的分块比例（轮播图、动图等）
+    poll_ms: int = 150
+    deadline_ms: int = SETTLE_DEADLINE_MS
+
+
+@dataclass
+class SettleReport:
+    elapsed: float = 0.0
+    settled: bool = False
+    new_page: bool = False
+    polls: int = 0
+    timeline: dict = field(default_factory=dict)  # 各条件首次满足时距开始的秒数
+
+    def __str__(self):
+        state = "已稳定" if self.settled else "超时"
+        return f"{state}，用时 {self.elapsed:.2f}s，新页面: {self.new_page}，轮询 {self.polls} 次，{self.timeline}"
+
+
+class SettleDetector:
+    """绑定在 AsyncBrowserAgent 上的稳定检测器。
+
+    在触发操作之前调用 start() 开始监听（这样操作引起的请求与新页面都能被捕获），
+    操作完成后 await wait() 得到 SettleReport。
+    """
+
+    def __init__(self, agent, config: SettleConfig = None):
+        self.agent = agent
+        self.config = config or SettleConfig()
+        self._page = None
+        self._known_pages = set()
+        self._last_network = 0.0
+        self._start = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._last_network = self._start
+        self._known_pages = set(self.agent.context.pages)
+        self._attach(self.agent.page)
+        return self
+
+    def _on_network(self, *_):
+        self._last_network = time.perf_counter()
+
+    def _attach(self, page):
+        if self._page is page:
+            return
+        self._detach()
+        self._page = page
+        for event in ("request", "requestfinished", "requestfailed"):
+            page.on(event, self._on_network)
+
+    def _detach(self):
+        if self._page is None:
+            return
+        for event in ("request", "requestfinished", "requestfailed"):
+            self._page.remove_listener(event, self._on_network)
+        self._page = None
+
+    async def _adopt_new_page(self, deadline: float) -> bool:
+        """有新打开的页面（新标签页 / 弹窗）时切换过去"""
+        for page in self.agent.context.pages:
+            if page in self._known_pages:
+                continue
+            self._known_pages.add(page)
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=max(1, (deadline - time.perf_counter()) * 1000))
+            except Exception as e:
+                logger.warning(f"新页面加载未完成: {e}")
+            if not page.is_closed():
+                self.agent.page = page
+                logger.info("稳定检测期间出现新页面，已切换")
+                return True
+        return False
+
+    async def _ms_since_mutation(self, page) -> float:
+        try:
+            await page.evaluate(MUTATION_OBSERVER_JS)
+            return await page.evaluate(MS_SINCE_MUTATION_JS)
+        except Exception:
+            # 导航中执行上下文被销毁，视为仍在变化
+            return -1
+
+    async def wait(self) -> SettleReport:
+        cfg = self.config
+        if self._page is None:
+            self.start()
+        report = SettleReport()
+        deadline = self._start + cfg.deadline_ms / 1000
+        previous = None
+        stable = 0
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if await self._adopt_new_page(deadline):
+                    report.new_page = True
+                    report.timeline.setdefault("new_page", round(now - self._start, 3))
+                    previous, stable = None, 0
+                if self.agent.page is not self._page:
+                    self._attach(self.agent.page)
+                    self._last_network = time.perf_counter()
+                page = self._page
+                report.polls += 1
+
+                dom_quiet = await self._ms_since_mutation(page) >= cfg.dom_quiet_ms
+                network_quiet = (time.perf_counter() - self._last_network) * 1000 >= cfg.network_quiet_ms
+                if dom_quiet:
+                    report.timeline.setdefault("dom_quiet", round(time.perf_counter() - self._start, 3))
+                if network_quiet:
+                    report.timeline.setdefault("network_quiet", round(time.perf_counter() - self._start, 3))
+
+                if dom_quiet and network_quiet:
+                    try:
+                        current = Frame(await page.screenshot(full_page=False))
+                    except Exception:
+                        current = None
+                    if current is None:
+                        stable = 0
+                    elif previous is not None and (previous.data == current.data or
+                                                   await asyncio.to_thread(self._same_screen, previous, current)):
+                        stable += 1
+                    else:
+                        stable = 1
+                    previous = current
+                    if stable >= cfg.stable_frames:
+                        report.settled = True
+                        report.timeline.setdefault("screen_stable", round(time.perf_counter() - self._start, 3))
+                        break
+                else:
+                    previous, stable = None, 0
+                await asyncio.sleep(cfg.poll_ms / 1000)
+        finally:
+            self._detach()
+        report.elapsed = time.perf_counter() - self._start
+        log = logger.info if report.settled else logger.warning
+        log(f"页面稳定检测：{report}")
+        return report
+
+    def _same_screen(self, a: Frame, b: Frame) -> bool:
+        """两帧是否基本相同；字节不同时要解码两张 PNG 并逐块比较，在线程池中调用，避免阻塞事件循环"""
+        if a.data == b.data:
+            return True
+        if a.resolution != b.resolution:
+            return False
+        changed = tile_diff(a.gray, b.gray) > 8
+        return changed.mean() <= self.config.max_changed_ratio
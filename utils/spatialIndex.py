@@ -0,0 +1,83 @@
+"""页面元素的空间索引：按帧缓存可见可交互元素的边界框（一次 page.evaluate 取出），按均匀网格分桶，
+支持“某点下的元素”“某区域内的元素”查询，并把 VL 等后端给出的框吸附到最匹配的真实元素上。
+
+吸附：候选为与框相交的未被遮挡的元素（TYPE 只考虑可输入的元素）。框中心落在元素内、且元素面积不超过框的
+SNAP_MAX_AREA_RATIO 倍时得分为 0.5 + 0.5 × IoU，否则为 IoU（小框落在整页容器里不会因为“包含”就吸附到容器上）；
+得分最高且不低于 SNAP_MIN_SCORE 的元素的框替换原框，同分时取面积小的，点击位置因此落在元素中心而不是略有偏差的框中心。
+"""
+import weakref
+
+from utils import SNAP_MAX_AREA_RATIO, SNAP_MIN_SCORE
+from utils.domGrounding import collect_elements
+from utils.imageProcessing import Frame, box_center, box_iou
+
+
+class ElementIndex:
+    """元素框的均匀网格索引；元素登记在它覆盖的每个格子中"""
+
+    def __init__(self, elements: list, cell: int = 64):
+        self.elements = elements
+        self.cell = cell
+        self.grid = {}
+        for i, element in enumerate(elements):
+            x1, y1, x2, y2 = element["box"]
+            for gx in range(int(x1) // cell, int(x2) // cell + 1):
+                for gy in range(int(y1) // cell, int(y2) // cell + 1):
+                    self.grid.setdefault((gx, gy), []).append(i)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def at_point(self, x: float, y: float) -> list:
+        """包含点 (x, y) 的元素，面积从小到大（最具体的在前）"""
+        found = [self.elements[i] for i in self.grid.get((int(x) // self.cell, int(y) // self.cell), ())
+                 if _contains(self.elements[i]["box"], x, y)]
+        return sorted(found, key=lambda e: _area(e["box"]))
+
+    def in_region(self, box) -> list:
+        """与 box 相交的元素"""
+        x1, y1, x2, y2 = box
+        seen = set()
+        for gx in range(int(x1) // self.cell, int(x2) // self.cell + 1):
+            for gy in range(int(y1) // self.cell, int(y2) // self.cell + 1):
+                seen.update(self.grid.get((gx, gy), ()))
+        return [self.elements[i] for i in sorted(seen) if _intersects(self.elements[i]["box"], box)]
+
+    def snap(self, box, action: str = "CLICK", min_score: float = SNAP_MIN_SCORE):
+        """与 box 最匹配的元素及其得分；没有得分不低于 min_score 的元素时返回 (None, 最高得分)"""
+        cx, cy = box_center(box)
+        max_area = SNAP_MAX_AREA_RATIO * max(_area(box), 1.0)
+        best, best_score = None, 0.0
+        for element in self.in_region(box):
+            if element.get("occluded") or (action == "TYPE" and not element.get("editable")):
+                continue
+            iou = box_iou(box, element["box"])
+            contained = _contains(element["box"], cx, cy) and _area(element["box"]) <= max_area
+            score = 0.5 + 0.5 * iou if contained else iou
+            if score > best_score or (score == best_score and best is not None and _area(element["box"]) < _area(best["box"])):
+                best, best_score = element, score
+        return (best, round(best_score, 4)) if best_score >= min_score else (None, round(best_score, 4))
+
+
+def _area(box) -> float:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _contains(box, x, y) -> bool:
+    return box[0] <= x <= box[2] and box[1] <= y <= box[3]
+
+
+def _intersects(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+# 每帧一份索引：同一步中的 DOM 定位、候选标记与吸附共用一次 evaluate 的结果
+_frame_indexes = weakref.WeakKeyDictionary()
+
+
+async def index_for(page, frame: Frame) -> ElementIndex:
+    """frame 对应的元素索引，第一次查询时从 page 收集"""
+    index = _frame_indexes.get(frame)
+    if index is None:
+        index = _frame_indexes[frame] = ElementIndex(await collect_elements(page, frame.resolution))
+    return index
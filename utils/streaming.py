@@ -0,0 +1,170 @@
+"""流式模型调用：边接收边累积 token，JSON 类调用一旦收到完整且通过校验的对象就立即断开请求，
+不再等待模型在 JSON 之后追加的推理或解释文字。
+
+每次调用都会记录首 token 时间（TTFT）、得到可用结果的时间与总时间，汇总在 stream_stats 中。
+STREAM_RESPONSES=0 时退化为普通的非流式调用（同样记录耗时）。
+设置 response_log 后，每次调用的回答按 {"name", "content"} 追加写入该 JSONL 文件，供 benchmarks.replay 离线回放。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from loguru import logger
+
+from utils import STREAM_RESPONSES, runtime
+from utils.aio import run_in_background
+from utils.tool import JsonExtractor
+from utils.tracing import payload_size, span
+
+# 当前任务的模型回答录制文件（JSONL），为空则不录制；按协程上下文隔离，智能体池中各会话互不影响
+response_log: ContextVar[str] = ContextVar("response_log", default="")
+_response_log_lock = threading.Lock()
+
+
+@dataclass
+class StreamResult:
+    content: str = ""
+    value: object = None  # accept 给出的解析结果（提前截断时即可直接使用）
+    ttft: float = None  # 首 token 时间（秒）
+    usable: float = None  # 得到可用结果的时间（秒）
+    elapsed: float = 0.0
+    cut_off: bool = False  # 是否在模型生成结束前主动断开
+    usage: object = None
+
+    @property
+    def choices(self):
+        """兼容 ChatCompletion 的读取方式 response.choices[0].message.content"""
+        return [SimpleNamespace(message=SimpleNamespace(content=self.content))]
+
+
+class StreamStats:
+    """最近若干次模型调用的耗时记录，按调用名汇总"""
+
+    def __init__(self, max_records=1024):
+        self.records = deque(maxlen=max_records)
+
+    def add(self, name: str, result: StreamResult):
+        self.records.append({
+            "name": name,
+            "ttft": result.ttft,
+            "usable": result.usable,
+            "elapsed": result.elapsed,
+            "cut_off": result.cut_off,
+            "chars": len(result.content),
+        })
+
+    def reset(self):
+        self.records.clear()
+
+    def summary(self) -> dict:
+        grouped = {}
+        for record in list(self.records):
+            grouped.setdefault(record["name"], []).append(record)
+        return {name: {
+            "calls": len(records),
+            "ttft_mean": round(sum(r["ttft"] for r in records) / len(records), 3),
+            "usable_mean": round(sum(r["usable"] for r in records) / len(records), 3),
+            "elapsed_mean": round(sum(r["elapsed"] for r in records) / len(records), 3),
+            "cut_off_rate": round(sum(r["cut_off"] for r in records) / len(records), 3),
+        } for name, records in grouped.items()}
+
+
+stream_stats = StreamStats()
+
+
+def _append_response(path: str, name: str, content: str):
+    with _response_log_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"name": name, "content": content}, ensure_ascii=False) + "\n")
+
+
+def json_acceptor(validate=None) -> JsonExtractor:
+    """构造 accept：逐块接收文本，出现完整且通过 validate（返回值或抛异常）的 JSON 时返回它。
+    每次调用都要新建一个，提取器带有扫描状态。"""
+    return JsonExtractor(validate)
+
+
+async def stream_completion(name: str = "chat", accept=None, **kwargs) -> StreamResult:
+    """以流式方式调用 runtime.chat_completion。
+
+    - accept：可选，带 feed(chunk) 方法的增量解析器（见 json_acceptor），
+      feed 返回非 None 表示结果已可用，此时关闭连接、提前结束
+    - 其余参数原样传给 chat.completions.create
+
+    每次调用记录为一个 kind="model" 的 span（请求字节数、TTFT、token 用量，见 utils.tracing）；
+    提前截断的调用收不到用量，span 上不记 token 数，而是记 usage_unknown=1。
+    """
+    with span(name, "model", model=kwargs.get("model", ""), request_bytes=payload_size(kwargs.get("messages"))) as current:
+        result = await _complete(name, accept, kwargs)
+        current.set(ttft=round(result.ttft, 4), usable=round(result.usable, 4), cut_off=result.cut_off)
+        if result.usage is None:
+            # 用量块在流结束时才发送，提前截断的调用收不到：不记 0，只记一次用量未知
+            current.set(usage_unknown=1)
+        else:
+            current.set(
+                prompt_tokens=getattr(result.usage, "prompt_tokens", 0) or 0,
+                cached_tokens=getattr(getattr(result.usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0,
+                completion_tokens=getattr(result.usage, "completion_tokens", 0) or 0,
+            )
+    return result
+
+
+async def _complete(name: str, accept, kwargs: dict) -> StreamResult:
+    start = time.perf_counter()
+    result = StreamResult()
+    if STREAM_RESPONSES:
+        response = await runtime.chat_completion(stream=True, stream_options={"include_usage": True}, **kwargs)
+    else:
+        response = await runtime.chat_completion(**kwargs)
+
+    if hasattr(response, "choices"):
+        # 非流式响应（关闭了流式，或服务端不支持）
+        result.content = response.choices[0].message.content or ""
+        result.usage = getattr(response, "usage", None)
+        result.ttft = result.usable = time.perf_counter() - start
+        if accept is not None:
+            result.value = accept.feed(result.content) or accept.finish()
+    else:
+        parts = []
+        try:
+            async for chunk in response:
+                if getattr(chunk, "usage", None):
+                    result.usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                text = delta.content or ""
+                if result.ttft is None and (text or getattr(delta, "reasoning_content", None)):
+                    result.ttft = time.perf_counter() - start
+                if not text:
+                    continue
+                parts.append(text)
+                if accept is not None:
+                    result.value = accept.feed(text)
+                    if result.value is not None:
+                        result.usable = time.perf_counter() - start
+                        result.cut_off = True
+                        break
+        finally:
+            await response.close()
+        result.content = "".join(parts)
+        if accept is not None and result.value is None:
+            result.value = accept.finish()
+        if result.usable is None:
+            result.usable = time.perf_counter() - start
+        if result.ttft is None:
+            result.ttft = result.usable
+
+    result.elapsed = time.perf_counter() - start
+    stream_stats.add(name, result)
+    if response_log.get():
+        run_in_background(_append_response, response_log.get(), name, result.content)
+    logger.debug("[{}] TTFT {:.2f}s，可用 {:.2f}s，总计 {:.2f}s，提前截断: {}",
+                 name, result.ttft, result.usable, result.elapsed, result.cut_off)
+    return result
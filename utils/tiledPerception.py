@@ -0,0 +1,134 @@
+"""整页感知：一次截取从当前视口起向下的整页，切成与视口等高、上下重叠的图块，各图块并发做感知与批量定位，
+合并成带页面坐标的元素索引。
+
+视口截图只能看到当前一屏，视口以下的目标要先 SCROLL，每滚一次都要完整地截图、感知、决策并等待稳定。
+整页感知一步就能看到至多 FULL_PAGE_MAX_TILES 屏的元素；决策选中的目标在索引中时，
+执行器直接滚动到它的页面坐标再操作（见 agent.do_instruction_from_todo_async），不再逐屏滚动重新感知。
+"""
+import asyncio
+
+from loguru import logger
+
+from utils import FULL_PAGE_MAX_TILES, FULL_PAGE_TILE_ELEMENTS, FULL_PAGE_TILE_OVERLAP
+from utils.domGrounding import _core_target, _normalize, text_similarity
+from utils.grounding import grounding_batch_async
+from utils.imageProcessing import Frame, box_iou
+from utils.llm import perceive_page_state_async
+
+
+def tile_spans(page_height: int, viewport_height: int, overlap: float = FULL_PAGE_TILE_OVERLAP,
+               max_tiles: int = FULL_PAGE_MAX_TILES) -> list:
+    """从页面顶部起的 [(top, bottom)]：每块与视口等高，相邻两块重叠 overlap 倍视口高度，至多 max_tiles 块"""
+    step = max(1, round(viewport_height * (1 - overlap)))
+    spans, top = [], 0
+    while len(spans) < max(1, max_tiles):
+        bottom = min(top + viewport_height, page_height)
+        spans.append((top, bottom))
+        if bottom >= page_height:
+            break
+        top += step
+    return spans
+
+
+def covered_height(viewport_height: int, overlap: float = FULL_PAGE_TILE_OVERLAP, max_tiles: int = FULL_PAGE_MAX_TILES) -> int:
+    """max_tiles 块图块覆盖的页面高度；整页截图只需截到这里"""
+    return max(1, round(viewport_height * (1 - overlap))) * (max(1, max_tiles) - 1) + viewport_height
+
+
+def _element_prompt(element: dict) -> str:
+    return f"请找出页面中标注为“{element['label']}”的{element.get('type') or '元素'}，位于{element.get('position') or '页面中'}。"
+
+
+async def _perceive_tile(frame: Frame, top: int, index: int, strategy: str, max_elements: int) -> tuple:
+    """一个图块（上边缘位于页面坐标 top）的感知与可交互元素的批量定位；
+    返回页面类型与元素，元素带页面坐标 page_box（未定位到的为 None）与所在图块编号 tile"""
+    state = await perceive_page_state_async(frame, strategy)
+    elements = [dict(e) for e in state.get("elements", []) if isinstance(e, dict)]
+    interactive = [i for i, e in enumerate(elements) if e.get("label") and e.get("role") != "informational"][:max_elements]
+    boxes = {}
+    if interactive:
+        try:
+            boxes = await grounding_batch_async(frame, {i: _element_prompt(elements[i]) for i in interactive},
+                                                record_dir="", retry_missing=False)
+        except RuntimeError as e:
+            logger.warning(f"第 {index + 1} 屏的元素定位失败，这一屏的元素没有页面坐标: {e}")
+    for i, element in enumerate(elements):
+        box = boxes.get(i, {}).get("box")
+        element["page_box"] = [box[0], box[1] + top, box[2], box[3] + top] if box and len(box) == 4 else None
+        element["tile"] = index
+    return state.get("page_type", ""), elements
+
+
+class PageIndex:
+    """整页元素索引：元素的 page_box 为页面坐标（相对页面左上角，CSS 像素）"""
+
+    def __init__(self, page_type: str, elements: list, page_size, viewport_size, tiles: int):
+        self.page_type = page_type
+        self.elements = elements
+        self.page_size = tuple(page_size)
+        self.viewport_size = tuple(viewport_size)
+        self.tiles = tiles
+
+    def page_state(self) -> dict:
+        """决策用的页面状态：位置后注明元素在当前视口起的第几屏"""
+        return {
+            "page_type": f"{self.page_type}（当前视口起向下共 {self.tiles} 屏，可直接操作其中任意一屏的元素，无需滚动）",
+            "elements": [{
+                **{k: v for k, v in element.items() if k not in ("page_box", "tile")},
+                "position": f"{element.get('position', '')}（第 {element['tile'] + 1} 屏）",
+            } for element in self.elements],
+        }
+
+    def find(self, target: str, action: str = "CLICK", threshold: float = 0.85):
+        """按目标名在索引中找带页面坐标的元素；TYPE 只考虑输入框类元素；找不到足够相似的元素时返回 None"""
+        core = _core_target(target)
+        best, best_score = None, 0.0
+        for element in self.elements:
+            if element["page_box"] is None:
+                continue
+            if action == "TYPE" and not any(word in str(element.get("type", "")) for word in ("输入", "搜索框", "文本框")):
+                continue
+            score = max(text_similarity(core, element.get("label", "")), text_similarity(_normalize(target), element.get("label", "")))
+            if score > best_score:
+                best, best_score = element, score
+        return best if best_score >= threshold else None
+
+
+def _crop_tiles(full: Frame, spans: list) -> list:
+    width = full.resolution[0]
+    return [Frame.from_image(full.image.crop((0, y1, width, y2))) for y1, y2 in spans]
+
+
+def _merge(tiles: list) -> list:
+    """合并各图块的元素：重叠区域里同名且框重叠的元素只保留先出现的一个"""
+    merged = []
+    for _, elements in tiles:
+        for element in elements:
+            label = _normalize(element.get("label"))
+            duplicate = element["page_box"] is not None and any(
+                other["page_box"] is not None and _normalize(other.get("label")) == label and other["tile"] != element["tile"]
+                and box_iou(other["page_box"], element["page_box"]) > 0.3 for other in merged)
+            if not duplicate:
+                merged.append(element)
+    return merged
+
+
+async def perceive_full_page_async(full: Frame, viewport_size, strategy: str = "two-stage", top: int = 0,
+                                   max_tiles: int = FULL_PAGE_MAX_TILES, overlap: float = FULL_PAGE_TILE_OVERLAP,
+                                   max_elements: int = FULL_PAGE_TILE_ELEMENTS):
+    """整页截图（上边缘位于页面坐标 top）→ 各图块并发感知与定位 → PageIndex；
+    截图不超过一屏（已在页面底部）时返回 None，按视口截图感知即可"""
+    width, height = full.resolution
+    viewport_height = viewport_size[1]
+    if height <= viewport_height * 1.05:
+        return None
+    spans = tile_spans(height, viewport_height, overlap, max_tiles)
+    logger.info(f"整页截图 {width}x{height}（页面坐标 y={top} 起）切成 {len(spans)} 屏并发感知")
+    # 解码整页截图与各图块的 PNG 编码都在线程池中完成，不阻塞事件循环
+    frames = await asyncio.to_thread(_crop_tiles, full, spans)
+    tiles = await asyncio.gather(*(
+        _perceive_tile(frame, top + y1, i, strategy, max_elements) for i, (frame, (y1, _)) in enumerate(zip(frames, spans))))
+    elements = _merge(tiles)
+    located = sum(e["page_box"] is not None for e in elements)
+    logger.success(f"整页索引：{len(elements)} 个元素，其中 {located} 个带页面坐标")
+    return PageIndex(tiles[0][0], elements, full.resolution, viewport_size, len(spans))
@@ -1,18 +1,185 @@
 import json
 import re
-from typing import Any, Union, List, Dict
+from typing import Any, Callable, Optional, Union, List, Dict
 
 JsonData = Union[Dict[str, Any], List[Any]]
 
-def load_json_from_llm(output: str) -> JsonData:
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+# 字符串之外允许出现在 JSON 里的字符；出现其他字符（中文、反引号、普通英文单词……）说明这不是 JSON
+_JSON_CHARS = frozenset(" \t\r\n{}[]:,+-.0123456789eE" + "truefalsn")
+_VALUE_STARTS = frozenset('{["-0123456789tfn')
+_TOP_LEVEL_SPECIAL = re.compile(r"[{\[<]")
+_STRING_SPECIAL = re.compile(r'["\\]')
+# 放弃候选后重新扫描的字符总量上限：_RESCAN_SLACK + _RESCAN_FACTOR × 已输入字符数；
+# 超出后不再从候选起始括号之后重扫，而是从出错位置继续，"[" * n 这类输入的耗时保持线性
+_RESCAN_SLACK = 65536
+_RESCAN_FACTOR = 4
+
+
+class JsonExtractor:
+    """增量、感知字符串的括号匹配 JSON 提取器。
+
+    单次扫描找出文本中所有顶层 JSON 对象 / 数组候选：跳过 <think>…</think> 推理块，
+    字符串内的括号与转义不参与匹配，遇到不可能出现在 JSON 中的字符时放弃当前候选，从其起始括号之后重新扫描；
+    重扫的总量有上限（见 _RESCAN_FACTOR），超出后从出错位置继续扫描，不再找回藏在被放弃候选内部的 JSON。
+    可以整段调用 feed，也可以在流式接收时逐块调用，已完成扫描的文本不会重复处理。
+
+    - validate：可选，校验候选（返回值或抛异常），不通过的候选被跳过
+    """
+
+    def __init__(self, validate: Optional[Callable[[Any], Any]] = None):
+        self.validate = validate
+        self.values = []  # 所有通过校验的候选，按出现顺序
+        self._carry = ""  # 上一块末尾尚未扫描的少量字符（可能被切开的 <think> / </think>）
+        self._pieces = []  # 当前候选在之前各块中的文本
+        self._in_think = False
+        self._stack = []  # 当前候选中尚未闭合的括号，为空表示不在候选内
+        self._in_string = False
+        self._escape = False
+        self._expect_first = False  # 刚进入候选，等待第一个非空白字符
+        self._fed = 0  # 已输入的字符数
+        self._rescanned = 0  # 放弃候选后已重新扫描的字符数
+
+    def feed(self, chunk: str) -> Optional[JsonData]:
+        """追加一段文本，返回本次新完成且通过校验的第一个 JSON 值（没有则返回 None）"""
+        self._fed += len(chunk)
+        return self._scan(chunk)
+
+    def _scan(self, chunk: str) -> Optional[JsonData]:
+        text = self._carry + chunk
+        self._carry = ""
+        found = None
+        pos, n = 0, len(text)
+        start = 0 if self._stack else -1  # 当前候选在本块中的起始位置
+        while pos < n:
+            if self._in_think:
+                end = text.find(THINK_CLOSE, pos)
+                if end < 0:
+                    # 结束标签可能被切在两块之间，保留末尾几个字符下次再找
+                    self._carry = text[max(pos, n - len(THINK_CLOSE) + 1):]
+                    return found
+                self._in_think = False
+                pos = end + len(THINK_CLOSE)
+                continue
+
+            if not self._stack:
+                # 顶层：直接跳到下一个可能开始候选或推理块的字符
+                match = _TOP_LEVEL_SPECIAL.search(text, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                if text[pos] == "<":
+                    head = text[pos:pos + len(THINK_OPEN)]
+                    if head == THINK_OPEN:
+                        self._in_think = True
+                        pos += len(THINK_OPEN)
+                        continue
+                    if len(head) < len(THINK_OPEN) and THINK_OPEN.startswith(head):
+                        self._carry = head  # 可能是被切开的 <think>，等待更多文本
+                        return found
+                else:
+                    start = pos
+                    self._stack = [text[pos]]
+                    self._expect_first = True
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    pos = n
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                continue
+
+            ch = text[pos]
+            if self._expect_first and not ch.isspace():
+                self._expect_first = False
+                opener = self._stack[-1]
+                if (opener == "{" and ch not in '"}') or (opener == "[" and ch not in _VALUE_STARTS and ch != "]"):
+                    text, pos, n = self._abandon(text, start, pos)
+                    continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if (ch == "}") != (self._stack[-1] == "{"):
+                    text, pos, n = self._abandon(text, start, pos)
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    candidate = "".join(self._pieces) + text[start:pos + 1]
+                    self._pieces.clear()
+                    value = self._complete(candidate)
+                    if value is not None and found is None:
+                        found = value
+            elif ch not in _JSON_CHARS:
+                text, pos, n = self._abandon(text, start, pos)
+                continue
+            pos += 1
+        if self._stack:
+            self._pieces.append(text[start:])
+        return found
+
+    def finish(self) -> Optional[JsonData]:
+        """输入结束：仍未闭合的候选不可能完整了，从其起始括号之后重新扫描，找回其中的完整 JSON"""
+        found = None
+        while self._stack:
+            rescan, _, _ = self._abandon("", 0, 0)
+            value = self._scan(rescan)
+            if found is None:
+                found = value
+        return found
+
+    def _abandon(self, text: str, start: int, pos: int):
+        """放弃当前候选（在本块的 pos 处出错），从它的起始括号之后重新扫描（真正的 JSON 可能藏在被误判为字符串的部分里）；
+        重扫总量超出上限时改为从 pos 继续扫描"""
+        cost = sum(map(len, self._pieces)) + pos - start
+        if self._rescanned + cost <= _RESCAN_SLACK + _RESCAN_FACTOR * self._fed:
+            self._rescanned += cost
+            rescan = ("".join(self._pieces) + text[start:])[1:]
+        else:
+            rescan = text[pos:]
+        self._pieces.clear()
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect_first = False
+        return rescan, 0, len(rescan)
+
+    def _complete(self, candidate: str):
+        try:
+            value = json.loads(candidate, strict=False)
+            if self.validate is not None:
+                value = self.validate(value)
+        except Exception:
+            return None
+        self.values.append(value)
+        return value
+
+
+def load_json_from_llm(output: str, validate: Optional[Callable[[Any], Any]] = None) -> JsonData:
     """
-    通吃“裸 JSON / 单行反引号 / 三重反引号代码块”的解析器，
+    通吃“裸 JSON / 单行反引号 / 三重反引号代码块 / 带 <think> 推理或前后说明文字”的解析器，
     兼容对象（dict）和数组（list）。
 
     Parameters
     ----------
     output : str
         LLM 原始输出文本
+    validate : Callable, optional
+        校验函数（返回值或抛异常）；有多个 JSON 候选时返回第一个通过校验的
 
     Returns
     -------
@@ -27,26 +194,9 @@ def load_json_from_llm(output: str) -> JsonData:
     if not isinstance(output, str):
         raise TypeError("output must be a str")
 
-    text = output.strip()
-
-    # --- 三重反引号代码块 ---
-    if text.startswith("```"):
-        text = "\n".join(text.splitlines()[1:-1]).strip()
-
-    # --- 单行反引号 ---
-    if text.startswith("`") and text.endswith("`") and text.count("`") == 2:
-        text = text[1:-1].strip()
-
-    # --- 直接尝试解析 ---
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # 兜底：截取最外层 {} 或 [] 再试一次
-        match = re.search(r"\{.*\}|\[.*\]", text, re.S)
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
-        # 最终失败
-        raise ValueError(f"无法从给定文本解析 JSON：{text[:100]}...")
+    extractor = JsonExtractor(validate)
+    extractor.feed(output)
+    extractor.finish()
+    if extractor.values:
+        return extractor.values[0]
+    raise ValueError(f"无法从给定文本解析 JSON：{output.strip()[:100]}...")
@@ -0,0 +1,244 @@
+"""结构化追踪：智能体的每个阶段、每次模型调用与每个浏览器操作都记录为一个 span。
+
+span 按协程上下文嵌套（task → step → 阶段 → 模型调用 / 浏览器操作），记录耗时、状态、重试次数、
+请求字节数与模型返回的 token 用量；结束时汇总到 tracer 的指标中，并可导出：
+- TRACE_PATH：每个结束的 span 以一行 JSON 追加写入该文件（有事件循环时在线程池中写出）
+- METRICS_PATH：write_metrics() 时写出 Prometheus 文本格式的指标文件（智能体任务结束时自动写出）
+- METRICS_PORT：start_metrics_server() 在该端口提供 /metrics，供 Prometheus 拉取（监听 METRICS_HOST，默认只限本机）
+
+用法：
+    with span("decide", "stage") as s:
+        ...
+        s.set(prompt_tokens=...)
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from utils import METRICS_HOST, METRICS_PATH, METRICS_PORT, TRACE_PATH
+from utils.aio import run_in_background
+
+# 耗时直方图的分桶上界（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 计入指标的数值属性（累加）
+# usage_unknown 为没有 token 用量的模型调用数（提前截断的流），token 累计值只包含有用量的调用
+COUNTED_ATTRS = ("retries", "request_bytes", "prompt_tokens", "cached_tokens", "completion_tokens", "usage_unknown")
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str  # task / step / stage / model / browser / grounding
+    trace_id: str
+    span_id: str
+    parent_id: str = None
+    start: float = 0.0  # 开始时间（Unix 时间戳）
+    wall: float = 0.0  # 墙钟耗时（秒）
+    status: str = "ok"
+    error: str = ""
+    attrs: dict = field(default_factory=dict)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+
+class _Metric:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.wall_sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.totals = dict.fromkeys(COUNTED_ATTRS, 0)
+
+    def observe(self, span: Span):
+        self.count += 1
+        self.errors += span.status != "ok"
+        self.wall_sum += span.wall
+        for i, bound in enumerate(BUCKETS):
+            if span.wall <= bound:
+                self.buckets[i] += 1
+        for key in COUNTED_ATTRS:
+            self.totals[key] += span.attrs.get(key) or 0
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Tracer:
+    """收集结束的 span：保留最近 max_spans 个，按 (kind, name) 汇总指标，可选追加写入 JSONL"""
+
+    def __init__(self, trace_path: str = TRACE_PATH, max_spans: int = 4096):
+        self.trace_path = trace_path
+        self.spans = deque(maxlen=max_spans)
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def finish(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            self.metrics.setdefault((span.kind, span.name), _Metric()).observe(span)
+        if self.trace_path:
+            line = json.dumps(asdict(span), ensure_ascii=False, default=str)
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self._append(line)
+            else:
+                run_in_background(self._append, line)
+
+    def _append(self, line: str):
+        with self._write_lock:
+            os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.metrics.clear()
+
+    def summary(self, kind: str = None) -> dict:
+        """按 name 汇总的调用次数、错误数、平均耗时与累计重试 / 字节 / token"""
+        with self._lock:
+            items = [(key, m) for key, m in self.metrics.items() if kind is None or key[0] == kind]
+            return {f"{k}/{n}" if kind is None else n: {
+                "count": m.count,
+                "errors": m.errors,
+                "wall_mean": round(m.wall_sum / m.count, 3) if m.count else None,
+                **{key: value for key, value in m.totals.items() if value},
+            } for (k, n), m in items}
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式（exposition format 0.0.4）的指标"""
+        lines = [
+            "# HELP agent_span_seconds 智能体阶段、模型调用与浏览器操作的耗时",
+            "# TYPE agent_span_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self.metrics.items())
+            for (kind, name), m in items:
+                labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+                for bound, n in zip(BUCKETS, m.buckets):
+                    lines.append(f'agent_span_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'agent_span_seconds_bucket{{{labels},le="+Inf"}} {m.count}')
+                lines.append(f"agent_span_seconds_sum{{{labels}}} {m.wall_sum:.6f}")
+                lines.append(f"agent_span_seconds_count{{{labels}}} {m.count}")
+            counters = [
+                ("agent_span_errors_total", "以异常结束的 span 数", lambda m: m.errors),
+                *((f"agent_span_{key}_total", f"span 累计的 {key}", lambda m, key=key: m.totals[key]) for key in COUNTED_ATTRS),
+            ]
+            for metric, help_text, value in counters:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (kind, name), m in items:
+                    lines.append(f'{metric}{{kind="{_label(kind)}",name="{_label(name)}"}} {value(m)}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path: str = METRICS_PATH):
+        """把 Prometheus 文本写到 path（先写临时文件再替换，读取方不会读到半个文件）；path 为空时不写"""
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+
+tracer = Tracer()
+_current_span: ContextVar[Span] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attrs):
+    """记录一个 span；嵌套在当前 span 之下（跨 await 与 asyncio.gather 派生的任务均有效）"""
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        kind=kind,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex[:16],
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start=time.time(),
+        attrs=attrs,
+    )
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+        current.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        current.wall = time.perf_counter() - start
+        _current_span.reset(token)
+        tracer.finish(current)
+
+
+def current_span() -> Span:
+    return _current_span.get()
+
+
+def record_retry():
+    """在当前 span 上记一次重试（调用方的 MAX_RETRY 循环中每次失败后调用）"""
+    current = _current_span.get()
+    if current is not None:
+        current.add("retries")
+
+
+def payload_size(value) -> int:
+    """请求体中文本内容的字节数（逐层累加字符串长度，不做 JSON 序列化；base64 图像按原长度计）"""
+    if isinstance(value, str):
+        return len(value) if value.isascii() else len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(payload_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(v) for v in value)
+    return 0
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """在后台线程中于 host:port 提供 GET /metrics（Prometheus 文本格式）；port 为 0 或已启动时不做任何事"""
+    global _metrics_server
+    if not port or _metrics_server is not None:
+        return _metrics_server
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    _metrics_server = ThreadingHTTPServer((host, port), Handler)
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"指标服务已启动：http://{host}:{port}/metrics")
+    return _metrics_server
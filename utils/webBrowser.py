@@ -1,31 +1,99 @@
-
-from playwright.sync_api import sync_playwright
-from PIL import Image
-from io import BytesIO
+from playwright.async_api import async_playwright
 from loguru import logger
-from pathlib import Path
 
-import os
-import base64
+import asyncio
 import time
+from dataclasses import replace
 
-from utils.imageProcessing import get_date_time
-from utils import INPUT_IMAGE_PATH, RECORD_IMAGE_PATH
-class BrowserAgent:
-    def __init__(self, headless=False, resolution=(1280, 720)):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=headless)
-        self.context = self.browser.new_context(
-            viewport={"width": resolution[0], "height": resolution[1]},
-            screen={"width": resolution[0], "height": resolution[1]}
-        )
-        self.page = self.context.new_page()
+from utils.aio import run_sync, drain_background
+from utils.settle import SettleConfig, SettleDetector, SettleReport, MUTATION_OBSERVER_JS
+from utils.imageProcessing import Frame
+from utils.browserProfile import BrowserProfile, install_blocking, process_tree_memory
+from utils.recorder import recorder_for, writer as record_writer
+from utils import RECORD_IMAGE_PATH
+from utils.tracing import span
+
+class AsyncBrowserAgent:
+    """基于 Playwright async API 的浏览器代理（核心实现）。
+    使用 await AsyncBrowserAgent.launch() 按浏览器配置（utils.browserProfile）启动或连接一个浏览器，
+    或 await AsyncBrowserAgent.open_session(browser) 在共享的浏览器进程上新建一个隔离的上下文（独立的 cookie、存储与录制目录）。"""
+    def __init__(self, playwright, browser, context, page, settle_config: SettleConfig = None,
+                 record_dir: str = RECORD_IMAGE_PATH, owns_browser: bool = True):
+        self.playwright = playwright
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.settle_config = settle_config or SettleConfig()
+        self.record_dir = record_dir
+        self.owns_browser = owns_browser
+        self.last_settle = None
+        self.startup_s = None  # launch() 从启动 Playwright 到页面可用的耗时
+        self.last_load_s = None  # 最近一次 goto 到 load 事件的耗时
         self.context.on("page", self._on_new_page)
-        logger.success(f"浏览器已启动，分辨率设置为: {resolution[0]}x{resolution[1]}")
-    def _on_new_page(self, new_page):
+
+    @staticmethod
+    def _context_options(resolution) -> dict:
+        return {
+            "viewport": {"width": resolution[0], "height": resolution[1]},
+            "screen": {"width": resolution[0], "height": resolution[1]},
+        }
+
+    @staticmethod
+    async def _prepare_context(context):
+        # 每个文档加载时即安装 DOM 变更监听，供稳定检测使用
+        await context.add_init_script(script=f"({MUTATION_OBSERVER_JS})()")
+        return context
+
+    @classmethod
+    async def _new_context(cls, browser, resolution):
+        return await cls._prepare_context(await browser.new_context(**cls._context_options(resolution)))
+
+    @classmethod
+    async def launch(cls, headless=None, resolution=(1280, 720), record_dir: str = RECORD_IMAGE_PATH,
+                     profile: BrowserProfile = None):
+        """按 profile（默认取环境变量，见 utils.browserProfile）启动浏览器；headless 不为空时覆盖 profile 中的设置。
+        连接预热浏览器时新建一个隔离的上下文，close() 只关闭该上下文"""
+        profile = profile or BrowserProfile.from_env()
+        if headless is not None:
+            profile = replace(profile, headless=headless)
+        start = time.perf_counter()
+        playwright = await async_playwright().start()
+        owns_browser = True
+        if profile.cdp_endpoint:
+            browser = await playwright.chromium.connect_over_cdp(profile.cdp_endpoint)
+            context = await cls._new_context(browser, resolution)
+            owns_browser = False
+        elif profile.user_data_dir:
+            # 持久化上下文没有单独的 Browser 对象，关闭上下文即关闭浏览器
+            browser = None
+            context = await cls._prepare_context(await playwright.chromium.launch_persistent_context(
+                profile.user_data_dir, headless=profile.headless, args=profile.launch_args(),
+                **cls._context_options(resolution)))
+        else:
+            browser = await playwright.chromium.launch(headless=profile.headless, args=profile.launch_args())
+            context = await cls._new_context(browser, resolution)
+        await install_blocking(context, profile, route_domains=bool(profile.cdp_endpoint))
+        page = context.pages[0] if context.pages else await context.new_page()
+        agent = cls(playwright, browser, context, page, record_dir=record_dir, owns_browser=owns_browser)
+        agent.startup_s = time.perf_counter() - start
+        mode = f"已连接预热浏览器 {profile.cdp_endpoint}" if profile.cdp_endpoint else f"浏览器已启动（{'无头' if profile.headless else '有头'}）"
+        logger.success(f"{mode}，用时 {agent.startup_s:.2f}s，分辨率设置为: {resolution[0]}x{resolution[1]}")
+        return agent
+
+    @classmethod
+    async def open_session(cls, browser, resolution=(1280, 720), record_dir: str = RECORD_IMAGE_PATH,
+                           profile: BrowserProfile = None):
+        """在已启动的浏览器上新建一个隔离的上下文，按 profile 安装请求拦截；close() 只关闭该上下文"""
+        context = await cls._new_context(browser, resolution)
+        if profile is not None:
+            await install_blocking(context, profile, route_domains=bool(profile.cdp_endpoint))
+        page = await context.new_page()
+        return cls(None, browser, context, page, record_dir=record_dir, owns_browser=False)
+
+    async def _on_new_page(self, new_page):
         try:
             logger.info("监听到新页面打开，等待加载中...")
-            new_page.wait_for_load_state("load", timeout=30000)
+            await new_page.wait_for_load_state("load", timeout=30000)
 
             if new_page.is_closed():
                 logger.warning("新页面已关闭，放弃切换")
@@ -35,66 +103,58 @@ class BrowserAgent:
             logger.info("成功切换到新页面")
         except Exception as e:
             logger.error(f"切换到新页面失败: {e}")
-    def goto(self, url: str):
-        self.page.goto(url)
-
-    def capture_screenshot(self):
-        """截图并保存到本地（PNG）"""
-        img_bytes = self.page.screenshot(full_page=False)
-        img = Image.open(BytesIO(img_bytes)).convert("RGB")
-        img.save(INPUT_IMAGE_PATH, format="PNG")
-        logger.success(f"已保存页面截图到 {INPUT_IMAGE_PATH}")
-        if RECORD_IMAGE_PATH:
-            if not os.path.exists(RECORD_IMAGE_PATH):
-                os.makedirs(RECORD_IMAGE_PATH)
-            # 备份图像
-            backup_image_path = Path(f"{get_date_time()}_{INPUT_IMAGE_PATH}")
-            backup_image_path = Path.joinpath(Path(RECORD_IMAGE_PATH), Path(backup_image_path))
-            os.system(f"cp -f {INPUT_IMAGE_PATH} {backup_image_path}")
-            logger.success(f"已备份结果图像：{backup_image_path}")
 
-    def click_box(self, box):
+    async def goto(self, url: str):
+        start = time.perf_counter()
+        await self.page.goto(url)
+        self.last_load_s = time.perf_counter() - start
+
+    async def capture_screenshot(self) -> Frame:
+        """截图（PNG），返回内存中的 Frame；仅在开启录制时交给录制线程落盘（按内容去重，不阻塞当前步骤）"""
+        frame = Frame(await self.page.screenshot(full_page=False))
+        logger.success(f"已获取页面截图，分辨率: {frame.resolution}")
+        if self.record_dir:
+            # 直接写出 Playwright 返回的 PNG 字节，不再解码/重编码
+            recorder_for(self.record_dir).frame(frame)
+        return frame
+
+    async def capture_full_page(self, max_height: int = None):
+        """从当前视口上边缘起向下的整页截图（至多 max_height 像素高），返回 (Frame, 截图上边缘的页面坐标 y)；
+        录制方式同 capture_screenshot"""
+        width, height, top = await self.page.evaluate(
+            "() => [document.documentElement.clientWidth, document.documentElement.scrollHeight, Math.round(window.scrollY)]")
+        height = height - top if not max_height else min(height - top, max_height)
+        frame = Frame(await self.page.screenshot(full_page=True, clip={"x": 0, "y": top, "width": width, "height": height}))
+        logger.success(f"已获取整页截图，分辨率: {frame.resolution}，页面坐标 y={top} 起")
+        if self.record_dir:
+            recorder_for(self.record_dir).frame(frame)
+        return frame, top
+
+    async def scroll_to(self, y: int) -> int:
+        """把页面纵向滚动到 y（页面坐标），返回实际的 scrollY（页面底部附近时小于 y）"""
+        return round(await self.page.evaluate("y => { window.scrollTo(0, y); return window.scrollY; }", y))
+
+    async def click_box(self, box):
         x = (box[0] + box[2]) // 2
         y = (box[1] + box[3]) // 2
         logger.info(f"→ 点击坐标: ({x}, {y})")
 
-        original_pages = self.context.pages
-        original_page_count = len(original_pages)
-
-        # 先点击
-        self.page.mouse.click(x, y)
-        logger.info("点击完成，等待是否出现新页面...")
-
-        # 等待短时间，检测是否新页面被打开
-        self.page.wait_for_timeout(5000)  # 1 秒缓冲时间
-
-        new_pages = self.context.pages
-        if len(new_pages) > original_page_count:
-            # 尝试找到新打开的页面
-            for p in new_pages:
-                if p not in original_pages:
-                    try:
-                        p.wait_for_load_state("load", timeout=30000)
-                        if p.is_closed():
-                            logger.warning("新页面已关闭，保留原页面")
-                        else:
-                            self.page = p
-                            logger.success("成功切换到新页面")
-                    except Exception as e:
-                        logger.error(f"❌ 新页面加载失败，保持当前页面。错误: {e}")
-                    break
-        else:
-            logger.info("没有新页面打开，继续使用当前页面")
+        # 点击前开始监听，点击引起的请求、DOM 变化与新页面都能被捕获
+        detector = SettleDetector(self, self.settle_config).start()
+        await self.page.mouse.click(x, y)
+        logger.info("点击完成，等待页面稳定（含新页面检测）...")
+        self.last_settle = await detector.wait()
+        return self.last_settle
 
-    def type_box(self, box, text: str):
+    async def type_box(self, box, text: str):
         """点击输入框并输入文本"""
         x = (box[0] + box[2]) // 2
         y = (box[1] + box[3]) // 2
         logger.info(f"→ 输入坐标: ({x}, {y}) 文字: {text}")
-        self.page.mouse.click(x, y)
-        self.page.keyboard.type(text, delay=50)
+        await self.page.mouse.click(x, y)
+        await self.page.keyboard.type(text, delay=50)
 
-    def scroll(self, direction="向下", amount=300):
+    async def scroll(self, direction="向下", amount=300):
         dx, dy = 0, 0
         if direction == "向下": dy = amount
         elif direction == "向上": dy = -amount
@@ -104,56 +164,201 @@ class BrowserAgent:
             logger.warning("⚠️ 未知滚动方向")
             return
         logger.info(f"→ 滚动页面 ({dx}, {dy})")
-        self.page.mouse.wheel(dx, dy)
-    
+        await self.page.mouse.wheel(dx, dy)
+
+    async def back(self):
+        """后退到上一个页面"""
+        await self.page.go_back()
+
+    async def close(self):
+        await drain_background()
+        await asyncio.to_thread(record_writer.flush)
+        if self.owns_browser:
+            await (self.browser or self.context).close()
+        else:
+            await self.context.close()
+        # 连接预热浏览器时只断开连接，浏览器继续运行
+        if self.playwright is not None:
+            await self.playwright.stop()
+
+    async def memory_metrics(self) -> dict:
+        """通过 CDP 汇总本上下文所有页面的 JS 堆与 DOM 节点数（仅 Chromium）"""
+        totals = {"JSHeapUsedSize": 0.0, "JSHeapTotalSize": 0.0, "Nodes": 0.0}
+        for page in self.context.pages:
+            session = await self.context.new_cdp_session(page)
+            try:
+                await session.send("Performance.enable")
+                metrics = (await session.send("Performance.getMetrics"))["metrics"]
+            finally:
+                await session.detach()
+            for metric in metrics:
+                if metric["name"] in totals:
+                    totals[metric["name"]] += metric["value"]
+        return {
+            "pages": len(self.context.pages),
+            "js_heap_used_mb": round(totals["JSHeapUsedSize"] / 2**20, 1),
+            "js_heap_total_mb": round(totals["JSHeapTotalSize"] / 2**20, 1),
+            "dom_nodes": int(totals["Nodes"]),
+        }
+
+    def profile_metrics(self) -> dict:
+        """冷启动与最近一次页面加载的耗时，以及本进程启动的浏览器进程的内存（连接的预热浏览器不在其中）"""
+        return {
+            "startup_s": round(self.startup_s, 3) if self.startup_s is not None else None,
+            "load_s": round(self.last_load_s, 3) if self.last_load_s is not None else None,
+            "memory": process_tree_memory(),
+        }
+
+    async def wait_for_load(self, timeout=30000):
+        """等待页面加载完成"""
+        await self.page.wait_for_load_state("networkidle", timeout=timeout)
+        logger.info("→ 页面加载完成")
+
+    async def wait_for_settle(self, deadline_ms=None) -> SettleReport:
+        """事件驱动地等待页面稳定，返回包含耗时的 SettleReport"""
+        config = self.settle_config if deadline_ms is None else replace(self.settle_config, deadline_ms=deadline_ms)
+        self.last_settle = await SettleDetector(self, config).start().wait()
+        return self.last_settle
+
+class BrowserAgent:
+    """同步浏览器代理：在后台事件循环中驱动 AsyncBrowserAgent。"""
+    def __init__(self, headless=None, resolution=(1280, 720), agent=None):
+        self.async_agent = agent or run_sync(AsyncBrowserAgent.launch(headless, resolution))
+
+    @property
+    def page(self):
+        return self.async_agent.page
+
+    def goto(self, url: str):
+        run_sync(self.async_agent.goto(url))
+
+    def capture_screenshot(self) -> Frame:
+        """截图（PNG），返回内存中的 Frame；仅在开启录制时落盘"""
+        return run_sync(self.async_agent.capture_screenshot())
+
+    def click_box(self, box):
+        return run_sync(self.async_agent.click_box(box))
+
+    def type_box(self, box, text: str):
+        """点击输入框并输入文本"""
+        run_sync(self.async_agent.type_box(box, text))
+
+    def scroll(self, direction="向下", amount=300):
+        run_sync(self.async_agent.scroll(direction, amount))
+
     def back(self):
         """后退到上一个页面"""
-        self.page.go_back()
+        run_sync(self.async_agent.back())
 
     def close(self):
-        self.browser.close()
-        self.playwright.stop()
-    
+        run_sync(self.async_agent.close())
+
     def wait_for_load(self, timeout=30000):
         """等待页面加载完成"""
-        self.page.wait_for_load_state("networkidle", timeout=timeout)
-        logger.info("→ 页面加载完成")
+        run_sync(self.async_agent.wait_for_load(timeout))
+
+    def wait_for_settle(self, deadline_ms=None) -> SettleReport:
+        """事件驱动地等待页面稳定，返回包含耗时的 SettleReport"""
+        return run_sync(self.async_agent.wait_for_settle(deadline_ms))
+
+class AsyncWebBrowserOperator:
+    """智能体使用的浏览器执行器（async 版本）"""
+    def __init__(self, agent: AsyncBrowserAgent):
+        self.agent = agent
+
+    @classmethod
+    async def launch(cls, headless=None, profile: BrowserProfile = None):
+        """按浏览器配置启动或连接浏览器，见 AsyncBrowserAgent.launch"""
+        return cls(await AsyncBrowserAgent.launch(headless=headless, profile=profile))
+
+    @classmethod
+    async def open_session(cls, browser, resolution=(1280, 720), record_dir: str = RECORD_IMAGE_PATH,
+                           profile: BrowserProfile = None):
+        """在共享浏览器上新建一个隔离会话，见 AsyncBrowserAgent.open_session"""
+        return cls(await AsyncBrowserAgent.open_session(browser, resolution, record_dir, profile))
+
+    async def start(self, url):
+        with span("goto", "browser", url=url):
+            await self.agent.goto(url)
+
+    async def screen_shot(self) -> Frame:
+        with span("screenshot", "browser"):
+            return await self.agent.capture_screenshot()
+
+    async def full_page_shot(self, max_height: int = None):
+        """从当前视口起向下的整页截图，返回 (Frame, 页面坐标 y)，见 utils.tiledPerception"""
+        with span("screenshot_full", "browser"):
+            return await self.agent.capture_full_page(max_height)
+
+    async def execute_at_page(self, operation, page_box, text = ""):
+        """对页面坐标 page_box 处的元素执行操作：先滚动使元素位于视口中部，再换算成视口坐标执行"""
+        viewport_height = self.agent.page.viewport_size["height"]
+        center_y = (page_box[1] + page_box[3]) / 2
+        with span("scroll_to", "browser"):
+            scroll_y = await self.agent.scroll_to(max(0, round(center_y - viewport_height / 2)))
+        logger.info(f"→ 滚动到 scrollY={scroll_y}")
+        box = [page_box[0], page_box[1] - scroll_y, page_box[2], page_box[3] - scroll_y]
+        await self.execute(operation, box, text)
+
+    async def execute(self, operation, box = [114, 514, 191, 981], text = ""):
+        with span(operation["type"].lower(), "browser"):
+            if operation["type"] == "CLICK":
+                await self.agent.click_box(box)
+            elif operation["type"] == "TYPE":
+                await self.agent.type_box(box, text)
+            elif operation["type"] == "SCROLL":
+                await self.agent.scroll(operation["direction"])
+            else:
+                raise ValueError(f"Unknown operation type: {operation['type']}")
+
+    async def wait(self, sleep_sec = 0, timeout=None) -> SettleReport:
+        """等待页面稳定（DOM、网络、新页面与截图稳定性，见 utils.settle）。
+        sleep_sec 为可选的最短等待；timeout 为最长等待毫秒数，默认 SETTLE_DEADLINE_MS。"""
+        if sleep_sec:
+            await asyncio.sleep(sleep_sec)
+        logger.info("等待页面稳定...")
+        with span("settle", "browser") as current:
+            report = await self.agent.wait_for_settle(timeout)
+            current.set(settled=report.settled, new_page=report.new_page, polls=report.polls)
+            return report
+
+    async def back(self):
+        """后退到上一个页面"""
+        with span("back", "browser"):
+            await self.agent.back()
+        logger.info("已后退到上一个页面")
+
+    async def close(self):
+        """关闭浏览器（共享浏览器上的会话只关闭自己的上下文）"""
+        await self.agent.close()
+        logger.info("浏览器已关闭" if self.agent.owns_browser else "浏览器会话已关闭")
 
 class webBrowserOperator:
-    def __init__(self):
-        self.agent = BrowserAgent(headless=False)
-    
+    """同步执行器：在后台事件循环中驱动 AsyncWebBrowserOperator。"""
+    def __init__(self, operator=None):
+        self.operator = operator or run_sync(AsyncWebBrowserOperator.launch())
+        self.agent = BrowserAgent(agent=self.operator.agent)
+
     def start(self,url):
-        self.agent.goto(url)
+        run_sync(self.operator.start(url))
 
-    def screen_shot(self):
-        self.agent.capture_screenshot()
+    def screen_shot(self) -> Frame:
+        return run_sync(self.operator.screen_shot())
 
     def execute(self, operation, box = [114, 514, 191, 981], text = ""):
-        if operation["type"] == "CLICK":
-            self.agent.click_box(box)
-        elif operation["type"] == "TYPE":
-            self.agent.type_box(box, text)
-        elif operation["type"] == "SCROLL":
-            self.agent.scroll(operation["direction"])
-        else:
-            raise ValueError(f"Unknown operation type: {operation['type']}")
-    
-    def wait(self, sleep_sec = 5, timeout=30000):
-        """等待页面加载完成"""
-        time.sleep(sleep_sec)  # 等待5秒，确保操作稳定
-        logger.info("等待页面加载...")
-        self.agent.wait_for_load(timeout)
+        run_sync(self.operator.execute(operation, box, text))
+
+    def wait(self, sleep_sec = 0, timeout=None) -> SettleReport:
+        """等待页面稳定，返回包含耗时的 SettleReport"""
+        return run_sync(self.operator.wait(sleep_sec, timeout))
 
     def back(self):
         """后退到上一个页面"""
-        self.agent.back()
-        logger.info("已后退到上一个页面")
+        run_sync(self.operator.back())
 
     def close(self):
         """关闭浏览器"""
-        self.agent.close()
-        logger.info("浏览器已关闭")
+        run_sync(self.operator.close())
         
 
 import time
@@ -168,8 +373,8 @@ def test_web_browser_operator():
     operator.wait()
 
     # 1. 截图测试
-    operator.screen_shot()
-    logger.success("已保存页面截图到 output_screenshot.png")
+    frame = operator.screen_shot()
+    logger.success(f"已获取页面截图，分辨率: {frame.resolution}")
 
     # 2. 测试输入（模拟点击搜索框并输入）
     type_op = {
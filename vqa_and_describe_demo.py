@@ -2,6 +2,7 @@ import argparse
 import json
 from loguru import logger
 
+from utils.imageProcessing import Frame
 from utils.llm import (
     describe_screen_caption,
     ask_question_about_image,
@@ -32,11 +33,13 @@ def main():
     args = parser.parse_args()
 
 
-    description = describe_screen_caption(args.image_path)
+    # 同一帧只读取、编码一次，供两次 VL 调用共用
+    frame = Frame.from_path(args.image_path)
+    description = describe_screen_caption(frame)
     logger.success("页面结构分析结果：\n")
     logger.info(description)
 
-    answer = ask_question_about_image(args.image_path, args.question)
+    answer = ask_question_about_image(frame, args.question)
     logger.success("问题回答结果：\n")
     logger.info(answer)
 